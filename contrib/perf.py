@@ -1,7 +1,7 @@
 # perf.py - performance test routines
 '''helper extension to measure performance'''
 
-from mercurial import cmdutil, scmutil, util, commands, obsolete
+from mercurial import cmdutil, scmutil, util, commands, obsolete, error
 from mercurial import repoview, branchmap, merge, copies
 import time, os, sys
 import functools
@@ -86,13 +86,23 @@ def perfannotate(ui, repo, f, **opts):
 
 @command('perfstatus',
          [('u', 'unknown', False,
-           'ask status to look for unknown files')] + formatteropts)
+           'ask status to look for unknown files'),
+          ('', 'stat-workers', '',
+           'comma separated numbers of threads stat\'ing files to compare '
+           '(0 stats them serially)')] + formatteropts)
 def perfstatus(ui, repo, **opts):
     #m = match.always(repo.root, repo.getcwd())
     #timer(lambda: sum(map(len, repo.dirstate.status(m, [], False, False,
     #                                                False))))
-    timer, fm = gettimer(ui, **opts)
-    timer(lambda: sum(map(len, repo.status(unknown=opts['unknown']))))
+    timer, fm = gettimer(ui, opts)
+    d = lambda: sum(map(len, repo.status(unknown=opts['unknown'])))
+    if opts['stat_workers']:
+        for workers in opts['stat_workers'].split(','):
+            repo.ui.setconfig('experimental', 'dirstate.statworkers',
+                              int(workers), 'perf')
+            timer(d, title='%s stat workers' % workers)
+    else:
+        timer(d)
     fm.end()
 
 @command('perfaddremove', formatteropts)
@@ -448,18 +458,98 @@ def perfdiffwd(ui, repo, **opts):
     fm.end()
 
 @command('perfrevlog',
-         [('d', 'dist', 100, 'distance between the revisions')] + formatteropts,
+         [('d', 'dist', 100, 'distance between the revisions'),
+          ('', 'batch', False, 'restore the revisions with revlog.revisions')]
+         + formatteropts,
          "[INDEXFILE]")
 def perfrevlog(ui, repo, file_, **opts):
     timer, fm = gettimer(ui, opts)
     from mercurial import revlog
     dist = opts['dist']
+    opener = lambda fn: open(fn, 'rb')
+    # honor the repository configuration (chunk cache size and budget...)
+    opener.options = getattr(repo.svfs, 'options', {})
+    stats = {}
     def d():
-        r = revlog.revlog(lambda fn: open(fn, 'rb'), file_)
-        for x in xrange(0, len(r), dist):
-            r.revision(r.node(x))
+        r = revlog.revlog(opener, file_)
+        if opts['batch']:
+            for text in r.revisions(xrange(0, len(r), dist)):
+                pass
+        else:
+            for x in xrange(0, len(r), dist):
+                r.revision(r.node(x))
+        stats.update(r._chunkcache.stats())
+        if r._fulltextcache is not None:
+            stats['fulltext'] = r._fulltextcache.stats()
 
     timer(d)
+    fm.startitem()
+    fm.write('segments', '! chunk cache: %d segments', stats['segments'])
+    fm.write('size maxbytes', ', %d/%d bytes',
+             stats['size'], stats['maxbytes'])
+    fm.write('hits misses', ', %d hits, %d misses',
+             stats['hits'], stats['misses'])
+    fm.write('bytesread', ', %d bytes read', stats['bytesread'])
+    fm.write('bytesused', ', %d bytes used\n', stats['bytesused'])
+    if 'fulltext' in stats:
+        ftstats = stats['fulltext']
+        fm.startitem()
+        fm.write('fulltextentries', '! fulltext cache: %d entries',
+                 ftstats['entries'])
+        fm.write('fulltextsize fulltextmaxbytes', ', %d/%d bytes',
+                 ftstats['size'], ftstats['maxbytes'])
+        fm.write('fulltexthits fulltextmisses', ', %d hits, %d misses\n',
+                 ftstats['hits'], ftstats['misses'])
+    fm.end()
+
+@command('perfrevlogcompression',
+         [('c', 'changelog', False, 'open changelog'),
+          ('m', 'manifest', False, 'open manifest'),
+          ('', 'dir', False, 'open directory manifest'),
+          ('e', 'engines', '', 'compression engines to compare')]
+         + formatteropts,
+         '-c|-m|FILE')
+def perfrevlogcompression(ui, repo, file_=None, engines='', **opts):
+    """benchmark the compression engines on the chunks of a revlog
+
+    The stored chunks of every revision are compressed and decompressed
+    with each engine supporting revlogs (all the available ones by default)
+    and the total size of the compressed chunks is reported."""
+    rl = cmdutil.openrevlog(repo, 'perfrevlogcompression', file_, opts)
+    chunks = [str(rl._chunk(rev)) for rev in rl]
+    rawsize = sum(len(c) for c in chunks)
+    if engines:
+        names = engines.split(',')
+    else:
+        names = []
+        for name in sorted(util.compengines):
+            engine = util.compengines[name]
+            if engine.available() and (engine.revlogheader()
+                                       or name == 'none'):
+                names.append(name)
+
+    timer, fm = gettimer(ui, opts)
+    for name in names:
+        if name not in util.compengines:
+            raise error.Abort('unknown compression engine: %s' % name)
+        rl._compengine = name
+        rl.__dict__.pop('_compressor', None)
+        compressed = []
+        def docompress():
+            del compressed[:]
+            for chunk in chunks:
+                h, d = rl.compress(chunk)
+                compressed.append(h + d)
+        def dodecompress():
+            for data in compressed:
+                rl.decompress(data)
+        timer(docompress, title='compress %s' % name)
+        timer(dodecompress, title='decompress %s' % name)
+        size = sum(len(d) for d in compressed)
+        fm.startitem()
+        fm.write('engine', '! %s:', name)
+        fm.write('size rawsize', ' %d/%d bytes', size, rawsize)
+        fm.write('ratio', ' (%.2f%%)\n', 100.0 * size / max(rawsize, 1))
     fm.end()
 
 @command('perfrevset',
@@ -470,13 +560,22 @@ def perfrevset(ui, repo, expr, clear=False, **opts):
 
     Use the --clean option if need to evaluate the impact of build volatile
     revisions set cache on the revset execution. Volatile cache hold filtered
-    and obsolete related cache."""
+    and obsolete related cache.
+
+    The revset is evaluated like the ones given to --rev. The hits and
+    misses of the revset cache are reported when it is enabled
+    (experimental.revsetcache)."""
     timer, fm = gettimer(ui, opts)
     def d():
         if clear:
             repo.invalidatevolatilesets()
-        for r in repo.revs(expr): pass
+        for r in scmutil.revrange(repo, [expr]): pass
     timer(d)
+    cache = getattr(repo, 'revsetcache', lambda: None)()
+    if cache is not None:
+        fm.startitem()
+        fm.write('hits misses', 'revset cache: %d hits, %d misses\n',
+                 cache.hits, cache.misses)
     fm.end()
 
 @command('perfvolatilesets', formatteropts)
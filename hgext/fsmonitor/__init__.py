@@ -0,0 +1,221 @@
+# fsmonitor - speed up status with a file watching daemon
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+'''speed up status with a file watching daemon (EXPERIMENTAL)
+
+Without this extension, :hg:`status` (and the commands relying on it,
+like :hg:`diff` or :hg:`commit`) looks at every file of the working
+directory. With it, a daemon started by :hg:`fswatch` keeps track of the
+files changed, and status only looks at those, at the files it found
+changed the previous time and at the files added, removed or merged.
+
+The daemon finds changes with the Linux inotify interface, or by polling
+the working directory, which works everywhere but only moves the cost of
+the full scan to the daemon::
+
+  [fsmonitor]
+  # inotify (default on Linux) or poll
+  watcher = inotify
+
+When the daemon is not running, status looks at every file as usual.
+The changes are tracked from a clock given by the daemon, stored in
+.hg/fsmonitor.state along with the files to look at again. Listing
+ignored or clean files, changes to the ignore rules, restarts of the
+daemon and commands rewriting the dirstate without touching the files,
+like :hg:`rollback` or :hg:`strip --keep`, all lead to a full walk of the
+working directory.
+'''
+
+from __future__ import absolute_import
+
+import errno
+import socket
+import sys
+
+from mercurial.i18n import _
+from mercurial import (
+    cmdutil,
+    dirstate,
+    error,
+    extensions,
+    match as matchmod,
+    scmutil,
+    util,
+)
+
+from . import server
+
+cmdtable = {}
+command = cmdutil.command(cmdtable)
+# Note for extension authors: ONLY specify testedwith = 'internal' for
+# extensions which SHIP WITH MERCURIAL. Non-mainline extensions should
+# be specifying the version(s) of Mercurial they are tested with, or
+# leave the attribute unspecified.
+testedwith = 'internal'
+
+_statefile = 'fsmonitor.state'
+_stateversion = 'fsmonitor1'
+
+def _defaultwatcher():
+    if sys.platform.startswith('linux'):
+        return 'inotify'
+    return 'poll'
+
+def _ignorehash(ds):
+    """hash of the ignore rules of a dirstate"""
+    s = util.sha1()
+    for f in ds._ignorefiles():
+        s.update(f + '\0')
+        try:
+            s.update(util.readfile(f))
+        except IOError:
+            pass
+        s.update('\0')
+    return s.hexdigest()
+
+def _readstate(ds):
+    """return the (clock, ignorehash, notefiles) saved, or None"""
+    try:
+        data = ds._opener.read(_statefile)
+    except IOError:
+        return None
+    lines = data.split('\n', 3)
+    if len(lines) != 4 or lines[0] != _stateversion:
+        return None
+    return lines[1], lines[2], set(f for f in lines[3].split('\0') if f)
+
+def _writestate(ds, clock, ignorehash, notefiles):
+    try:
+        fp = ds._opener(_statefile, 'w', atomictemp=True)
+        try:
+            fp.write('\n'.join([_stateversion, clock, ignorehash,
+                                '\0'.join(sorted(notefiles))]))
+        finally:
+            fp.close()
+    except (IOError, OSError) as inst:
+        ds._ui.debug('fsmonitor: cannot write state: %s\n' % inst)
+
+def _clearstate(ds):
+    try:
+        ds._opener.unlink(_statefile)
+    except OSError as inst:
+        if inst.errno != errno.ENOENT:
+            ds._ui.debug('fsmonitor: cannot remove state: %s\n' % inst)
+
+def _nonnormal(ds):
+    """files whose status does not depend on the working directory
+
+    These are the files added, removed or merged, the files whose dirstate
+    entry needs a lookup and the copies."""
+    files = set(f for f, e in ds._map.iteritems()
+                if e[0] != 'n' or e[3] == -1 or e[2] == -2)
+    files.update(ds._copymap)
+    return files
+
+def _notefiles(lookup, st):
+    """files to look at again: the ones not known to be clean"""
+    notefiles = set(lookup)
+    for l in (st.modified, st.added, st.removed, st.deleted, st.unknown):
+        notefiles.update(l)
+    return notefiles
+
+def _status(orig, self, match, subrepos, ignored, clean, unknown):
+    if ignored or clean or subrepos or match.traversedir is not None:
+        return orig(self, match, subrepos, ignored, clean, unknown)
+
+    state = _readstate(self)
+    ignorehash = _ignorehash(self)
+    since = None
+    if state is not None and state[1] == ignorehash:
+        since = state[0]
+    try:
+        fresh, clock, changed = server.query(self._opener, since)
+    except socket.error as inst:
+        self._ui.debug('fsmonitor: no file watching daemon: %s\n' % inst)
+        return orig(self, match, subrepos, ignored, clean, unknown)
+
+    if fresh:
+        self._ui.debug('fsmonitor: walking the whole working directory\n')
+        lookup, st = orig(self, match, subrepos, ignored, clean, unknown)
+        if match.always() and unknown:
+            _writestate(self, clock, ignorehash, _notefiles(lookup, st))
+        return lookup, st
+
+    dmap = self._map
+    candidates = set(state[2])
+    candidates.update(_nonnormal(self))
+    prefixes = []
+    for f in changed:
+        if f.endswith('/'):
+            # every tracked file below a directory removed or renamed
+            prefixes.append(f)
+        else:
+            candidates.add(f)
+    if prefixes:
+        prefixes = tuple(prefixes)
+        candidates.update(f for f in dmap if f.startswith(prefixes))
+
+    files = [f for f in candidates
+             if match(f) and (unknown or f in dmap)]
+    self._ui.debug('fsmonitor: looking at %d files\n' % len(files))
+    if files:
+        # files removed since they changed are not an error
+        exact = matchmod.exact(self._root, '', sorted(files),
+                               badfn=lambda f, msg: None)
+        lookup, st = orig(self, exact, subrepos, ignored, clean, unknown)
+    else:
+        lookup, st = [], scmutil.status([], [], [], [], [], [], [])
+
+    # the files not looked at keep their previous status
+    notefiles = candidates.difference(files)
+    notefiles.update(_notefiles(lookup, st))
+    _writestate(self, clock, ignorehash, notefiles)
+    return lookup, st
+
+@command('fswatch',
+    [('', 'stop', None, _('stop the running daemon')),
+     ('d', 'daemon', None, _('run the daemon in background')),
+     ('', 'daemon-pipefds', '', _('used internally by daemon mode'), _('FILE')),
+     ('', 'pid-file', '', _('name of file to write process ID to'), _('FILE')),
+    ],
+    _('hg fswatch [OPTION]...'))
+def fswatch(ui, repo, **opts):
+    '''start the file watching daemon of the working directory
+
+    The daemon keeps track of the files changed in the working directory,
+    for status to only look at those. It stops with :hg:`fswatch --stop`.
+
+    Returns 0 on success.
+    '''
+    if opts.get('stop'):
+        try:
+            server.request(repo.vfs, 'shutdown')
+        except socket.error:
+            raise error.Abort(_('no file watching daemon is running'))
+        return 0
+    try:
+        server.request(repo.vfs, 'ping')
+    except socket.error:
+        pass
+    else:
+        raise error.Abort(_('a file watching daemon is already running'))
+    watcher = ui.config('fsmonitor', 'watcher', _defaultwatcher())
+    s = server.server(ui, repo, watcher)
+    cmdutil.service(opts, initfn=s.init, runfn=s.run)
+
+def _clearingstate(orig, self, *args, **kwargs):
+    # the dirstate entries change without the files changing, and the
+    # daemon not reporting them: walk the whole working directory next time
+    _clearstate(self)
+    return orig(self, *args, **kwargs)
+
+def extsetup(ui):
+    extensions.wrapfunction(dirstate.dirstate, 'status', _status)
+    # rebuilt by debugrebuildstate or strip --keep, reread from a file
+    # restored by rollback or by an aborted transaction
+    extensions.wrapfunction(dirstate.dirstate, 'rebuild', _clearingstate)
+    extensions.wrapfunction(dirstate.dirstate, 'invalidate', _clearingstate)
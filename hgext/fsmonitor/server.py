@@ -0,0 +1,196 @@
+# server.py - file watching daemon for the fsmonitor extension
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""daemon answering the changes of a working directory over a unix socket
+
+The socket is .hg/fsmonitor.sock. A client sends one request line and
+reads the answer until the daemon closes the connection:
+
+``since <clock>``
+  the daemon answers 'changes' or 'fresh' on a first line, its current
+  clock on a second one, then the paths changed since the clock sent,
+  separated by NUL characters. 'fresh' means the changes since the clock
+  are not known (first request, restarted daemon, lost events): the client
+  has to look at the whole working directory.
+
+``shutdown``
+  the daemon stops.
+
+A clock is made of an identifier of the daemon instance and of the number
+of the last change the daemon saw.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import select
+import shutil
+import socket
+import tempfile
+
+from mercurial.i18n import _
+from mercurial import (
+    error,
+    util,
+)
+
+from . import watcher as watchermod
+
+sockname = 'fsmonitor.sock'
+
+# sun_path of unix sockets is at most 108 bytes long on Linux
+_maxsockpath = 100
+
+def _connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # long paths are symlinks to a socket in the temporary directory
+        sock.connect(os.path.realpath(path))
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+def request(vfs, line):
+    """send a request to the daemon of the repository of vfs
+
+    Returns the answer of the daemon, raises socket.error if the daemon is
+    not running."""
+    sock = _connect(vfs.join(sockname))
+    try:
+        sock.sendall(line + '\n')
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        sock.close()
+    return ''.join(chunks)
+
+def query(vfs, clock):
+    """return a (fresh, clock, paths) tuple for the changes since clock"""
+    answer = request(vfs, 'since %s' % (clock or ''))
+    kind, clock, paths = answer.split('\n', 2)
+    if kind not in ('fresh', 'changes'):
+        raise socket.error(errno.EPROTO, 'unexpected answer %r' % kind)
+    return kind == 'fresh', clock, [p for p in paths.split('\0') if p]
+
+class server(object):
+    def __init__(self, ui, repo, watchername):
+        self.ui = ui
+        self.root = repo.root
+        self.vfs = repo.vfs
+        if watchername not in watchermod.watchers:
+            raise error.Abort(_('unknown file watcher %s') % watchername)
+        self.watchername = watchername
+        self.watcher = None
+        self.sock = None
+        self.sockpath = repo.vfs.join(sockname)
+        self._tempdir = None
+        self._instance = None
+
+    def init(self):
+        # the socket of a daemon that died
+        util.unlinkpath(self.sockpath, ignoremissing=True)
+        try:
+            self.watcher = watchermod.watchers[self.watchername](self.root)
+        except OSError as inst:
+            raise error.Abort(_('cannot watch %s: %s')
+                              % (self.root, inst.strerror))
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if len(self.sockpath) > _maxsockpath:
+            self._tempdir = tempfile.mkdtemp(prefix='hg-fsmonitor-')
+            path = os.path.join(self._tempdir, sockname)
+            self.sock.bind(path)
+            os.symlink(path, self.sockpath)
+        else:
+            self.sock.bind(self.sockpath)
+        self.sock.listen(5)
+        # the instance changes with every start of the daemon
+        self._instance = '%d.%s' % (os.getpid(), os.urandom(4).encode('hex'))
+
+    def clock(self):
+        return '%s:%d' % (self._instance, self.watcher.seq)
+
+    def _since(self, clock):
+        """return the paths changed since clock, None if not known"""
+        instance, sep, seq = clock.rpartition(':')
+        if instance != self._instance:
+            return None
+        try:
+            seq = int(seq)
+        except ValueError:
+            return None
+        if seq < self.watcher.freshseq:
+            return None
+        return self.watcher.since(seq)
+
+    def _answer(self, line):
+        """return the answer to a request, None to stop the daemon"""
+        if line == 'shutdown':
+            return None
+        if line == 'ping':
+            return 'pong'
+        if line.startswith('since'):
+            self.watcher.sync()
+            paths = self._since(line[len('since'):].strip())
+            if paths is None:
+                return 'fresh\n%s\n' % self.clock()
+            return 'changes\n%s\n%s' % (self.clock(), '\0'.join(paths))
+        return 'error\nunknown request\n'
+
+    def _handle(self, conn):
+        """serve one connection, return False to stop the daemon"""
+        try:
+            data = ''
+            while '\n' not in data:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+            answer = self._answer(data.split('\n', 1)[0])
+            if answer is None:
+                return False
+            conn.sendall(answer)
+        except socket.error as inst:
+            self.ui.warn(_('fsmonitor: connection failed: %s\n') % inst)
+        finally:
+            conn.close()
+        return True
+
+    def run(self):
+        try:
+            fds = [self.sock]
+            if self.watcher.fileno() is not None:
+                fds.append(self.watcher.fileno())
+            while True:
+                try:
+                    ready = select.select(fds, [], [])[0]
+                except select.error as inst:
+                    if inst.args[0] == errno.EINTR:
+                        continue
+                    raise
+                if self.watcher.fileno() in ready:
+                    # keep the kernel queue short
+                    self.watcher.sync()
+                if self.sock in ready:
+                    conn = self.sock.accept()[0]
+                    if not self._handle(conn):
+                        break
+        finally:
+            self.close()
+
+    def close(self):
+        self.sock.close()
+        self.watcher.close()
+        util.unlinkpath(self.sockpath, ignoremissing=True)
+        if self._tempdir:
+            shutil.rmtree(self._tempdir, True)
@@ -0,0 +1,266 @@
+# watcher.py - find the files changed in a working directory
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""keep track of the files changed in a working directory
+
+A watcher numbers the changes it sees: ``seq`` is the number of the last
+change, and ``since(seq)`` returns the paths changed after a given one.
+Deleted or renamed directories are reported as a path ending with '/',
+standing for every path below it. Changes older than ``freshseq`` are not
+known anymore (e.g. when the kernel dropped events): a client asking for
+them has to look at the whole working directory.
+
+Two watchers are available:
+
+- ``inotifywatcher`` is told about changes by the Linux kernel, its cost
+  is proportional to the number of changes,
+- ``pollwatcher`` compares the working directory with a snapshot each
+  time it is synchronized. It is written in pure Python and works
+  everywhere, at the cost of a full scan of the working directory.
+"""
+
+from __future__ import absolute_import
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import stat
+import struct
+
+from mercurial import util
+
+class basewatcher(object):
+    def __init__(self, root):
+        self.root = root
+        self.seq = 0
+        self.freshseq = 0
+        # path -> seq of its last change
+        self._changes = {}
+
+    def _changed(self, path):
+        self.seq += 1
+        self._changes[path] = self.seq
+
+    def _reset(self):
+        """forget every change, older clients need a full walk"""
+        self.seq += 1
+        self.freshseq = self.seq
+        self._changes.clear()
+
+    def since(self, seq):
+        """return the paths changed after seq"""
+        return [p for p, s in self._changes.iteritems() if s > seq]
+
+    def fileno(self):
+        """file descriptor readable when changes are pending, or None"""
+        return None
+
+    def sync(self):
+        """record the changes made until now"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+def _walk(root, reldir=''):
+    """yield (path, stat) for the files below reldir, skipping .hg"""
+    dirs = [reldir]
+    while dirs:
+        d = dirs.pop()
+        try:
+            names = os.listdir(os.path.join(root, d))
+        except OSError as inst:
+            if inst.errno in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                continue
+            raise
+        for name in names:
+            if not d and name == '.hg':
+                continue
+            path = d and d + '/' + name or name
+            try:
+                st = os.lstat(os.path.join(root, path))
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                dirs.append(path)
+            else:
+                yield path, st
+
+class pollwatcher(basewatcher):
+    def __init__(self, root):
+        super(pollwatcher, self).__init__(root)
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for path, st in _walk(self.root):
+            snapshot[path] = (st.st_mode, st.st_size, st.st_mtime,
+                              st.st_ctime, st.st_ino)
+        return snapshot
+
+    def sync(self):
+        old = self._snapshot
+        new = self._scan()
+        for path, entry in new.iteritems():
+            if old.get(path) != entry:
+                self._changed(path)
+        for path in old:
+            if path not in new:
+                self._changed(path)
+        self._snapshot = new
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_watchmask = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_ONLYDIR | IN_DONT_FOLLOW)
+_eventformat = 'iIII'
+_eventsize = struct.calcsize(_eventformat)
+
+_libc = None
+
+def _loadlibc():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library('c')
+        if name is None:
+            raise OSError(errno.ENOSYS, 'C library not found')
+        libc = ctypes.CDLL(name, use_errno=True)
+        if not util.safehasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+        _libc = libc
+    return _libc
+
+def _oserror():
+    err = ctypes.get_errno()
+    return OSError(err, os.strerror(err))
+
+class inotifywatcher(basewatcher):
+    def __init__(self, root):
+        super(inotifywatcher, self).__init__(root)
+        self._libc = _loadlibc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise _oserror()
+        # watch descriptor -> directory, and back
+        self._wds = {}
+        self._dirwds = {}
+        self._addtree('', False)
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        os.close(self._fd)
+
+    def _addtree(self, reldir, report):
+        """watch reldir and its subdirectories
+
+        With report, the files already present are reported as changed:
+        they may have been created before the watch was added."""
+        dirs = [reldir]
+        while dirs:
+            d = dirs.pop()
+            wd = self._libc.inotify_add_watch(self._fd,
+                                              os.path.join(self.root, d),
+                                              _watchmask)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                raise _oserror()
+            self._wds[wd] = d
+            self._dirwds[d] = wd
+            try:
+                names = os.listdir(os.path.join(self.root, d))
+            except OSError:
+                continue
+            for name in names:
+                if not d and name == '.hg':
+                    continue
+                path = d and d + '/' + name or name
+                try:
+                    st = os.lstat(os.path.join(self.root, path))
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    dirs.append(path)
+                elif report:
+                    self._changed(path)
+
+    def _removetree(self, reldir):
+        """stop watching reldir, which is not in the working directory"""
+        prefix = reldir + '/'
+        for d in self._dirwds.keys():
+            if d == reldir or d.startswith(prefix):
+                wd = self._dirwds.pop(d)
+                del self._wds[wd]
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def sync(self):
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as inst:
+                if inst.errno == errno.EAGAIN:
+                    return
+                if inst.errno == errno.EINTR:
+                    continue
+                raise
+            pos = 0
+            while pos < len(data):
+                wd, mask, cookie, l = struct.unpack_from(_eventformat, data,
+                                                         pos)
+                pos += _eventsize
+                name = data[pos:pos + l].rstrip('\0')
+                pos += l
+                self._event(wd, mask, name)
+
+    def _event(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            # events were lost
+            self._reset()
+            return
+        d = self._wds.get(wd)
+        if d is None:
+            return
+        if mask & IN_IGNORED:
+            del self._wds[wd]
+            if self._dirwds.get(d) == wd:
+                del self._dirwds[d]
+            return
+        if not name or (not d and name == '.hg'):
+            return
+        path = d and d + '/' + name or name
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._addtree(path, True)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._removetree(path)
+                self._changed(path + '/')
+        else:
+            self._changed(path)
+
+watchers = {
+    'inotify': inotifywatcher,
+    'poll': pollwatcher,
+}
@@ -142,12 +142,19 @@ class incrementalmissingancestors(object):
 
     Although similar in spirit to lazyancestors below, this is a separate class
     because trying to support contains and missingancestors operations with the
-    same internal data structures adds needless complexity.'''
-    def __init__(self, pfunc, bases):
+    same internal data structures adds needless complexity.
+
+    genfunc, if given, returns the generation number of a revision. It lets
+    removeancestorsfrom keep revisions which cannot be ancestors of the bases,
+    and stop walking bases which can only have ancestors of a lower
+    generation than the revisions left to remove.'''
+    def __init__(self, pfunc, bases, genfunc=None):
         self.bases = set(bases)
         if not self.bases:
             self.bases.add(nullrev)
         self.pfunc = pfunc
+        self.genfunc = genfunc
+        self._maxgen = None
 
     def hasbases(self):
         '''whether the common set has any non-trivial bases'''
@@ -156,6 +163,7 @@ class incrementalmissingancestors(object):
     def addbases(self, newbases):
         '''grow the ancestor set by adding new bases'''
         self.bases.update(newbases)
+        self._maxgen = None
 
     def removeancestorsfrom(self, revs):
         '''remove all ancestors of bases from the set revs (in place)'''
@@ -169,16 +177,31 @@ class incrementalmissingancestors(object):
         # anything in revs > start is definitely not an ancestor of bases
         # revs <= start needs to be investigated
         start = max(bases)
-        keepcount = sum(1 for r in revs if r > start)
-        if len(revs) == keepcount:
+        genfunc = self.genfunc
+        if genfunc is None:
+            candidates = [r for r in revs if r <= start]
+        else:
+            # ancestors of bases have a lower generation number, and the
+            # parents of bases added below never raise the highest one
+            if self._maxgen is None:
+                self._maxgen = max(genfunc(b) for b in bases)
+            maxgen = self._maxgen
+            candidates = [r for r in revs
+                          if r <= start and genfunc(r) <= maxgen]
+        keepcount = len(revs) - len(candidates)
+        if not candidates:
             # no revs to consider
             return
+        if genfunc is not None:
+            # bases of this generation or lower have no ancestors in revs
+            mingen = min(genfunc(r) for r in candidates)
 
         for curr in xrange(start, min(revs) - 1, -1):
             if curr not in bases:
                 continue
             revs.discard(curr)
-            bases.update(pfunc(curr))
+            if genfunc is None or genfunc(curr) > mingen:
+                bases.update(pfunc(curr))
             if len(revs) == keepcount:
                 # no more potential revs to discard
                 break
@@ -258,7 +281,8 @@ class incrementalmissingancestors(object):
         return missing
 
 class lazyancestors(object):
-    def __init__(self, pfunc, revs, stoprev=0, inclusive=False):
+    def __init__(self, pfunc, revs, stoprev=0, inclusive=False,
+                 genfunc=None):
         """Create a new object generating ancestors for the given revs. Does
         not generate revs lower than stoprev.
 
@@ -269,11 +293,17 @@ class lazyancestors(object):
         a boolean that indicates whether revs should be included. Revs lower
         than stoprev will not be generated.
 
+        genfunc, if given, returns the generation number of a revision. It
+        lets membership tests answer without walking the graph for revisions
+        which cannot be ancestors.
+
         Result does not include the null revision."""
         self._parentrevs = pfunc
         self._initrevs = revs
         self._stoprev = stoprev
         self._inclusive = inclusive
+        self._genfunc = genfunc
+        self._maxgen = None
 
         # Initialize data structures for __contains__.
         # For __contains__, we use a heap rather than a deque because
@@ -338,6 +368,20 @@ class lazyancestors(object):
         if target in seen:
             return True
 
+        genfunc = self._genfunc
+        if genfunc is not None and target >= 0:
+            # ancestors have a lower generation number than a revision of
+            # _initrevs
+            try:
+                if self._maxgen is None:
+                    self._maxgen = max([genfunc(r) for r in self._initrevs]
+                                       or [0])
+                if genfunc(target) >= self._maxgen:
+                    return False
+            except IndexError:
+                # not a revision of the changelog, e.g. the working directory
+                pass
+
         parentrevs = self._parentrevs
         visit = self._containsvisit
         stoprev = self._stoprev
@@ -104,7 +104,7 @@ class bundlerevlog(revlog.revlog):
         self.bundle.seek(self.start(rev))
         return self.bundle.read(self.length(rev))
 
-    def revdiff(self, rev1, rev2):
+    def revdiff(self, rev1, rev2, _hashcheck=None):
         """return or calculate a delta between two revisions"""
         if rev1 > self.repotiprev and rev2 > self.repotiprev:
             # hot path for bundle
@@ -112,12 +112,14 @@ class bundlerevlog(revlog.revlog):
             if revb == rev1:
                 return self._chunk(rev2)
         elif rev1 <= self.repotiprev and rev2 <= self.repotiprev:
-            return revlog.revlog.revdiff(self, rev1, rev2)
+            return revlog.revlog.revdiff(self, rev1, rev2,
+                                         _hashcheck=_hashcheck)
 
-        return mdiff.textdiff(self.revision(self.node(rev1)),
-                              self.revision(self.node(rev2)))
+        return mdiff.textdiff(
+            self.revision(self.node(rev1), _hashcheck=_hashcheck),
+            self.revision(self.node(rev2), _hashcheck=_hashcheck))
 
-    def revision(self, nodeorrev):
+    def revision(self, nodeorrev, _hashcheck=None):
         """return an uncompressed revision of a given node or revision
         number.
         """
@@ -148,10 +150,15 @@ class bundlerevlog(revlog.revlog):
             delta = self._chunk(chain.pop())
             text = mdiff.patches(text, [delta])
 
-        self._checkhash(text, node, rev)
+        self._checkhash(text, node, rev, _hashcheck)
         self._cache = (node, rev, text)
         return text
 
+    def revisions(self, revs, _df=None, _hashcheck=None):
+        # the chunks of the bundle are not in the revlog file
+        for rev in revs:
+            yield self.revision(rev, _hashcheck=_hashcheck)
+
     def baserevision(self, nodeorrev):
         # Revlog subclasses may override 'revision' method to modify format of
         # content retrieved from revlog. To use bundlerevlog with such class one
@@ -205,6 +212,12 @@ class bundlemanifest(bundlerevlog, manifest.manifest):
             result = manifest.manifest.revision(self, nodeorrev)
         return result
 
+    def deltadiff(self, node1, node2, match=None):
+        # the deltas of the revisions from the bundle are not in the revlog
+        if max(self.rev(node1), self.rev(node2)) > self.repotiprev:
+            return None
+        return manifest.manifest.deltadiff(self, node1, node2, match)
+
 class bundlefilelog(bundlerevlog, filelog.filelog):
     def __init__(self, opener, path, bundle, linkmapper):
         filelog.filelog.__init__(self, opener, path)
@@ -27,6 +27,7 @@ from . import (
     error,
     mdiff,
     phases,
+    revlog as revlogmod,
     util,
 )
 
@@ -80,11 +81,11 @@ def combineresults(results):
     return result
 
 bundletypes = {
-    "": ("", None),       # only when using unbundle on ssh and old http servers
+    "": ("", 'UN'),       # only when using unbundle on ssh and old http servers
                           # since the unification ssh accepts a header but there
                           # is no capability signaling it.
     "HG20": (), # special-cased below
-    "HG10UN": ("HG10UN", None),
+    "HG10UN": ("HG10UN", 'UN'),
     "HG10BZ": ("HG10", 'BZ'),
     "HG10GZ": ("HG10GZ", 'GZ'),
 }
@@ -124,7 +125,8 @@ def writechunks(ui, chunks, filename, vfs=None):
             else:
                 os.unlink(cleanup)
 
-def writebundle(ui, cg, filename, bundletype, vfs=None, compression=None):
+def writebundle(ui, cg, filename, bundletype, vfs=None, compression=None,
+                compopts=None):
     """Write a bundle file and return its filename.
 
     Existing files will not be overwritten.
@@ -136,7 +138,7 @@ def writebundle(ui, cg, filename, bundletype, vfs=None, compression=None):
     if bundletype == "HG20":
         from . import bundle2
         bundle = bundle2.bundle20(ui)
-        bundle.setcompression(compression)
+        bundle.setcompression(compression, compopts)
         part = bundle.newpart('changegroup', data=cg.getchunks())
         part.addparam('version', cg.version)
         chunkiter = bundle.getchunks()
@@ -147,16 +149,14 @@ def writebundle(ui, cg, filename, bundletype, vfs=None, compression=None):
             raise error.Abort(_('old bundle types only supports v1 '
                                 'changegroups'))
         header, comp = bundletypes[bundletype]
-        if comp not in util.compressors:
+        if comp not in util.compengines.supportedbundletypes:
             raise error.Abort(_('unknown stream compression type: %s')
                               % comp)
-        z = util.compressors[comp]()
-        subchunkiter = cg.getchunks()
+        compengine = util.compengines.forbundletype(comp)
         def chunkiter():
             yield header
-            for chunk in subchunkiter:
-                yield z.compress(chunk)
-            yield z.flush()
+            for chunk in compengine.compressstream(cg.getchunks(), compopts):
+                yield chunk
         chunkiter = chunkiter()
 
     # parse the changegroup data, otherwise we will block
@@ -189,21 +189,23 @@ class cg1unpacker(object):
     deltaheadersize = struct.calcsize(deltaheader)
     version = '01'
     def __init__(self, fh, alg):
-        if alg == 'UN':
-            alg = None # get more modern without breaking too much
-        if not alg in util.decompressors:
+        if alg is None:
+            alg = 'UN'
+        if alg not in util.compengines.supportedbundletypes:
             raise error.Abort(_('unknown stream compression type: %s')
                              % alg)
         if alg == 'BZ':
             alg = '_truncatedBZ'
-        self._stream = util.decompressors[alg](fh)
+
+        compengine = util.compengines.forbundletype(alg)
+        self._stream = compengine.decompressorreader(fh)
         self._type = alg
         self.callback = None
 
     # These methods (compressed, read, seek, tell) all appear to only
     # be used by bundlerepo, but it's a little hard to tell.
     def compressed(self):
-        return self._type is not None
+        return self._type is not None and self._type != 'UN'
     def read(self, l):
         return self._stream.read(l)
     def seek(self, pos):
@@ -529,6 +531,7 @@ class cg1packer(object):
             reorder = util.parsebool(reorder)
         self._repo = repo
         self._reorder = reorder
+        self._trustedreads = False
         self._progress = repo.ui.progress
         if self._repo.ui.verbose and not self._repo.ui.debugflag:
             self._verbosenote = self._repo.ui.note
@@ -573,6 +576,21 @@ class cg1packer(object):
         p = revlog.parentrevs(revs[0])[0]
         revs.insert(0, p)
 
+        # the receiver checks the hashes of the revisions sent, reading them
+        # without checking their hash is safe
+        hashcheck = None
+        if self._trustedreads:
+            hashcheck = 'none'
+
+        # restore the texts the deltas are computed from all at once, in the
+        # order revchunk() asks for them
+        plan = []
+        for r in xrange(len(revs) - 1):
+            plan.extend(self._deltatextrevs(revlog, revs[r + 1], revs[r]))
+        texts = iter(revlog.revisions(plan, _hashcheck=hashcheck))
+        def gettext(rev):
+            return next(texts)
+
         # build deltas
         total = len(revs) - 1
         msgbundling = _('bundling')
@@ -581,7 +599,8 @@ class cg1packer(object):
                 self._progress(msgbundling, r + 1, unit=units, total=total)
             prev, curr = revs[r], revs[r + 1]
             linknode = lookup(revlog.node(curr))
-            for c in self.revchunk(revlog, curr, prev, linknode):
+            for c in self.revchunk(revlog, curr, prev, linknode,
+                                   _hashcheck=hashcheck, _gettext=gettext):
                 yield c
 
         if units is not None:
@@ -606,6 +625,11 @@ class cg1packer(object):
     def generate(self, commonrevs, clnodes, fastpathlinkrev, source):
         '''yield a sequence of changegroup chunks (strings)'''
         repo = self._repo
+        # experimental config: experimental.changegroup.trustedreads
+        self._trustedreads = (source == 'serve' and
+            repo.ui.configbool('experimental', 'changegroup.trustedreads',
+                               True))
+        skipped = revlogmod.hashcheckstats['skipped']
         cl = repo.changelog
         ml = repo.manifest
 
@@ -689,6 +713,11 @@ class cg1packer(object):
 
         yield self.close()
 
+        skipped = revlogmod.hashcheckstats['skipped'] - skipped
+        if skipped:
+            repo.ui.log('changegroup', 'skipped %d revision hash checks\n',
+                        skipped)
+
         if clnodes:
             repo.hook('outgoing', node=hex(clnodes[0]), source=source)
 
@@ -728,15 +757,37 @@ class cg1packer(object):
     def deltaparent(self, revlog, rev, p1, p2, prev):
         return prev
 
-    def revchunk(self, revlog, rev, prev, linknode):
+    def _deltatextrevs(self, revlog, rev, prev):
+        """revisions whose text revchunk() reads to send rev, in order"""
+        p1, p2 = revlog.parentrevs(rev)
+        base = self.deltaparent(revlog, rev, p1, p2, prev)
+        if revlog.iscensored(base) or revlog.iscensored(rev):
+            return []
+        elif base == nullrev:
+            return [rev]
+        elif revlog.deltaparent(rev) == base:
+            # the stored delta is sent as is
+            return []
+        return [base, rev]
+
+    def revchunk(self, revlog, rev, prev, linknode, _hashcheck=None,
+                 _gettext=None):
+        """yield the chunks sending rev
+
+        _gettext returns the texts listed by _deltatextrevs(), in the same
+        order. It is meant to only be used internally.
+        """
         node = revlog.node(rev)
         p1, p2 = revlog.parentrevs(rev)
         base = self.deltaparent(revlog, rev, p1, p2, prev)
+        if _gettext is None:
+            def _gettext(r):
+                return revlog.revision(r, _hashcheck=_hashcheck)
 
         prefix = ''
         if revlog.iscensored(base) or revlog.iscensored(rev):
             try:
-                delta = revlog.revision(node)
+                delta = revlog.revision(node, _hashcheck=_hashcheck)
             except error.CensoredNodeError as e:
                 delta = e.tombstone
             if base == nullrev:
@@ -745,10 +796,12 @@ class cg1packer(object):
                 baselen = revlog.rawsize(base)
                 prefix = mdiff.replacediffheader(baselen, len(delta))
         elif base == nullrev:
-            delta = revlog.revision(node)
+            delta = _gettext(rev)
             prefix = mdiff.trivialdiffheader(len(delta))
+        elif revlog.deltaparent(rev) == base:
+            delta = revlog.revdiff(base, rev, _hashcheck=_hashcheck)
         else:
-            delta = revlog.revdiff(base, rev)
+            delta = mdiff.textdiff(_gettext(base), _gettext(rev))
         p1n, p2n = revlog.parents(node)
         basenode = revlog.node(base)
         meta = self.builddeltaheader(node, p1n, p2n, basenode, linknode)
@@ -143,6 +143,7 @@ class changelog(revlog.revlog):
             # changelogs don't benefit from generaldelta
             self.version &= ~revlog.REVLOGGENERALDELTA
             self._generaldelta = False
+            self._sparserevlog = False
         self._realopener = opener
         self._delayed = False
         self._delaybuf = None
@@ -181,8 +182,7 @@ class changelog(revlog.revlog):
     @util.propertycache
     def nodemap(self):
         # XXX need filtering too
-        self.rev(self.node(0))
-        return self._nodecache
+        return super(changelog, self).nodemap
 
     def reachableroots(self, minroot, heads, roots, includepath=False):
         return self.index.reachableroots2(minroot, heads, roots, includepath)
@@ -22,8 +22,11 @@ import dagparser, context, simplemerge, graphmod, copies
 import random, operator
 import setdiscovery, treediscovery, dagutil, pvec, localrepo, destutil
 import phases, obsolete, exchange, bundle2, repair, lock as lockmod
+import upgrade
+import nodemap as nodemapmod
 import ui as uimod
 import streamclone
+import treedirstate
 
 table = {}
 
@@ -2144,6 +2147,187 @@ def debugdate(ui, date, range=None, **opts):
         m = util.matchdate(range)
         ui.write(("match: %s\n") % m(d[0]))
 
+@command('debugdeltachain',
+    [('c', 'changelog', False, _('open changelog')),
+     ('m', 'manifest', False, _('open manifest')),
+     ('', 'dir', False, _('open directory manifest')),
+     ('s', 'summary', False, _('show aggregate statistics')),
+     ('', 'top', 0, _('only show the NUM revisions with the largest read '
+                      'amplification'), _('NUM')),
+    ] + formatteropts,
+    _('-c|-m|FILE'),
+    optionalrepo=True)
+def debugdeltachain(ui, repo, file_=None, **opts):
+    """dump information about delta chains in a revlog
+
+    Output can be templatized. Available template keywords are:
+
+    :``rev``:       revision number
+    :``chainid``:   delta chain identifier (numbered by unique base)
+    :``chainlen``:  delta chain length to this revision
+    :``prevrev``:   previous revision in delta chain
+    :``deltatype``: role of previous revision in delta chain
+    :``compsize``:  compressed size of revision
+    :``uncompsize``: uncompressed size of revision
+    :``chainsize``: total size of compressed revisions in chain
+    :``chainratio``: total chain size divided by uncompressed revision size
+                    (new delta chains typically start at ratio 2.00)
+    :``lindist``:   linear distance from base revision in delta chain to end
+                    of this revision
+    :``extradist``: total size of revisions not part of this delta chain from
+                    base of delta chain to end of this revision; a measurement
+                    of how much extra data we need to read/seek across to
+                    read the delta chain for this revision
+    :``extraratio``: extradist divided by chainsize; another representation of
+                    how much unrelated data is needed to load this delta chain
+    :``readsize``:  data read from disk to restore this revision, smaller
+                    than lindist when sparse reads skip unrelated data
+    :``readamp``:   readsize divided by uncompressed revision size, the read
+                    amplification of this revision
+
+    With --summary, the mean, 50th, 90th and 99th percentiles and maximum of
+    chainlen, chainsize, chainratio, lindist, readsize and readamp are shown
+    instead, along with the revision holding the maximum (``maxrev``).
+
+    With --top, only the revisions with the largest read amplification are
+    shown, worst first.
+    """
+    r = cmdutil.openrevlog(repo, 'debugdeltachain', file_, opts)
+    index = r.index
+    generaldelta = r.version & revlog.REVLOGGENERALDELTA
+
+    def revinfo(rev):
+        e = index[rev]
+        compsize = e[1]
+        uncompsize = e[2]
+        deltaparent = r.deltaparent(rev)
+        if deltaparent == nullrev:
+            deltatype = 'base'
+        elif not generaldelta:
+            deltatype = 'prev'
+        elif deltaparent == e[5]:
+            deltatype = 'p1'
+        elif deltaparent == e[6]:
+            deltatype = 'p2'
+        elif deltaparent == rev - 1:
+            deltatype = 'prev'
+        else:
+            deltatype = 'other'
+        chain = r._deltachain(rev)
+        chainsize = r._chaininfo(rev)[1]
+        chainbase = r.chainbase(rev)
+        lineardist = r.end(rev) - r.start(chainbase)
+        if r._withsparseread:
+            readsize = sum(r.end(revs[-1]) - r.start(revs[0])
+                           for revs in revlog._slicechunk(r, chain))
+        else:
+            readsize = lineardist
+        return {
+            'rev': rev,
+            'chainbase': chainbase,
+            'chainlen': len(chain),
+            'prevrev': deltaparent,
+            'deltatype': deltatype,
+            'compsize': compsize,
+            'uncompsize': uncompsize,
+            'chainsize': chainsize,
+            'chainratio': float(chainsize) / max(uncompsize, 1),
+            'lindist': lineardist,
+            'extradist': lineardist - chainsize,
+            'extraratio': float(lineardist - chainsize) / max(chainsize, 1),
+            'readsize': readsize,
+            'readamp': float(readsize) / max(uncompsize, 1),
+        }
+
+    infos = [revinfo(rev) for rev in r]
+    chainids = {}
+    for info in infos:
+        info['chainid'] = chainids.setdefault(info['chainbase'],
+                                              len(chainids) + 1)
+
+    fm = ui.formatter('debugdeltachain', opts)
+    if opts.get('summary'):
+        def percentile(values, p):
+            # nearest-rank percentile of sorted values
+            return values[max(0, -(-len(values) * p // 100) - 1)]
+        fm.plain('metric            mean        p50        p90        p99'
+                 '        max  maxrev\n')
+        for metric in ('chainlen', 'chainsize', 'chainratio', 'lindist',
+                       'readsize', 'readamp'):
+            if not infos:
+                break
+            values = sorted(info[metric] for info in infos)
+            if isinstance(values[0], float):
+                numfmt = '%10.2f'
+            else:
+                numfmt = '%10d'
+            maxinfo = max(infos, key=lambda info: info[metric])
+            fm.startitem()
+            fm.write('metric', '%-10s', metric)
+            fm.write('mean', ' %10.2f', float(sum(values)) / len(values))
+            fm.write('p50 p90 p99 max', ' '.join([''] + [numfmt] * 4),
+                     percentile(values, 50), percentile(values, 90),
+                     percentile(values, 99), values[-1])
+            fm.write('maxrev', ' %7d\n', maxinfo['rev'])
+        fm.end()
+        return
+
+    top = opts.get('top')
+    if top:
+        infos = sorted(infos, key=lambda info: (-info['readamp'],
+                                                info['rev']))[:top]
+    fm.plain('    rev  chain# chainlen     prev   delta       '
+             'size    rawsize  chainsize     ratio   lindist extradist '
+             'extraratio   readsize    readamp\n')
+    for info in infos:
+        fm.startitem()
+        fm.write('rev chainid chainlen prevrev deltatype compsize '
+                 'uncompsize chainsize chainratio lindist extradist '
+                 'extraratio readsize readamp',
+                 '%7d %7d %8d %8d %7s %10d %10d %10d %9.5f %9d %9d %10.5f '
+                 '%10d %10.5f\n',
+                 *[info[k] for k in ('rev', 'chainid', 'chainlen', 'prevrev',
+                                     'deltatype', 'compsize', 'uncompsize',
+                                     'chainsize', 'chainratio', 'lindist',
+                                     'extradist', 'extraratio', 'readsize',
+                                     'readamp')])
+    fm.end()
+
+@command('debugdirstateformat', [], _('[FORMAT]'))
+def debugdirstateformat(ui, repo, format=None):
+    """show or change the on-disk format of the dirstate
+
+    With FORMAT, convert the dirstate to the ``flat`` format, readable by
+    every version of Mercurial, or to the ``tree`` format, which older
+    versions cannot read. Converting the dirstate to its current format
+    rewrites it, e.g. to shrink the data file of the tree format.
+    """
+    current = 'treedirstate' in repo.requirements and 'tree' or 'flat'
+    if not format:
+        ui.write('%s\n' % current)
+        return
+    if format not in ('flat', 'tree'):
+        raise error.Abort(_('unknown dirstate format %s') % format)
+    wlock = repo.wlock()
+    try:
+        dirstate = repo.dirstate
+        dmap = dirstate._map
+        if format == 'tree':
+            # older versions must not touch the new dirstate
+            repo.requirements.add('treedirstate')
+            repo._writerequirements()
+            # write every node in a new data file
+            dirstate._map = treedirstate.treemap.frommap(dmap)
+        dirstate._treeformat = format == 'tree'
+        dirstate._dirty = True
+        dirstate.write(repo.currenttransaction())
+        if format == 'flat':
+            repo.requirements.discard('treedirstate')
+            repo._writerequirements()
+            treedirstate.cleanup(repo.vfs)
+    finally:
+        wlock.release()
+
 @command('debugdiscovery',
     [('', 'old', None, _('use old-style discovery')),
     ('', 'nonheads', None,
@@ -2680,6 +2864,76 @@ def debuglocks(ui, repo, **opts):
 
     return held
 
+@command('debugnodemap',
+    [('c', 'changelog', False, _('use the changelog')),
+     ('m', 'manifest', False, _('use the manifest')),
+     ('', 'dump', False, _('dump the entries of the persistent nodemap')),
+     ('', 'check', False, _('check the persistent nodemap against the index')),
+     ('', 'rebuild', False, _('rebuild the persistent nodemap'))],
+    _('[-c|-m] [--dump|--check|--rebuild]'))
+def debugnodemap(ui, repo, **opts):
+    """inspect or rebuild the persistent nodemap of a revlog
+
+    The persistent nodemap of the changelog (or of the manifest with -m)
+    maps nodes to revision numbers without scanning the whole index. It
+    is maintained when the ``experimental.persistent-nodemap`` option is
+    set.
+
+    Without options, show a summary of the persistent nodemap. With
+    --check, verify that all the revisions of the revlog are found in it.
+
+    Returns 0 on success, 1 if the nodemap is missing or inconsistent.
+    """
+    if opts.get('manifest'):
+        r = repo.manifest
+    else:
+        r = repo.unfiltered().changelog
+
+    if opts.get('rebuild'):
+        lock = repo.lock()
+        try:
+            nodemapmod.writedocket(r, nodemapmod.update(r, force=True))
+        finally:
+            lock.release()
+
+    pnm = nodemapmod.load(r)
+    if pnm is None:
+        ui.write(_('no valid persistent nodemap for %s\n') % r.indexfile)
+        return 1
+
+    if opts.get('dump'):
+        for prefix, rev in pnm.dump():
+            ui.write('%s %d\n' % (prefix, rev))
+    elif opts.get('check'):
+        ret = 0
+        seen = 0
+        for prefix, rev in pnm.dump():
+            seen += 1
+            if rev > pnm.tiprev or not hex(r.index[rev][7]).startswith(prefix):
+                ui.write(_('revision %d is not stored under %s\n')
+                         % (rev, prefix))
+                ret = 1
+        if seen != pnm.tiprev + 1:
+            ui.write(_('%d entries for %d revisions\n')
+                     % (seen, pnm.tiprev + 1))
+            ret = 1
+        for rev in xrange(pnm.tiprev + 1):
+            if pnm.rev(r, r.index[rev][7]) != rev:
+                ui.write(_('revision %d not found\n') % rev)
+                ret = 1
+        if not ret:
+            ui.write(_('persistent nodemap of %s is valid\n') % r.indexfile)
+        return ret
+    else:
+        dk = pnm.docket
+        ui.write(_('tip revision: %d\n') % dk.tiprev)
+        ui.write(_('tip node: %s\n') % hex(dk.tipnode))
+        ui.write(_('data length: %d\n') % dk.datalength)
+        ui.write(_('unused data: %d\n') % dk.unusedlength)
+        ui.write(_('revisions not covered: %d\n')
+                 % (len(r) - 1 - dk.tiprev))
+    return 0
+
 @command('debugobsolete',
         [('', 'flags', 0, _('markers flag')),
          ('', 'record-parents', False,
@@ -2982,6 +3236,9 @@ def debugrevlog(ui, repo, file_=None, **opts):
     nump1prev = 0
     nump2prev = 0
     chainlengths = []
+    # compression engine header -> number / size of the chunks
+    chunktypecounts = {}
+    chunktypesizes = {}
 
     datasize = [None, 0, 0L]
     fullsize = [None, 0, 0L]
@@ -3003,6 +3260,9 @@ def debugrevlog(ui, repo, file_=None, **opts):
         if p2 != nullrev:
             nummerges += 1
         size = r.length(rev)
+        chunktype = str(r._chunkraw(rev, rev)[:1]) or 'empty'
+        chunktypecounts[chunktype] = chunktypecounts.get(chunktype, 0) + 1
+        chunktypesizes[chunktype] = chunktypesizes.get(chunktype, 0) + size
         if delta == nullrev:
             chainlengths.append(0)
             numfull += 1
@@ -3058,6 +3318,14 @@ def debugrevlog(ui, repo, file_=None, **opts):
         else:
             return value, 100.0
 
+    def fmtchunktype(chunktype):
+        if chunktype == 'empty':
+            return '    %s     : ' % chunktype
+        elif chunktype.isalpha():
+            return '    0x%s (%s)  : ' % (hex(chunktype), chunktype)
+        else:
+            return '    0x%s      : ' % hex(chunktype)
+
     ui.write(('format : %d\n') % format)
     ui.write(('flags  : %s\n') % ', '.join(flags))
 
@@ -3074,6 +3342,16 @@ def debugrevlog(ui, repo, file_=None, **opts):
     ui.write(('    full      : ') + fmt % pcfmt(fulltotal, totalsize))
     ui.write(('    deltas    : ') + fmt % pcfmt(deltatotal, totalsize))
 
+    ui.write('\n')
+    ui.write(('chunks        : ') + fmt2 % numrevs)
+    for chunktype in sorted(chunktypecounts):
+        ui.write(fmtchunktype(chunktype))
+        ui.write(fmt % pcfmt(chunktypecounts[chunktype], numrevs))
+    ui.write(('chunks size   : ') + fmt2 % totalsize)
+    for chunktype in sorted(chunktypecounts):
+        ui.write(fmtchunktype(chunktype))
+        ui.write(fmt % pcfmt(chunktypesizes[chunktype], totalsize))
+
     ui.write('\n')
     fmt = dfmtstr(max(avgchainlen, compratio))
     ui.write(('avg chain length  : ') + fmt % avgchainlen)
@@ -3257,6 +3535,28 @@ def debugsuccessorssets(ui, repo, *revs):
                     ui.write(node2str(node))
             ui.write('\n')
 
+@command('debugupgraderepo',
+    [('', 'run', False, _('performs an upgrade'))],
+    '')
+def debugupgraderepo(ui, repo, run=False, **opts):
+    """re-encode the revlogs of the repository
+
+    Every revlog is rewritten in a temporary store with the storage format
+    new repositories would get from the current configuration: generaldelta,
+    sparse revlogs, compression engine, as well as delta chain limits such
+    as ``format.maxchainlen``. The temporary store then replaces the
+    original one under the repository lock.
+
+    Without --run, the requirement changes and the current size and read
+    cost of the store are reported. With --run, the upgrade is performed
+    and the size and read cost before and after are reported. The read
+    cost is the number of compressed bytes read to restore every revision.
+
+    The original store is kept in a backup directory under .hg, which can
+    be removed once the upgraded repository has been verified.
+    """
+    upgrade.upgraderepo(ui, repo, run=run)
+
 @command('debugwalk', walkopts, _('[OPTION]... [FILE]...'), inferrepo=True)
 def debugwalk(ui, repo, *pats, **opts):
     """show how files match on given patterns"""
@@ -16,6 +16,7 @@ import obsolete as obsmod
 import repoview
 import fileset
 import revlog
+import worker
 
 propertycache = util.propertycache
 
@@ -98,17 +99,25 @@ class basectx(object):
         # 1000 and cache it so that when you read 1001, we just need to apply a
         # delta to what's in the cache. So that's one full reconstruction + one
         # delta application.
-        if self.rev() is not None and self.rev() < other.rev():
-            self.manifest()
-        mf1 = other._manifestmatches(match, s)
-        mf2 = self._manifestmatches(match, s)
+        mf1 = d = None
+        if (not listclean and self.rev() is not None
+            and other.rev() is not None):
+            # both manifests are stored, their diff may be derived from the
+            # deltas stored between them
+            d = self._repo.manifest.deltadiff(other.manifestnode(),
+                                              self.manifestnode(), match)
+        if d is None:
+            if self.rev() is not None and self.rev() < other.rev():
+                self.manifest()
+            mf1 = other._manifestmatches(match, s)
+            mf2 = self._manifestmatches(match, s)
+            d = mf1.diff(mf2, clean=listclean)
 
         modified, added = [], []
         removed = []
         clean = []
         deleted, unknown, ignored = s.deleted, s.unknown, s.ignored
         deletedset = set(deleted)
-        d = mf1.diff(mf2, clean=listclean)
         for fn, value in d.iteritems():
             if fn in deletedset:
                 continue
@@ -132,9 +141,13 @@ class basectx(object):
                 clean.append(fn)
 
         if removed:
-            # need to filter files if they are already reported as removed
-            unknown = [fn for fn in unknown if fn not in mf1]
-            ignored = [fn for fn in ignored if fn not in mf1]
+            if unknown or ignored:
+                if mf1 is None:
+                    mf1 = other._manifestmatches(match, s)
+                # need to filter files if they are already reported as
+                # removed
+                unknown = [fn for fn in unknown if fn not in mf1]
+                ignored = [fn for fn in ignored if fn not in mf1]
             # if they're deleted, don't report them as removed
             removed = [fn for fn in removed if fn not in deletedset]
 
@@ -1518,13 +1531,27 @@ class workingctx(committablectx):
         modified = []
         fixup = []
         pctx = self._parents[0]
-        # do a full compare of any files that might have changed
-        for f in sorted(files):
-            if (f not in pctx or self.flags(f) != pctx.flags(f)
-                or pctx[f].cmp(self[f])):
+        def compare(files):
+            for f in files:
+                if (f not in pctx or self.flags(f) != pctx.flags(f)
+                    or pctx[f].cmp(self[f])):
+                    yield 1, f
+                else:
+                    yield 0, f
+        # do a full compare of any files that might have changed, in worker
+        # processes when there are enough of them: after an update touched
+        # many files, reading and decompressing their revisions dominates
+        # the time status takes. Read the manifest once, before forking.
+        pctx.manifest()
+        prog = worker.worker(self._repo.ui, 0.001, compare, (), sorted(files))
+        for ismodified, f in prog:
+            if ismodified:
                 modified.append(f)
             else:
                 fixup.append(f)
+        # workers report their results as they come
+        modified.sort()
+        fixup.sort()
 
         # update dirstate for files that are actually clean
         if fixup:
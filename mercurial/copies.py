@@ -145,6 +145,12 @@ def _computeforwardmissing(a, b, match=None):
     This is its own function so extensions can easily wrap this call to see what
     files _forwardcopies is about to process.
     """
+    if a.rev() is not None and b.rev() is not None:
+        d = a._repo.manifest.deltadiff(a.manifestnode(), b.manifestnode(),
+                                       match)
+        if d is not None:
+            return set(f for f, ((n1, fl1), (n2, fl2)) in d.iteritems()
+                       if n1 is None)
     ma = a.manifest()
     mb = b.manifest()
     if match:
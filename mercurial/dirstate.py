@@ -8,12 +8,14 @@
 from node import nullid
 from i18n import _
 import scmutil, util, osutil, parsers, encoding, pathutil, error
-import os, stat, errno
+import treedirstate
+import os, stat, errno, threading
 import match as matchmod
 
 propertycache = util.propertycache
 filecache = scmutil.filecache
 _rangemask = 0x7fffffff
+_dircacheversion = 'dircache1'
 
 dirstatetuple = parsers.dirstatetuple
 
@@ -36,6 +38,53 @@ def _getfsnow(vfs):
         os.close(tmpfd)
         vfs.unlink(tmpname)
 
+def _parallellstat(paths, workers):
+    '''lstat paths with a pool of threads
+
+    Return a function behaving like os.lstat, answering from the results
+    for paths and calling os.lstat for the other files. The system calls
+    release the GIL, so the threads wait on the filesystem together.'''
+    results = {}
+    workers = min(workers, len(paths))
+    if workers > 1:
+        def run(paths):
+            lstat = os.lstat
+            for p in paths:
+                try:
+                    results[p] = lstat(p)
+                except OSError as inst:
+                    results[p] = inst
+        threads = [threading.Thread(target=run, args=(paths[i::workers],))
+                   for i in xrange(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def lstat(path):
+        st = results.get(path)
+        if st is None:
+            return os.lstat(path)
+        if isinstance(st, OSError):
+            raise st
+        return st
+    return lstat
+
+def _statfiles(lstat, paths):
+    '''like util.statfiles, with lstat to stat the files'''
+    getkind = stat.S_IFMT
+    wantedkinds = (stat.S_IFREG, stat.S_IFLNK)
+    for p in paths:
+        try:
+            st = lstat(p)
+            if getkind(st.st_mode) not in wantedkinds:
+                st = None
+        except OSError as err:
+            if err.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+            st = None
+        yield st
+
 def _trypending(root, vfs, filename):
     '''Open  file to be read according to HG_PENDING environment variable
 
@@ -54,14 +103,16 @@ def _trypending(root, vfs, filename):
 
 class dirstate(object):
 
-    def __init__(self, opener, ui, root, validate):
+    def __init__(self, opener, ui, root, validate, treeformat=False):
         '''Create a new dirstate object.
 
         opener is an open()-like callable that can be used to open the
         dirstate file; root is the root of the directory tracked by
-        the dirstate.
+        the dirstate. With treeformat, the dirstate is written in the
+        format of the treedirstate module.
         '''
         self._opener = opener
+        self._treeformat = treeformat
         self._validate = validate
         self._root = root
         # ntpath.join(root, '') of Python 2.7.9 does not add sep if root is
@@ -79,6 +130,7 @@ class dirstate(object):
         self._parentwriters = 0
         self._filename = 'dirstate'
         self._pendingfilename = '%s.pending' % self._filename
+        self._dircachefile = 'cache/dircache'
 
         # for consistent view between _pl() and _read() invocations
         self._pendingmode = None
@@ -125,8 +177,10 @@ class dirstate(object):
         except AttributeError:
             pass
         else:
-            return makefilefoldmap(self._map, util.normcasespec,
-                                   util.normcasefallback)
+            # the C version only handles a dict
+            if isinstance(self._map, dict):
+                return makefilefoldmap(self._map, util.normcasespec,
+                                       util.normcasefallback)
 
         f = {}
         normcase = util.normcase
@@ -171,13 +225,16 @@ class dirstate(object):
 
     @propertycache
     def _dirs(self):
+        if not isinstance(self._map, dict):
+            # the C version only skips entries of a dict
+            return util.dirs([f for f, s in self._map.iteritems()
+                              if s[0] != 'r'])
         return util.dirs(self._map, 'r')
 
     def dirs(self):
         return self._dirs
 
-    @rootcache('.hgignore')
-    def _ignore(self):
+    def _ignorefiles(self):
         files = []
         if os.path.exists(self._join('.hgignore')):
             files.append(self._join('.hgignore'))
@@ -186,7 +243,11 @@ class dirstate(object):
                 # we need to use os.path.join here rather than self._join
                 # because path is arbitrary and user-specified
                 files.append(os.path.join(self._rootdir, util.expandpath(path)))
+        return files
 
+    @rootcache('.hgignore')
+    def _ignore(self):
+        files = self._ignorefiles()
         if not files:
             return util.never
 
@@ -370,7 +431,7 @@ class dirstate(object):
         self._pendingmode = mode
         return fp
 
-    def _read(self):
+    def _read(self, retry=True):
         self._map = {}
         self._copymap = {}
         try:
@@ -386,6 +447,22 @@ class dirstate(object):
         if not st:
             return
 
+        if treedirstate.istree(st):
+            try:
+                self._map, self._copymap = treedirstate.read(self._opener,
+                                                             st)
+            except IOError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+                if not retry:
+                    raise error.Abort(_('working directory state appears '
+                                        'damaged!'))
+                # replaced by a concurrent write, read the new dirstate
+                return self._read(retry=False)
+            if not self._dirtypl:
+                self._pl = st[:20], st[20:40]
+            return
+
         if util.safehasattr(parsers, 'dict_new_presized'):
             # Make an estimate of the number of files in the dirstate based on
             # its size. From a linear regression on a set of real-world repos,
@@ -629,7 +706,10 @@ class dirstate(object):
         return path
 
     def clear(self):
-        self._map = {}
+        if self._treeformat:
+            self._map = treedirstate.treemap()
+        else:
+            self._map = {}
         if "_dirs" in self.__dict__:
             delattr(self, "_dirs")
         self._copymap = {}
@@ -705,11 +785,78 @@ class dirstate(object):
         # use the modification time of the newly created temporary file as the
         # filesystem's notion of 'now'
         now = util.statmtimesec(util.fstat(st)) & _rangemask
-        st.write(parsers.pack_dirstate(self._map, self._copymap, self._pl, now))
-        st.close()
+        if self._treeformat:
+            self._map, newfile = treedirstate.write(self._opener, st,
+                                                    self._map, self._copymap,
+                                                    self._pl, now)
+            st.close()
+            if newfile:
+                treedirstate.cleanup(self._opener)
+        else:
+            if not isinstance(self._map, dict):
+                # read from a tree dirstate
+                self._map = dict(self._map.iteritems())
+            st.write(parsers.pack_dirstate(self._map, self._copymap, self._pl,
+                                           now))
+            st.close()
         self._lastnormaltime = 0
         self._dirty = self._dirtypl = False
 
+    @propertycache
+    def _dircache(self):
+        '''Return the directory listings kept from previous walks, as a map
+        from directory to (mtime, entries), entries being the (name, kind)
+        pairs osutil.listdir returned when the directory had that mtime.'''
+        self._dircachedirty = False
+        try:
+            data = self._opener.read(self._dircachefile)
+        except IOError as inst:
+            if inst.errno != errno.ENOENT:
+                raise
+            return {}
+        # format: version line, then NUL separated fields: directory,
+        # mtime, number of entries and that many '<kind>:<name>' fields
+        header, sep, data = data.partition('\n')
+        if header != _dircacheversion or not data:
+            return {}
+        cache = {}
+        fields = data.split('\0')
+        pos = 0
+        try:
+            while pos < len(fields):
+                d, mtime, count = fields[pos:pos + 3]
+                pos += 3
+                end = pos + int(count)
+                entries = []
+                for e in fields[pos:end]:
+                    kind, name = e.split(':', 1)
+                    entries.append((name, int(kind)))
+                if len(entries) != int(count):
+                    return {}
+                cache[d] = (int(mtime), entries)
+                pos = end
+        except ValueError:
+            # truncated or corrupted file, start over
+            return {}
+        return cache
+
+    def _writedircache(self):
+        fields = []
+        for d, (mtime, entries) in sorted(self._dircache.iteritems()):
+            fields.extend([d, str(mtime), str(len(entries))])
+            fields.extend('%d:%s' % (kind, name) for name, kind in entries)
+        try:
+            fp = self._opener(self._dircachefile, 'w', atomictemp=True)
+            try:
+                fp.write(_dircacheversion + '\n' + '\0'.join(fields))
+            finally:
+                fp.close()
+        except (IOError, OSError):
+            # the cache is only an optimization, e.g. for read-only
+            # repositories
+            pass
+        self._dircachedirty = False
+
     def _dirignore(self, f):
         if f == '.':
             return False
@@ -720,6 +867,13 @@ class dirstate(object):
                 return True
         return False
 
+    def _statworkers(self):
+        '''number of threads stat'ing files during walk, 0 to stat them
+        serially'''
+        # experimental config: experimental.dirstate.statworkers
+        return max(self._ui.configint('experimental', 'dirstate.statworkers',
+                                      0), 0)
+
     def _walkexplicit(self, match, subrepos):
         '''Get stat data about the files explicitly specified by match.
 
@@ -780,6 +934,10 @@ class dirstate(object):
         results = dict.fromkeys(subrepos)
         results['.hg'] = None
 
+        statworkers = self._statworkers()
+        if statworkers and not normalize:
+            lstat = _parallellstat([join(ff) for ff in files], statworkers)
+
         alldirs = None
         for ff in files:
             # constructing the foldmap is expensive, so don't do it for the
@@ -909,6 +1067,60 @@ class dirstate(object):
         work = [d for d in work if not dirignore(d[0])]
 
         # step 2: visit subdirectories
+        dircache = None
+        # experimental config: experimental.dirstate.dircache
+        if work and self._ui.configbool('experimental', 'dirstate.dircache'):
+            try:
+                # a directory changed in the same second as it is listed
+                # may change again without its mtime changing
+                fsnow = _getfsnow(self._opener)
+                dircache = self._dircache
+            except OSError:
+                pass
+        visiteddirs = set()
+        stats = [0, 0]
+
+        # listing a directory does not release the GIL: with stat workers,
+        # directories are listed without stat'ing their files, which are
+        # stat'ed by the workers once the traversal is over
+        statworkers = self._statworkers()
+        deferred = []
+
+        def listnostat(nd, skip):
+            return [(f, kind, None)
+                    for f, kind in listdir(join(nd), skip=skip)]
+
+        def readdir(nd, skip):
+            '''return (entries, nostat) for directory nd
+
+            Entries come without a stat result when nostat is True: they come
+            from an earlier listing of a directory whose mtime did not change
+            since, or the files are stat'ed by the stat workers later.'''
+            if dircache is None:
+                if statworkers:
+                    return listnostat(nd, skip), True
+                return listdir(join(nd), stat=True, skip=skip), False
+            visiteddirs.add(nd)
+            st = lstat(join(nd))
+            mtime = util.statmtimesec(st)
+            cached = dircache.get(nd)
+            if (cached is not None and cached[0] == mtime
+                and stat.S_ISDIR(st.st_mode)):
+                stats[1] += 1
+                return [(f, kind, None) for f, kind in cached[1]], True
+            stats[0] += 1
+            if statworkers:
+                entries = listnostat(nd, skip)
+            else:
+                entries = listdir(join(nd), stat=True, skip=skip)
+            if mtime < fsnow:
+                dircache[nd] = (mtime, [(f, kind) for f, kind, st in entries])
+                self._dircachedirty = True
+            elif cached is not None:
+                del dircache[nd]
+                self._dircachedirty = True
+            return entries, bool(statworkers)
+
         def traverse(work, alreadynormed):
             wadd = work.append
             while work:
@@ -919,7 +1131,7 @@ class dirstate(object):
                 else:
                     skip = '.hg'
                 try:
-                    entries = listdir(join(nd), stat=True, skip=skip)
+                    entries, nostat = readdir(nd, skip)
                 except OSError as inst:
                     if inst.errno in (errno.EACCES, errno.ENOENT):
                         match.bad(self.pathto(nd), inst.strerror)
@@ -944,14 +1156,19 @@ class dirstate(object):
                                 results[nf] = None
                         elif kind == regkind or kind == lnkkind:
                             if nf in dmap:
-                                if matchalways or matchfn(nf):
+                                # files without stat result are stat'ed with
+                                # the other dmap files in step 3
+                                if not nostat and (matchalways or matchfn(nf)):
                                     results[nf] = st
                             elif ((matchalways or matchfn(nf))
                                   and not ignore(nf)):
                                 # unknown file -- normalize if necessary
                                 if not alreadynormed:
                                     nf = normalize(nf, False, True)
-                                results[nf] = st
+                                if nostat:
+                                    deferred.append(nf)
+                                else:
+                                    results[nf] = st
                         elif nf in dmap and (matchalways or matchfn(nf)):
                             results[nf] = None
 
@@ -961,6 +1178,31 @@ class dirstate(object):
             alreadynormed = not normalize or nd == d
             traverse([d], alreadynormed)
 
+        if deferred:
+            paths = [join(nf) for nf in deferred]
+            if statworkers:
+                statfn = _parallellstat(paths, statworkers)
+            else:
+                statfn = lstat
+            for nf, path in zip(deferred, paths):
+                try:
+                    results[nf] = statfn(path)
+                except OSError:
+                    # the file vanished since the directory was listed
+                    pass
+
+        if dircache is not None:
+            self._ui.debug('dircache: listed %d directories, %d from cache\n'
+                           % (stats[0], stats[1]))
+            if matchalways and unknown and not ignored:
+                # the whole working directory was walked: forget the
+                # directories which are gone or ignored now
+                for d in set(dircache) - visiteddirs:
+                    del dircache[d]
+                    self._dircachedirty = True
+            if self._dircachedirty:
+                self._writedircache()
+
         for s in subrepos:
             del results[s]
         del results['.hg']
@@ -982,6 +1224,10 @@ class dirstate(object):
                 # and is already in results.
                 # The rest must thus be ignored or under a symlink.
                 audit_path = pathutil.pathauditor(self._root)
+                statfn = lstat
+                if statworkers:
+                    statfn = _parallellstat([join(nf) for nf in visit],
+                                            statworkers)
 
                 for nf in iter(visit):
                     # If a stat for the same file was already added with a
@@ -995,7 +1241,7 @@ class dirstate(object):
                     # under a symlink directory.
                     elif audit_path.check(nf):
                         try:
-                            results[nf] = lstat(join(nf))
+                            results[nf] = statfn(join(nf))
                             # file was just ignored, no links, and exists
                         except OSError:
                             # file doesn't exist
@@ -1008,7 +1254,12 @@ class dirstate(object):
                 # We may not have walked the full directory tree above,
                 # so stat and check everything we missed.
                 nf = iter(visit).next
-                for st in util.statfiles([join(i) for i in visit]):
+                paths = [join(i) for i in visit]
+                if statworkers:
+                    sts = _statfiles(_parallellstat(paths, statworkers), paths)
+                else:
+                    sts = util.statfiles(paths)
+                for st in sts:
                     results[nf()] = st
         return results
 
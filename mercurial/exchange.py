@@ -16,12 +16,6 @@ import sslutil
 import tags
 import url as urlmod
 
-# Maps bundle compression human names to internal representation.
-_bundlespeccompressions = {'none': None,
-                           'bzip2': 'BZ',
-                           'gzip': 'GZ',
-                          }
-
 # Maps bundle version human names to changegroup versions.
 _bundlespeccgversions = {'v1': '01',
                          'v2': '02',
@@ -93,7 +87,7 @@ def parsebundlespec(repo, spec, strict=True, externalnames=False):
     if '-' in spec:
         compression, version = spec.split('-', 1)
 
-        if compression not in _bundlespeccompressions:
+        if compression not in util.compengines.supportedbundlenames:
             raise error.UnsupportedBundleSpecification(
                     _('%s compression is not supported') % compression)
 
@@ -109,7 +103,7 @@ def parsebundlespec(repo, spec, strict=True, externalnames=False):
 
         spec, params = parseparams(spec)
 
-        if spec in _bundlespeccompressions:
+        if spec in util.compengines.supportedbundlenames:
             compression = spec
             version = 'v1'
             if 'generaldelta' in repo.requirements:
@@ -136,7 +130,11 @@ def parsebundlespec(repo, spec, strict=True, externalnames=False):
                       ', '.join(sorted(missingreqs)))
 
     if not externalnames:
-        compression = _bundlespeccompressions[compression]
+        engine = util.compengines.forbundlename(compression)
+        compression = engine.bundletype()[1]
+        if compression == 'UN':
+            # uncompressed bundles carry no compression marker
+            compression = None
         version = _bundlespeccgversions[version]
     return compression, version, params
 
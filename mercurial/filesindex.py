@@ -0,0 +1,396 @@
+# filesindex.py - persistent index of the files changed by each changeset
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""persistent index of the files changed by each changeset
+
+Filtering changesets on the files they touch (``file()``, ``modifies()``,
+``hg log DIR``...) needs the list of files of each changeset, which the
+changelog only gives by decompressing and parsing whole changeset entries.
+With ``experimental.changedfilesindex``, these lists are kept in .hg/cache:
+
+- cf-names-v1 holds the file names, separated by NUL bytes. It is
+  append-only and each name is only stored once, so its position identifies
+  it.
+- cf-files-v1 holds the numbers of the names changed by each changeset, as
+  big-endian 32 bits integers.
+- cf-revs-v1 holds one ``_recfmt`` record per revision: the first 4 bytes
+  of the changeset node, followed by the position and the number of its
+  entries in cf-files-v1.
+- cf-links-v1 holds, for each entry of cf-files-v1, its revision and the
+  position of the previous entry of the same name (``_nolink`` for the
+  first one), as big-endian 32 bits integers.
+- cf-heads-v1 starts with a ``_headfmt`` header: the number of entries of
+  cf-files-v1 it covers and the node prefix of the revision of the last
+  one. It is followed by the position of the last entry of each name.
+
+Like for the revision branch cache, records are only used while their node
+prefix matches the changelog: records are dropped from the first one which
+does not match anymore, e.g. after a strip or a rollback.
+
+The index is brought up to date when a transaction closes, and when it is
+used. The revisions changing a name are found by following its links from
+its head, without reading the changelog or the records of other names.
+cf-heads-v1 is rewritten when entries are added, the other files are only
+appended to, or truncated.
+"""
+
+from __future__ import absolute_import
+
+import array
+import bisect
+import struct
+import sys
+
+from . import (
+    error,
+)
+
+_version = '-v1'
+_names = 'cache/cf-names' + _version
+_files = 'cache/cf-files' + _version
+_revs = 'cache/cf-revs' + _version
+_links = 'cache/cf-links' + _version
+_heads = 'cache/cf-heads' + _version
+# [4 byte hash prefix][4 byte position in cf-files][4 byte number of files]
+_recfmt = '>4sII'
+_recsize = struct.calcsize(_recfmt)
+_nodelen = 4
+# [4 byte number of entries][4 byte hash prefix of the last one]
+_headfmt = '>I4s'
+_headsize = struct.calcsize(_headfmt)
+_nolink = 0xffffffff
+
+def _idarray(data=''):
+    """array of file numbers from their on-disk representation"""
+    a = array.array('I')
+    if a.itemsize != 4:
+        a = array.array('L')
+    a.fromstring(data)
+    if sys.byteorder == 'little':
+        a.byteswap()
+    return a
+
+def _iddata(a):
+    """on-disk representation of an array of file numbers"""
+    if sys.byteorder == 'little':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return a.tostring()
+
+class changedfilesindex(object):
+    """Persistent map from revision number to the files changed by the
+    changeset. This is a low level cache, independent of filtering."""
+
+    def __init__(self, repo):
+        assert repo.filtername is None
+        self._repo = repo
+        self._names = [] # file names, their index being their number
+        self._namesreverse = {}
+        self._sortednames = [] # file names in order, built when needed
+        self._recs = array.array('c') # _recfmt records
+        self._ids = _idarray() # file numbers of the records
+        # revision and previous entry of each entry, in turn
+        self._links = _idarray()
+        # last entry of each file number
+        self._heads = _idarray()
+        try:
+            data = repo.vfs.read(_names)
+            if data:
+                self._names = data.split('\0')
+            self._recs.fromstring(repo.vfs.read(_revs))
+            self._ids = _idarray(repo.vfs.read(_files))
+        except (IOError, OSError) as inst:
+            repo.ui.debug("couldn't read changed files index: %s\n" % inst)
+        del self._recs[len(self._recs) - len(self._recs) % _recsize:]
+        # records and file numbers are written after the names they use and
+        # before the records using them, ignore anything left unfinished
+        if self._ids and max(self._ids) >= len(self._names):
+            self._recs = array.array('c')
+            self._ids = _idarray()
+        n = len(self._recs) // _recsize
+        while n and self._end(n - 1) > len(self._ids):
+            n -= 1
+        self._truncate(n)
+        self._namesreverse = dict((f, i) for i, f in enumerate(self._names))
+        self._readlinks()
+        # what is on disk
+        self._nameslen = len(self._names)
+        self._namesdatalen = len('\0'.join(self._names))
+        self._recslen = len(self)
+        self._idslen = len(self._ids)
+
+    def _readlinks(self):
+        """read the links and heads, completing them for the entries they
+        do not cover"""
+        vfs = self._repo.vfs
+        ids = self._ids
+        try:
+            links = _idarray(vfs.read(_links))
+            heads = vfs.read(_heads)
+        except (IOError, OSError) as inst:
+            self._repo.ui.debug("couldn't read changed files index links: "
+                                "%s\n" % inst)
+            links = _idarray()
+            heads = ''
+        del links[2 * len(ids):]
+        del links[len(links) - len(links) % 2:]
+        nlinks = len(links) // 2
+        n = 0
+        if len(heads) >= _headsize:
+            n, node = struct.unpack_from(_headfmt, heads)
+            # the heads may come from before a strip
+            if n > nlinks:
+                n = 0
+            elif n:
+                rev = links[2 * n - 2]
+                if rev >= len(self) or self._record(rev)[0] != node:
+                    n = 0
+        if n:
+            heads = _idarray(heads[_headsize:_headsize + 4 * len(self._names)])
+        else:
+            heads = _idarray()
+        heads.extend([_nolink] * (len(self._names) - len(heads)))
+        for pos in xrange(n, nlinks):
+            heads[ids[pos]] = pos
+        self._links = links
+        self._heads = heads
+        self._linkslen = nlinks
+        self._headslen = n
+        if nlinks < len(ids):
+            # link the entries from the first revision with unlinked ones
+            lo, hi = 0, len(self) - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._end(mid) <= nlinks:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            for rev in xrange(lo, len(self)):
+                node, start, count = self._record(rev)
+                for pos in xrange(max(start, nlinks), start + count):
+                    self._link(rev, pos)
+
+    def _link(self, rev, pos):
+        """link the entry at pos of revision rev to the previous one of its
+        name"""
+        i = self._ids[pos]
+        self._links.append(rev)
+        self._links.append(self._heads[i])
+        self._heads[i] = pos
+
+    def __len__(self):
+        """number of revisions in the index"""
+        return len(self._recs) // _recsize
+
+    def _record(self, rev):
+        return struct.unpack_from(_recfmt, self._recs, rev * _recsize)
+
+    def _end(self, rev):
+        node, start, count = self._record(rev)
+        return start + count
+
+    def _truncate(self, n):
+        """drop the records from revision n"""
+        del self._recs[n * _recsize:]
+        del self._ids[n and self._end(n - 1) or 0:]
+        end = len(self._ids)
+        links = self._links
+        if len(links) > 2 * end:
+            heads = self._heads
+            for i, pos in enumerate(heads):
+                while pos != _nolink and pos >= end:
+                    pos = links[2 * pos + 1]
+                heads[i] = pos
+            del links[2 * end:]
+            self._linkslen = min(self._linkslen, end)
+            self._headslen = -1
+
+    def _validate(self, cl):
+        """drop the records which do not match the changelog anymore"""
+        n = min(len(self), len(cl))
+        node = cl.node
+        if n and self._record(n - 1)[0] != node(n - 1)[:_nodelen]:
+            # the changelog only loses its last revisions: find the first
+            # one which changed
+            lo, hi = 0, n - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._record(mid)[0] == node(mid)[:_nodelen]:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            n = lo
+        if n < len(self):
+            self._truncate(n)
+            self._recslen = min(self._recslen, n)
+            self._idslen = min(self._idslen, len(self._ids))
+
+    def update(self):
+        """add the revisions missing from the index"""
+        cl = self._repo.changelog
+        self._validate(cl)
+        names = self._names
+        namesreverse = self._namesreverse
+        ids = self._ids
+        heads = self._heads
+        link = self._link
+        for rev in xrange(len(self), len(cl)):
+            node = cl.node(rev)
+            files = cl.read(node)[3]
+            start = len(ids)
+            for f in files:
+                i = namesreverse.get(f)
+                if i is None:
+                    i = namesreverse[f] = len(names)
+                    names.append(f)
+                    heads.append(_nolink)
+                ids.append(i)
+                link(rev, len(ids) - 1)
+            self._recs.fromstring(struct.pack(_recfmt, node[:_nodelen], start,
+                                              len(files)))
+
+    def files(self, rev):
+        """files changed by revision rev"""
+        if not 0 <= rev < len(self):
+            # e.g. the working directory
+            return self._repo[rev].files()
+        node, start, count = self._record(rev)
+        names = self._names
+        return [names[i] for i in self._ids[start:start + count]]
+
+    def _candidates(self, match):
+        """numbers of the names which match may match, or None when all of
+        them have to be tried
+
+        Names matched by exact matchers, or by matchers made of paths only,
+        are found by looking the paths up instead of trying every name."""
+        if match.always() or not (match.isexact() or match.prefix()):
+            return None
+        files = match.files()
+        if '' in files or '.' in files:
+            return None
+        names = self._names
+        namesreverse = self._namesreverse
+        candidates = set(namesreverse[f] for f in files if f in namesreverse)
+        if match.isexact():
+            return candidates
+        sortednames = self._sortednames
+        if len(sortednames) != len(names):
+            # names are only ever appended
+            sortednames = self._sortednames = sorted(names)
+        for f in files:
+            # the names in directory f follow f + '/' in sorted order
+            prefix = f + '/'
+            pos = bisect.bisect_left(sortednames, prefix)
+            while (pos < len(sortednames)
+                   and sortednames[pos].startswith(prefix)):
+                candidates.add(namesreverse[sortednames[pos]])
+                pos += 1
+        return candidates
+
+    def matchrevs(self, match):
+        """set of the revisions of the index changing files matched by
+        match"""
+        links = self._links
+        heads = self._heads
+        names = self._names
+        candidates = self._candidates(match)
+        if candidates is None:
+            candidates = xrange(len(names))
+        revs = set()
+        for i in candidates:
+            f = names[i]
+            pos = heads[i]
+            if pos != _nolink and match(f):
+                while True:
+                    revs.add(links[2 * pos])
+                    prev = links[2 * pos + 1]
+                    # links only go backward, up to _nolink
+                    if prev >= pos:
+                        break
+                    pos = prev
+        return revs
+
+    def _append(self, name, start, data):
+        """write data at position start of file name, truncating it"""
+        f = self._repo.vfs.open(name, 'ab')
+        try:
+            if f.tell() != start:
+                f.seek(start)
+                f.truncate()
+            f.write(data)
+        finally:
+            f.close()
+
+    def write(self, tr=None):
+        """save the index if it changed
+
+        Nothing is written if the wlock cannot be acquired at once."""
+        if (self._nameslen == len(self._names)
+            and self._idslen == len(self._ids)
+            and self._recslen == len(self)
+            and self._linkslen == self._headslen == len(self._ids)):
+            return
+        repo = self._repo
+        vfs = repo.vfs
+        try:
+            wlock = repo.wlock(wait=False)
+        except error.LockError:
+            repo.ui.debug("not writing changed files index: wlock cannot be "
+                          "acquired\n")
+            return
+        try:
+            if self._nameslen < len(self._names):
+                f = None
+                if self._nameslen:
+                    f = vfs.open(_names, 'ab')
+                    if f.tell() == self._namesdatalen:
+                        f.write('\0')
+                    else:
+                        f.close()
+                        f = None
+                        repo.ui.debug("%s changed - rewriting it\n" % _names)
+                        self._nameslen = self._recslen = self._idslen = 0
+                        self._linkslen = 0
+                        self._headslen = -1
+                if f is None:
+                    f = vfs.open(_names, 'wb')
+                try:
+                    f.write('\0'.join(self._names[self._nameslen:]))
+                    self._namesdatalen = f.tell()
+                finally:
+                    f.close()
+                self._nameslen = len(self._names)
+            if self._headslen == -1:
+                # entries get rewritten: first drop the links and heads
+                # covering the old ones
+                self._append(_links, self._linkslen * 8, '')
+                vfs.unlinkpath(_heads, ignoremissing=True)
+            if self._idslen < len(self._ids):
+                self._append(_files, self._idslen * 4,
+                             _iddata(self._ids[self._idslen:]))
+                self._idslen = len(self._ids)
+            if self._recslen < len(self):
+                start = self._recslen * _recsize
+                self._append(_revs, start, self._recs[start:].tostring())
+                self._recslen = len(self)
+            if self._linkslen < len(self._ids):
+                self._append(_links, self._linkslen * 8,
+                             _iddata(self._links[2 * self._linkslen:]))
+                self._linkslen = len(self._ids)
+            if self._headslen != len(self._ids):
+                n = len(self._ids)
+                node = n and self._record(self._links[2 * n - 2])[0] or ''
+                f = vfs(_heads, 'w', atomictemp=True)
+                f.write(struct.pack(_headfmt, n, node))
+                f.write(_iddata(self._heads))
+                f.close()
+                self._headslen = n
+        except (IOError, OSError, error.Abort) as inst:
+            repo.ui.debug("couldn't write changed files index: %s\n" % inst)
+        finally:
+            wlock.release()
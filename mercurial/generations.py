@@ -0,0 +1,138 @@
+# generations.py - persistent generation numbers of changesets
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""persistent generation numbers of changesets
+
+The generation number of a changeset is one more than the highest
+generation number of its parents, the null revision having 0. An ancestor
+of a changeset always has a lower generation number, so comparing them
+tells that a changeset is not an ancestor of another without walking the
+graph, even when revision numbers cannot: the revision numbers of
+unrelated branches interleave, generation numbers follow the depth of
+history.
+
+With ``experimental.generationnumbers``, the generation numbers are kept in
+.hg/cache/generations-v1, as one ``_recfmt`` record per revision: the first
+4 bytes of the changeset node, followed by the generation number. Like for
+the revision branch cache, records are only used while their node prefix
+matches the changelog, and are dropped from the first one which does not
+match anymore, e.g. after a strip or a rollback. Missing generation numbers
+are computed from the parents when they are needed, and written when a
+transaction closes.
+"""
+
+from __future__ import absolute_import
+
+import array
+import struct
+import sys
+
+from .node import nullrev
+from . import (
+    error,
+)
+
+_filename = 'cache/generations-v1'
+# [4 byte hash prefix][4 byte generation number]
+_recfmt = '>4sI'
+
+def _nodeprefix(node):
+    return struct.unpack('>I', node[:4])[0]
+
+class generationcache(object):
+    """generation numbers of the revisions of a changelog"""
+
+    def __init__(self, vfs, changelog):
+        self._vfs = vfs
+        self._changelog = changelog
+        # node prefix and generation number of each revision, in turn
+        self._values = array.array('I')
+        try:
+            data = vfs.read(_filename)
+            recsize = struct.calcsize(_recfmt)
+            self._values.fromstring(data[:len(data) - len(data) % recsize])
+            if sys.byteorder == 'little':
+                self._values.byteswap()
+        except (IOError, OSError):
+            pass
+        self._validate()
+        # number of revisions on disk
+        self._disklen = len(self)
+
+    def __len__(self):
+        return len(self._values) // 2
+
+    def _validate(self):
+        """drop the records which do not match the changelog"""
+        values = self._values
+        node = self._changelog.node
+        n = min(len(self), len(self._changelog))
+        if n and values[2 * (n - 1)] != _nodeprefix(node(n - 1)):
+            # the changelog only loses its last revisions: find the first
+            # one which changed
+            lo, hi = 0, n - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if values[2 * mid] == _nodeprefix(node(mid)):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            n = lo
+        del values[2 * n:]
+
+    def generation(self, rev):
+        """generation number of rev"""
+        if rev == nullrev:
+            return 0
+        values = self._values
+        if rev >= len(self):
+            cl = self._changelog
+            if rev >= len(cl):
+                raise IndexError(rev)
+            parentrevs = cl.parentrevs
+            node = cl.node
+            append = values.append
+            for r in xrange(len(self), rev + 1):
+                p1, p2 = parentrevs(r)
+                gen = max(p1 != nullrev and values[2 * p1 + 1] or 0,
+                          p2 != nullrev and values[2 * p2 + 1] or 0) + 1
+                append(_nodeprefix(node(r)))
+                append(gen)
+        return values[2 * rev + 1]
+
+    def write(self, repo):
+        """compute the missing generation numbers and save them
+
+        Nothing is written if the wlock of repo cannot be acquired at once."""
+        if len(self._changelog):
+            self.generation(len(self._changelog) - 1)
+        if self._disklen == len(self):
+            return
+        try:
+            wlock = repo.wlock(wait=False)
+        except error.LockError:
+            repo.ui.debug("not writing generation numbers: wlock cannot be "
+                          "acquired\n")
+            return
+        values = self._values[2 * self._disklen:]
+        if sys.byteorder == 'little':
+            values.byteswap()
+        try:
+            f = self._vfs.open(_filename, 'ab')
+            try:
+                start = self._disklen * 2 * values.itemsize
+                if f.tell() != start:
+                    f.seek(start)
+                    f.truncate()
+                f.write(values.tostring())
+            finally:
+                f.close()
+            self._disklen = len(self)
+        except (IOError, OSError, error.Abort) as inst:
+            repo.ui.debug("couldn't write generation numbers: %s\n" % inst)
+        finally:
+            wlock.release()
@@ -5,18 +5,23 @@
 # This software may be used and distributed according to the terms of the
 # GNU General Public License version 2 or any later version.
 
-import cgi, cStringIO, zlib, urllib
+import cgi, cStringIO, struct, urllib
 from mercurial import util, wireproto
 from common import HTTP_OK
 
 HGTYPE = 'application/mercurial-0.1'
+HGTYPE2 = 'application/mercurial-0.2'
 HGERRTYPE = 'application/hg-error'
 
 class webproto(wireproto.abstractserverproto):
+    name = 'http'
+
     def __init__(self, req, ui):
         self.req = req
         self.response = ''
         self.ui = ui
+        # media type of stream responses, see groupchunks()
+        self.mediatype = HGTYPE
     def getargs(self, args):
         knownargs = self._args()
         data = {}
@@ -54,14 +59,55 @@ class webproto(wireproto.abstractserverproto):
         val = self.ui.fout.getvalue()
         self.ui.ferr, self.ui.fout = self.oldio
         return val
+    def responsetype(self):
+        """Determine the media type and compression of stream responses.
+
+        Returns a tuple of (mediatype, compengine, engineopts).
+        """
+        protocaps = self.req.env.get('HTTP_X_HGPROTO_1', '').split(' ')
+        if '0.2' in protocaps:
+            # Default as defined by wire protocol spec.
+            compformats = ['zlib', 'none']
+            for cap in protocaps:
+                if cap.startswith('comp='):
+                    compformats = cap[5:].split(',')
+                    break
+
+            # Now find an agreed upon compression format.
+            for engine in wireproto.supportedcompengines(self.ui, self,
+                                                         util.SERVERROLE):
+                if engine.wireprotosupport().name in compformats:
+                    opts = {}
+                    level = self.ui.configint('server',
+                                              '%slevel' % engine.name())
+                    if level is not None:
+                        opts['level'] = level
+                    return HGTYPE2, engine, opts
+
+            # No mutually supported compression format. Fall back to the
+            # legacy protocol.
+
+        # Don't allow untrusted settings because disabling compression or
+        # setting a very high compression level could lead to flooding
+        # the server's network or CPU.
+        opts = {'level': self.ui.configint('server', 'zliblevel', -1)}
+        return HGTYPE, util.compengines['zlib'], opts
+
     def groupchunks(self, cg):
-        z = zlib.compressobj()
-        while True:
-            chunk = cg.read(4096)
-            if not chunk:
-                break
-            yield z.compress(chunk)
-        yield z.flush()
+        self.mediatype, engine, opts = self.responsetype()
+        def chunks():
+            while True:
+                chunk = cg.read(4096)
+                if not chunk:
+                    break
+                yield chunk
+        def gen():
+            if self.mediatype == HGTYPE2:
+                name = engine.wireprotosupport().name
+                yield struct.pack('B', len(name)) + name
+            for chunk in engine.compressstream(chunks(), opts):
+                yield chunk
+        return gen()
     def _client(self):
         return 'remote:%s:%s:%s' % (
             self.req.env.get('wsgi.url_scheme') or 'http',
@@ -78,7 +124,7 @@ def call(repo, req, cmd):
         req.respond(HTTP_OK, HGTYPE, body=rsp)
         return []
     elif isinstance(rsp, wireproto.streamres):
-        req.respond(HTTP_OK, HGTYPE)
+        req.respond(HTTP_OK, p.mediatype)
         return rsp.gen
     elif isinstance(rsp, wireproto.pushres):
         val = p.restore()
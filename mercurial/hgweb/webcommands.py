@@ -240,7 +240,7 @@ def _search(web, req, tmpl):
         if not funcsused.issubset(revset.safesymbols):
             return MODE_KEYWORD, query
 
-        mfunc = revset.match(web.repo.ui, revdef)
+        mfunc = revset.match(web.repo.ui, revdef, cache=True)
         try:
             revs = mfunc(web.repo)
             return MODE_REVSET, revs
@@ -12,6 +12,7 @@ import errno
 import httplib
 import os
 import socket
+import struct
 import tempfile
 import urllib
 import urllib2
@@ -88,7 +89,7 @@ class httppeer(wireproto.wirepeer):
     def lock(self):
         raise error.Abort(_('operation not supported over http'))
 
-    def _callstream(self, cmd, **args):
+    def _callstream(self, cmd, _compressible=False, **args):
         if cmd == 'pushkey':
             args['data'] = ''
         data = args.pop('data', None)
@@ -127,6 +128,25 @@ class httppeer(wireproto.wirepeer):
             headers['Vary'] = ','.join(varyheaders)
         else:
             q += sorted(args.items())
+
+        # Tell the server which response media types and compression engines
+        # we support. The capabilities are not known yet when fetching them.
+        if self.caps is not None:
+            mediatypes = set((self.capable('httpmediatype') or '').split(','))
+            if '0.2tx' in mediatypes:
+                protoparams = ['0.1', '0.2']
+                if self.capable('compression'):
+                    comps = [e.wireprotosupport().name for e in
+                             wireproto.supportedcompengines(self.ui, self,
+                                                            util.CLIENTROLE)]
+                    protoparams.append('comp=%s' % ','.join(comps))
+                headers['X-HgProto-1'] = ' '.join(protoparams)
+                varyheaders = headers.get('Vary')
+                if varyheaders:
+                    headers['Vary'] = varyheaders + ',X-HgProto-1'
+                else:
+                    headers['Vary'] = 'X-HgProto-1'
+
         qs = '?%s' % urllib.urlencode(q)
         cu = "%s%s" % (self._url, qs)
         req = self.requestbuilder(cu, data, headers)
@@ -180,10 +200,26 @@ class httppeer(wireproto.wirepeer):
             except ValueError:
                 raise error.RepoError(_("'%s' sent a broken Content-Type "
                                         "header (%s)") % (safeurl, proto))
-            if version_info > (0, 1):
+            if version_info > (0, 2):
                 raise error.RepoError(_("'%s' uses newer protocol %s") %
                                       (safeurl, version))
 
+            if version_info == (0, 2):
+                # the response starts with the name of the compression
+                # engine, prefixed by its length
+                elen = struct.unpack('B', resp.read(1))[0]
+                ename = resp.read(elen)
+                try:
+                    engine = util.compengines.forwiretype(ename)
+                except KeyError:
+                    raise error.RepoError(_("'%s' uses unknown compression "
+                                            "engine %s") % (safeurl, ename))
+                self.ui.debug('response compressed with %s\n' % ename)
+                return engine.decompressorreader(resp)
+
+        if _compressible:
+            return util.chunkbuffer(zgenerator(resp))
+
         return resp
 
     def _call(self, cmd, **args):
@@ -254,8 +290,7 @@ class httppeer(wireproto.wirepeer):
                 os.unlink(filename)
 
     def _callcompressable(self, cmd, **args):
-        stream =  self._callstream(cmd, **args)
-        return util.chunkbuffer(zgenerator(stream))
+        return self._callstream(cmd, _compressible=True, **args)
 
     def _abort(self, exception):
         raise exception
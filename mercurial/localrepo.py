@@ -19,6 +19,7 @@ from lock import release
 import weakref, errno, os, time, inspect, random
 import branchmap, pathutil
 import namespaces
+import filesindex, metaindex, generations, revsetcache
 propertycache = util.propertycache
 filecache = scmutil.filecache
 
@@ -193,10 +194,17 @@ class locallegacypeer(localpeer):
 class localrepository(object):
 
     supportedformats = set(('revlogv1', 'generaldelta', 'treemanifest',
-                            'manifestv2'))
+                            'manifestv2', 'sparserevlog'))
+    # revlogs compressed with an engine older clients do not know about
+    supportedformats.update('exp-compression-%s' % name
+                            for name in util.compengines
+                            if name != 'zlib'
+                            and util.compengines[name].revlogheader()
+                            and util.compengines[name].available())
     _basesupported = supportedformats | set(('store', 'fncache', 'shared',
-                                             'dotencode'))
-    openerreqs = set(('revlogv1', 'generaldelta', 'treemanifest', 'manifestv2'))
+                                             'dotencode', 'treedirstate'))
+    openerreqs = set(('revlogv1', 'generaldelta', 'treemanifest', 'manifestv2',
+                      'sparserevlog'))
     filtername = None
 
     # a list of (ui, featureset) functions.
@@ -244,26 +252,15 @@ class localrepository(object):
                 if not self.wvfs.exists():
                     self.wvfs.makedirs()
                 self.vfs.makedir(notindexed=True)
-                self.requirements.update(self._baserequirements(create))
-                if self.ui.configbool('format', 'usestore', True):
+                self.requirements.update(newreporequirements(self))
+                if 'store' in self.requirements:
                     self.vfs.mkdir("store")
-                    self.requirements.add("store")
-                    if self.ui.configbool('format', 'usefncache', True):
-                        self.requirements.add("fncache")
-                        if self.ui.configbool('format', 'dotencode', True):
-                            self.requirements.add('dotencode')
                     # create an invalid changelog
                     self.vfs.append(
                         "00changelog.i",
                         '\0\0\0\2' # represents revlogv2
                         ' dummy changelog to prevent using the old repo layout'
                     )
-                if scmutil.gdinitconfig(self.ui):
-                    self.requirements.add("generaldelta")
-                if self.ui.configbool('experimental', 'treemanifest', False):
-                    self.requirements.add("treemanifest")
-                if self.ui.configbool('experimental', 'manifestv2', False):
-                    self.requirements.add("manifestv2")
             else:
                 raise error.RepoError(_("repository %s not found") % path)
         elif create:
@@ -303,6 +300,9 @@ class localrepository(object):
 
         self._branchcaches = {}
         self._revbranchcache = None
+        self._changedfilesindex = None
+        self._changesetmetaindex = None
+        self._revsetcache = None
         self.filterpats = {}
         self._datafilters = {}
         self._transref = self._lockref = self._wlockref = None
@@ -331,6 +331,15 @@ class localrepository(object):
     def _writecaches(self):
         if self._revbranchcache:
             self._revbranchcache.write()
+        if self._changedfilesindex:
+            self._changedfilesindex.write()
+        if self._changesetmetaindex:
+            self._changesetmetaindex.write()
+        if self._revsetcache:
+            self._revsetcache.write()
+        cl = self.unfiltered().__dict__.get('changelog')
+        if cl is not None and cl.generations is not None:
+            cl.generations.write(self)
 
     def _restrictcapabilities(self, caps):
         if self.ui.configbool('experimental', 'bundle2-advertise', True):
@@ -346,6 +355,35 @@ class localrepository(object):
         chunkcachesize = self.ui.configint('format', 'chunkcachesize')
         if chunkcachesize is not None:
             self.svfs.options['chunkcachesize'] = chunkcachesize
+        # experimental config: format.chunkcachebudget
+        chunkcachebudget = self.ui.configbytes('format', 'chunkcachebudget',
+                                               None)
+        if chunkcachebudget is not None:
+            self.svfs.options['chunkcachebudget'] = chunkcachebudget
+        # experimental config: format.fulltextcachesize
+        fulltextcachesize = self.ui.configbytes('format', 'fulltextcachesize',
+                                                None)
+        if fulltextcachesize is not None:
+            self.svfs.options['fulltextcachesize'] = fulltextcachesize
+        # experimental config: experimental.sparse-read
+        withsparseread = self.ui.configbool('experimental', 'sparse-read',
+                                            False)
+        self.svfs.options['with-sparse-read'] = withsparseread
+        # experimental config: experimental.sparse-read.density-threshold
+        srdensitythres = self.ui.configfloat('experimental',
+                                             'sparse-read.density-threshold')
+        if srdensitythres is not None:
+            self.svfs.options['sparse-read-density-threshold'] = srdensitythres
+        # experimental config: experimental.sparse-read.min-gap-size
+        srmingapsize = self.ui.configbytes('experimental',
+                                           'sparse-read.min-gap-size', None)
+        if srmingapsize is not None:
+            self.svfs.options['sparse-read-min-gap-size'] = srmingapsize
+        # experimental config: experimental.mmapindexthreshold
+        mmapindexthreshold = self.ui.configbytes('experimental',
+                                                 'mmapindexthreshold', None)
+        if mmapindexthreshold is not None:
+            self.svfs.options['mmapindexthreshold'] = mmapindexthreshold
         # experimental config: format.maxchainlen
         maxchainlen = self.ui.configint('format', 'maxchainlen')
         if maxchainlen is not None:
@@ -358,7 +396,37 @@ class localrepository(object):
         aggressivemergedeltas = self.ui.configbool('format',
             'aggressivemergedeltas', False)
         self.svfs.options['aggressivemergedeltas'] = aggressivemergedeltas
+        # experimental config: experimental.delta-search
+        deltasearch = self.ui.configbool('experimental', 'delta-search', False)
+        self.svfs.options['delta-search'] = deltasearch
         self.svfs.options['lazydeltabase'] = not scmutil.gddeltaconfig(self.ui)
+        # revlogs are compressed with the engine required by the repository,
+        # or with an engine every client can read.
+        compengine = self.ui.config('experimental', 'format.compression',
+                                    'zlib')
+        if compengine not in ('zlib', 'none'):
+            compengine = 'zlib'
+        for r in self.requirements:
+            if r.startswith('exp-compression-'):
+                compengine = r[len('exp-compression-'):]
+        self.svfs.options['compengine'] = compengine
+        # experimental config: experimental.format.compression.level
+        complevel = self.ui.configint('experimental',
+                                      'format.compression.level')
+        if complevel is not None:
+            self.svfs.options['compenginelevel'] = complevel
+        # experimental config: experimental.persistent-nodemap
+        if self.ui.configbool('experimental', 'persistent-nodemap', False):
+            self.svfs.options['persistent-nodemap'] = True
+        # experimental config: experimental.revlog.hashcheck
+        hashcheck = self.ui.config('experimental', 'revlog.hashcheck')
+        if hashcheck is not None:
+            self.svfs.options['hashcheck'] = hashcheck
+        # experimental config: experimental.revlog.hashcheck.samplerate
+        samplerate = self.ui.configint('experimental',
+                                       'revlog.hashcheck.samplerate')
+        if samplerate is not None:
+            self.svfs.options['hashchecksamplerate'] = samplerate
 
     def _writerequirements(self):
         scmutil.writerequires(self.vfs, self.requirements)
@@ -466,19 +534,52 @@ class localrepository(object):
             p = os.environ['HG_PENDING']
             if p.startswith(self.root):
                 c.readpending('00changelog.i.a')
+        # experimental config: experimental.generationnumbers
+        if self.ui.configbool('experimental', 'generationnumbers'):
+            c.generations = generations.generationcache(self.vfs, c)
         return c
 
     @storecache('00manifest.i')
     def manifest(self):
-        return manifest.manifest(self.svfs)
+        m = manifest.manifest(self.svfs)
+        # experimental config: experimental.manifestcache.disksize
+        disksize = self.ui.configbytes('experimental', 'manifestcache.disksize')
+        if disksize > 0:
+            wanted = self._manifestcachewanted()
+            m.diskcache = manifest.manifestdiskcache(self.vfs, disksize,
+                                                     wanted)
+        return m
+
+    def _manifestcachewanted(self):
+        """return a function telling if a manifest is worth caching on disk
+
+        Only the manifests of the parents of the working directory are: the
+        ones status, diff, commit and update read again and again."""
+        reporef = weakref.ref(self)
+        def wanted(node):
+            repo = reporef()
+            if repo is None:
+                return False
+            cl = repo.changelog
+            for p in repo.dirstate.parents():
+                if p == nullid:
+                    continue
+                try:
+                    if cl.read(p)[0] == node:
+                        return True
+                except error.LookupError:
+                    pass
+            return False
+        return wanted
 
     def dirlog(self, dir):
         return self.manifest.dirlog(dir)
 
     @repofilecache('dirstate')
     def dirstate(self):
+        treeformat = 'treedirstate' in self.requirements
         return dirstate.dirstate(self.vfs, self.ui, self.root,
-                                 self._dirstatevalidate)
+                                 self._dirstatevalidate, treeformat=treeformat)
 
     def _dirstatevalidate(self, node):
         try:
@@ -769,6 +870,44 @@ class localrepository(object):
             self._revbranchcache = branchmap.revbranchcache(self.unfiltered())
         return self._revbranchcache
 
+    @unfilteredmethod
+    def changedfilesindex(self):
+        '''return the up to date index of the files changed by each
+        changeset, or None when it is disabled'''
+        # experimental config: experimental.changedfilesindex
+        if not self.ui.configbool('experimental', 'changedfilesindex'):
+            return None
+        if self._changedfilesindex is None:
+            self._changedfilesindex = filesindex.changedfilesindex(self)
+        self._changedfilesindex.update()
+        return self._changedfilesindex
+
+    @unfilteredmethod
+    def changesetmetaindex(self):
+        '''return the up to date columns of changeset metadata, or None when
+        they are disabled'''
+        # experimental config: experimental.metaindex
+        if not self.ui.configbool('experimental', 'metaindex'):
+            return None
+        if self._changesetmetaindex is None:
+            # experimental config: experimental.metaindex.descriptions
+            descs = self.ui.configbool('experimental', 'metaindex.descriptions')
+            self._changesetmetaindex = metaindex.changesetmetaindex(self, descs)
+        self._changesetmetaindex.update()
+        return self._changesetmetaindex
+
+    @unfilteredmethod
+    def revsetcache(self):
+        '''return the cache of revset results, or None when it is disabled'''
+        # experimental config: experimental.revsetcache
+        if not self.ui.configbool('experimental', 'revsetcache'):
+            return None
+        if self._revsetcache is None:
+            # experimental config: experimental.revsetcache.size
+            size = self.ui.configint('experimental', 'revsetcache.size', 100)
+            self._revsetcache = revsetcache.revsetcache(self, size)
+        return self._revsetcache
+
     def branchtip(self, branch, ignoremissing=False):
         '''return the tip node for a given branch
 
@@ -1043,6 +1182,15 @@ class localrepository(object):
             reporef().hook('txnabort', throw=False, txnname=desc,
                            **tr2.hookargs)
         tr.addabort('txnabort-hook', txnaborthook)
+        def updateindexes(tr2):
+            repo = reporef()
+            for index in (repo.changedfilesindex(),
+                          repo.changesetmetaindex()):
+                if index is not None:
+                    index.write(tr2)
+            if repo.changelog.generations is not None:
+                repo.changelog.generations.write(repo)
+        tr.addfinalize('update-indexes', updateindexes)
         # avoid eager cache invalidation. in-memory data should be identical
         # to stored data if transaction has no error.
         tr.addpostclose('refresh-filecachestats', self._refreshfilecachestats)
@@ -1928,3 +2076,41 @@ def instance(ui, path, create):
 
 def islocal(path):
     return True
+
+def newreporequirements(repo):
+    """Determine the set of requirements for a new local repository.
+
+    Extensions can wrap this function to specify custom requirements for
+    new repositories.
+    """
+    ui = repo.ui
+    requirements = set(repo._baserequirements(True))
+    if ui.configbool('format', 'usestore', True):
+        requirements.add("store")
+        if ui.configbool('format', 'usefncache', True):
+            requirements.add("fncache")
+            if ui.configbool('format', 'dotencode', True):
+                requirements.add('dotencode')
+    if scmutil.gdinitconfig(ui):
+        requirements.add("generaldelta")
+        # experimental config: experimental.sparse-revlog
+        if ui.configbool('experimental', 'sparse-revlog', False):
+            requirements.add("sparserevlog")
+    # experimental config: experimental.format.compression
+    compengine = ui.config('experimental', 'format.compression', 'zlib')
+    if compengine not in ('zlib', 'none'):
+        req = 'exp-compression-%s' % compengine
+        if req not in repo.supportedformats:
+            raise error.Abort(_('compression engine %s defined by '
+                                'experimental.format.compression '
+                                'not available') % compengine)
+        requirements.add(req)
+    if ui.configbool('experimental', 'treemanifest', False):
+        requirements.add("treemanifest")
+    if ui.configbool('experimental', 'manifestv2', False):
+        requirements.add("manifestv2")
+    # experimental config: experimental.treedirstate
+    if ui.configbool('experimental', 'treedirstate', False):
+        requirements.add("treedirstate")
+
+    return requirements
@@ -414,6 +414,73 @@ def _msearch(m, s, lo=0, hi=None):
     else:
         return (lo, lo)
 
+def _mentry(m, f):
+    '''return the (node, flags) entry of f in the manifest text m
+
+    (None, '') is returned when f is not in m, like manifest.diff() does.'''
+    start, end = _msearch(m, f)
+    if start == end:
+        return None, ''
+    entry = m[start + len(f) + 1:end - 1]
+    return revlog.bin(entry[:40]), entry[40:]
+
+def _splitpieces(pieces, pos):
+    '''split a text held as (buffer, start, end) pieces at offset pos'''
+    for i, (buf, start, end) in enumerate(pieces):
+        if pos < end - start:
+            left = pieces[:i]
+            if pos:
+                left.append((buf, start, start + pos))
+            return left, [(buf, start + pos, end)] + pieces[i + 1:]
+        pos -= end - start
+    return pieces, []
+
+def _deltafiles(pieces, delta, files):
+    '''add to files the files of the lines a delta replaces or adds
+
+    The text the delta applies to is held as a list of (buffer, start, end)
+    pieces, so that applying a delta does not copy the whole text. Returns
+    the pieces of the patched text, or None if the delta does not only
+    replace whole lines.'''
+    new = []
+    rest = pieces
+    restpos = 0
+    # last character of the text before restpos
+    last = '\n'
+    pos = 0
+    while pos < len(delta):
+        start, end, l = struct.unpack('>lll', delta[pos:pos + 12])
+        pos += 12
+        data = delta[pos:pos + l]
+        pos += l
+        kept, rest = _splitpieces(rest, start - restpos)
+        replaced, rest = _splitpieces(rest, end - start)
+        new.extend(kept)
+        if kept:
+            buf, s, e = kept[-1]
+            last = buf[e - 1]
+        if last != '\n' or (data and data[-1] != '\n'):
+            return None
+        old = ''.join(buf[s:e] for buf, s, e in replaced)
+        if old and old[-1] != '\n':
+            return None
+        for lines in (old, data):
+            for line in lines.splitlines():
+                files.add(line.split('\0', 1)[0])
+        if data:
+            new.append((data, 0, len(data)))
+        if old:
+            last = old[-1]
+        restpos = end
+    new.extend(rest)
+    return new
+
+# above that many deltas between two revisions, the diff is not derived
+# from the deltas: the cost of following them grows faster than their
+# number, and around 128 one-line deltas on a 300k files manifest it is the
+# one of diffing the manifests read entirely
+_maxdeltadiffrevs = 64
+
 def _checkforbidden(l):
     """Check filenames for illegal characters."""
     for f in l:
@@ -460,6 +527,9 @@ class treemanifest(object):
         self._copyfunc = _noop
         self._dirty = False
         self._dirs = {}
+        # subdirectories not read yet:
+        # dir -> (path, node, readsubtree, docopy)
+        self._lazydirs = {}
         # Using _lazymanifest here is a little slower than plain old dicts
         self._files = {}
         self._flags = {}
@@ -473,8 +543,50 @@ class treemanifest(object):
     def _subpath(self, path):
         return self._dir + path
 
+    def _loadlazy(self, d):
+        v = self._lazydirs.pop(d, None)
+        if v is not None:
+            path, node, readsubtree, docopy = v
+            m = readsubtree(path, node)
+            if docopy:
+                # the tree read may be shared with the manifest copied
+                m = m.copy()
+            self._dirs[d] = m
+
+    def _loadalllazy(self):
+        for d in self._lazydirs.keys():
+            self._loadlazy(d)
+
+    def _loaddifflazy(self, t1, t2):
+        '''read the subdirectories of t1 and t2 that may differ
+
+        Subdirectories left unread on both sides with the same node are
+        identical and are not read.
+        '''
+        toload = []
+        for d, v1 in t1._lazydirs.iteritems():
+            v2 = t2._lazydirs.get(d)
+            if v2 is None or v2[1] != v1[1]:
+                toload.append(d)
+        for d in t2._lazydirs:
+            if d not in t1._lazydirs:
+                toload.append(d)
+        for d in toload:
+            t1._loadlazy(d)
+            t2._loadlazy(d)
+
+    def _dirnode(self, d, default=revlog.nullid):
+        '''node of subdirectory d, without reading it'''
+        v = self._lazydirs.get(d)
+        if v is not None:
+            return v[1]
+        if d in self._dirs:
+            return self._dirs[d]._node
+        return default
+
     def __len__(self):
         self._load()
+        self._loadalllazy()
         size = len(self._files)
         for m in self._dirs.values():
             size += m.__len__()
@@ -482,8 +594,11 @@ class treemanifest(object):
 
     def _isempty(self):
         self._load() # for consistency; already loaded by all callers
-        return (not self._files and (not self._dirs or
-                all(m._isempty() for m in self._dirs.values())))
+        if self._files:
+            return False
+        self._loadalllazy()
+        return (not self._dirs or
+                all(m._isempty() for m in self._dirs.values()))
 
     def __repr__(self):
         return ('<treemanifest dir=%s, node=%s, loaded=%s, dirty=%s at 0x%x>' %
@@ -509,6 +624,7 @@ class treemanifest(object):
 
     def iteritems(self):
         self._load()
+        self._loadalllazy()
         for p, n in sorted(self._dirs.items() + self._files.items()):
             if p in self._files:
                 yield self._subpath(p), n
@@ -518,6 +634,7 @@ class treemanifest(object):
 
     def iterkeys(self):
         self._load()
+        self._loadalllazy()
         for p in sorted(self._dirs.keys() + self._files.keys()):
             if p in self._files:
                 yield self._subpath(p)
@@ -537,6 +654,7 @@ class treemanifest(object):
         self._load()
         dir, subpath = _splittopdir(f)
         if dir:
+            self._loadlazy(dir)
             if dir not in self._dirs:
                 return False
             return self._dirs[dir].__contains__(subpath)
@@ -547,6 +665,7 @@ class treemanifest(object):
         self._load()
         dir, subpath = _splittopdir(f)
         if dir:
+            self._loadlazy(dir)
             if dir not in self._dirs:
                 return default
             return self._dirs[dir].get(subpath, default)
@@ -557,6 +676,7 @@ class treemanifest(object):
         self._load()
         dir, subpath = _splittopdir(f)
         if dir:
+            self._loadlazy(dir)
             return self._dirs[dir].__getitem__(subpath)
         else:
             return self._files[f]
@@ -565,11 +685,12 @@ class treemanifest(object):
         self._load()
         dir, subpath = _splittopdir(f)
         if dir:
+            self._loadlazy(dir)
             if dir not in self._dirs:
                 return ''
             return self._dirs[dir].flags(subpath)
         else:
-            if f in self._dirs:
+            if f in self._lazydirs or f in self._dirs:
                 return ''
             return self._flags.get(f, '')
 
@@ -577,6 +698,7 @@ class treemanifest(object):
         self._load()
         dir, subpath = _splittopdir(f)
         if dir:
+            self._loadlazy(dir)
             return self._dirs[dir].find(subpath)
         else:
             return self._files[f], self._flags.get(f, '')
@@ -585,6 +707,7 @@ class treemanifest(object):
         self._load()
         dir, subpath = _splittopdir(f)
         if dir:
+            self._loadlazy(dir)
             self._dirs[dir].__delitem__(subpath)
             # If the directory is now empty, remove it
             if self._dirs[dir]._isempty():
@@ -600,6 +723,7 @@ class treemanifest(object):
         self._load()
         dir, subpath = _splittopdir(f)
         if dir:
+            self._loadlazy(dir)
             if dir not in self._dirs:
                 self._dirs[dir] = treemanifest(self._subpath(dir))
             self._dirs[dir].__setitem__(subpath, n)
@@ -621,6 +745,7 @@ class treemanifest(object):
         self._load()
         dir, subpath = _splittopdir(f)
         if dir:
+            self._loadlazy(dir)
             if dir not in self._dirs:
                 self._dirs[dir] = treemanifest(self._subpath(dir))
             self._dirs[dir].setflag(subpath, flags)
@@ -635,6 +760,10 @@ class treemanifest(object):
         if self._copyfunc is _noop:
             def _copyfunc(s):
                 self._load()
+                # unread subdirectories are copied once read
+                for d, (path, node, readsubtree, docopy) in (
+                        self._lazydirs.iteritems()):
+                    s._lazydirs[d] = (path, node, readsubtree, True)
                 for d in self._dirs:
                     s._dirs[d] = self._dirs[d].copy()
                 s._files = dict.copy(self._files)
@@ -655,6 +784,7 @@ class treemanifest(object):
                 return
             t1._load()
             t2._load()
+            t1._loaddifflazy(t1, t2)
             for d, m1 in t1._dirs.iteritems():
                 if d in t2._dirs:
                     m2 = t2._dirs[d]
@@ -680,10 +810,12 @@ class treemanifest(object):
         self._load()
         topdir, subdir = _splittopdir(dir)
         if topdir:
+            self._loadlazy(topdir)
             if topdir in self._dirs:
                 return self._dirs[topdir].hasdir(subdir)
             return False
-        return (dir + '/') in self._dirs
+        dirslash = dir + '/'
+        return dirslash in self._dirs or dirslash in self._lazydirs
 
     def walk(self, match):
         '''Generates matching file names.
@@ -721,6 +853,10 @@ class treemanifest(object):
 
         # yield this dir's files and walk its submanifests
         self._load()
+        # subdirectories the matcher skips are not read
+        for d in self._lazydirs.keys():
+            if match.visitdir(self._subpath(d)[:-1]):
+                self._loadlazy(d)
         for p in sorted(self._dirs.keys() + self._files.keys()):
             if p in self._files:
                 fullp = self._subpath(p)
@@ -746,20 +882,35 @@ class treemanifest(object):
             return ret
 
         self._load()
+        # whether every file of this directory matches
+        complete = True
         for fn in self._files:
             fullp = self._subpath(fn)
             if not match(fullp):
+                complete = False
                 continue
             ret._files[fn] = self._files[fn]
             if fn in self._flags:
                 ret._flags[fn] = self._flags[fn]
 
+        # subdirectories the matcher skips are not read
+        for d in self._lazydirs.keys():
+            if match.visitdir(self._subpath(d)[:-1]):
+                self._loadlazy(d)
+            else:
+                complete = False
         for dir, subm in self._dirs.iteritems():
             m = subm._matches(match)
             if not m._isempty():
                 ret._dirs[dir] = m
-
-        if not ret._isempty():
+            if m._dirty or m._node != subm._node:
+                complete = False
+
+        if complete and not self._dirty:
+            # same content as this directory: keep its node so that diff()
+            # skips it when unchanged on the other side
+            ret.setnode(self._node)
+        elif not ret._isempty():
             ret._dirty = True
         return ret
 
@@ -785,6 +936,7 @@ class treemanifest(object):
                 return
             t1._load()
             t2._load()
+            t1._loaddifflazy(t1, t2)
             for d, m1 in t1._dirs.iteritems():
                 m2 = t2._dirs.get(d, emptytree)
                 _diff(m1, m2)
@@ -817,7 +969,8 @@ class treemanifest(object):
         for f, n, fl in _parse(text):
             if fl == 'd':
                 f = f + '/'
-                self._dirs[f] = readsubtree(self._subpath(f), n)
+                # subdirectories are only read when accessed
+                self._lazydirs[f] = (self._subpath(f), n, readsubtree, False)
             elif '/' in f:
                 # This is a flat manifest, so use __setitem__ and setflag rather
                 # than assigning directly to _files and _flags, so we can
@@ -846,7 +999,8 @@ class treemanifest(object):
         """
         self._load()
         flags = self.flags
-        dirs = [(d[:-1], self._dirs[d]._node, 'd') for d in self._dirs]
+        dirs = [(d[:-1], self._dirnode(d), 'd')
+                for d in self._dirs.keys() + self._lazydirs.keys()]
         files = [(f, self._files[f], flags(f)) for f in self._files]
         return _text(sorted(dirs + files), usemanifestv2)
 
@@ -858,14 +1012,114 @@ class treemanifest(object):
 
     def writesubtrees(self, m1, m2, writesubtree):
         self._load() # for consistency; should never have any effect here
-        emptytree = treemanifest()
+        m1._load()
+        m2._load()
+        # unread subdirectories are unchanged and need no writing
         for d, subm in self._dirs.iteritems():
-            subp1 = m1._dirs.get(d, emptytree)._node
-            subp2 = m2._dirs.get(d, emptytree)._node
+            subp1 = m1._dirnode(d)
+            subp2 = m2._dirnode(d)
             if subp1 == revlog.nullid:
                 subp1, subp2 = subp2, subp1
             writesubtree(subm, subp1, subp2)
 
+class manifestdiskcache(object):
+    """manifest fulltexts shared by processes, stored in .hg/cache/manifest
+
+    Each entry is a file named after the hex manifest node, holding that
+    node followed by the fulltext. Entries are written atomically and only
+    used once checked against the manifest revlog, so a stale or damaged
+    entry (e.g. after a strip) is simply dropped. The least recently used
+    entries are removed when the cache grows beyond maxsize bytes.
+
+    Only the fulltexts for which wanted(node) is true are stored, for
+    commands reading many manifests once (log -p, annotate...) not to
+    rewrite the cache and evict the entries worth keeping.
+    """
+    _dir = 'cache/manifest'
+
+    def __init__(self, vfs, maxsize, wanted=None):
+        self._vfs = vfs
+        self.maxsize = maxsize
+        if wanted is not None:
+            self.wanted = wanted
+        # size of the cache as last seen by this process, None if unknown
+        self._size = None
+
+    def wanted(self, node):
+        return True
+
+    def _path(self, node):
+        return '%s/%s' % (self._dir, revlog.hex(node))
+
+    def get(self, node):
+        """return the cached fulltext of node, None if not cached"""
+        path = self._path(node)
+        try:
+            data = self._vfs.read(path)
+        except (IOError, OSError):
+            return None
+        if data[:20] != node:
+            self.discard(node)
+            return None
+        try:
+            # keep the entry as recently used
+            self._vfs.utime(path, None)
+        except (IOError, OSError):
+            pass
+        return data[20:]
+
+    def discard(self, node):
+        try:
+            self._vfs.unlink(self._path(node))
+        except (IOError, OSError):
+            pass
+
+    def put(self, node, text):
+        """add the fulltext of node to the cache, evicting older entries"""
+        if len(text) + 20 > self.maxsize:
+            return
+        try:
+            fp = self._vfs(self._path(node), 'w', atomictemp=True)
+            try:
+                fp.write(node)
+                fp.write(text)
+            finally:
+                fp.close()
+            if self._size is not None:
+                self._size += len(text) + 20
+            if self._size is None or self._size > self.maxsize:
+                self._evict(node)
+        except (IOError, OSError):
+            # the cache is a best effort, e.g. for read-only repositories
+            pass
+
+    def _evict(self, keep):
+        """remove the least recently used entries beyond maxsize
+
+        This lists the whole cache, which only happens on the first write
+        of a process and once the size known to it crosses maxsize."""
+        entries = []
+        total = 0
+        for name, kind, st in self._vfs.readdir(self._dir, stat=True):
+            # skip temporary files being written by other processes
+            if len(name) != 40:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+            total += st.st_size
+        self._size = total
+        keep = revlog.hex(keep)
+        for mtime, name, size in sorted(entries):
+            if total <= self.maxsize:
+                break
+            if name == keep:
+                continue
+            try:
+                self._vfs.unlink('%s/%s' % (self._dir, name))
+            except (IOError, OSError):
+                continue
+            total -= size
+        self._size = total
+
 class manifest(revlog.revlog):
     def __init__(self, opener, dir='', dirlogcache=None):
         '''The 'dir' and 'dirlogcache' arguments are for internal use by
@@ -884,6 +1138,8 @@ class manifest(revlog.revlog):
             usetreemanifest = opts.get('treemanifest', usetreemanifest)
             usemanifestv2 = opts.get('manifestv2', usemanifestv2)
         self._mancache = util.lrucachedict(cachesize)
+        # manifestdiskcache of the repository, set by localrepo
+        self.diskcache = None
         self._treeinmem = usetreemanifest
         self._treeondisk = usetreemanifest
         self._usemanifestv2 = usemanifestv2
@@ -925,11 +1181,12 @@ class manifest(revlog.revlog):
                     md.setflag(f, fl1)
         return md
 
-    def readdelta(self, node):
+    def readdelta(self, node, _hashcheck=None):
         if self._usemanifestv2 or self._treeondisk:
             return self._slowreaddelta(node)
         r = self.rev(node)
-        d = mdiff.patchtext(self.revdiff(self.deltaparent(r), r))
+        d = mdiff.patchtext(self.revdiff(self.deltaparent(r), r,
+                                         _hashcheck=_hashcheck))
         return self._newmanifest(d)
 
     def readfast(self, node):
@@ -946,6 +1203,55 @@ class manifest(revlog.revlog):
             return self.readdelta(node)
         return self.read(node)
 
+    def deltadiff(self, node1, node2, match=None):
+        '''return the diff of two manifests from the deltas stored between them
+
+        When one revision is in the delta chain of the other, only the
+        entries of the lines the deltas between them replace or add are
+        compared, without parsing and comparing the whole manifests. The
+        result is the one of read(node1).diff(read(node2)), restricted to
+        the files match accepts. Returns None when the revisions are not
+        stored that way, the caller then has to diff the manifests.
+        '''
+        if self._treeondisk or self._usemanifestv2:
+            return None
+        r1, r2 = self.rev(node1), self.rev(node2)
+        if r1 == r2:
+            return {}
+        low, high = min(r1, r2), max(r1, r2)
+        chain = self._deltachain(high)
+        if low not in chain:
+            return None
+        deltas = chain[chain.index(low) + 1:]
+        if len(deltas) > _maxdeltadiffrevs:
+            return None
+
+        lowtext = self.revision(self.node(low))
+        chunks = [str(delta) for delta in self._chunks(deltas)]
+        files = set()
+        pieces = lowtext and [(lowtext, 0, len(lowtext))] or []
+        for delta in chunks:
+            pieces = _deltafiles(pieces, delta, files)
+            if pieces is None:
+                return None
+        # the deltas are applied to the whole text once
+        hightext = self._checkhash(mdiff.patches(lowtext, chunks),
+                                   self.node(high), high)
+
+        if r1 < r2:
+            text1, text2 = lowtext, hightext
+        else:
+            text1, text2 = hightext, lowtext
+        result = {}
+        for f in files:
+            if match is not None and not match(f):
+                continue
+            e1 = _mentry(text1, f)
+            e2 = _mentry(text2, f)
+            if e1 != e2:
+                result[f] = (e1, e2)
+        return result
+
     def read(self, node):
         if node == revlog.nullid:
             return self._newmanifest() # don't upset local cache
@@ -961,12 +1267,34 @@ class manifest(revlog.revlog):
             m.setnode(node)
             arraytext = None
         else:
-            text = self.revision(node)
+            text = self._diskcacheread(node)
+            if text is None:
+                text = self.revision(node)
+                if (self.diskcache is not None and not self._dir
+                    and self.diskcache.wanted(node)):
+                    self.diskcache.put(node, text)
             m = self._newmanifest(text)
             arraytext = array.array('c', text)
         self._mancache[node] = (m, arraytext)
         return m
 
+    def _diskcacheread(self, node):
+        """return the fulltext of node from the disk cache, if valid"""
+        if self.diskcache is None or self._dir:
+            return None
+        text = self.diskcache.get(node)
+        if text is None:
+            return None
+        try:
+            rev = self.rev(node)
+            if len(text) != self.rawsize(rev):
+                raise error.RevlogError(_('cached manifest size mismatch'))
+            self._checkhash(text, node, rev)
+        except (error.LookupError, error.RevlogError):
+            self.diskcache.discard(node)
+            return None
+        return text
+
     def find(self, node, f):
         '''look up entry for a single file efficiently.
         return (node, flags) pair if found, (None, None) if not.'''
@@ -977,6 +1305,13 @@ class manifest(revlog.revlog):
             return None, None
 
     def add(self, m, transaction, link, p1, p2, added, removed):
+        if (p1 not in self._mancache and self.diskcache is not None
+            and not self._treeinmem):
+            # a cached first parent avoids encoding the whole manifest
+            text = self._diskcacheread(p1)
+            if text is not None:
+                self._mancache[p1] = (self._newmanifest(text),
+                                      array.array('c', text))
         if (p1 in self._mancache and not self._treeinmem
             and not self._usemanifestv2):
             # If our first parent is in the manifest cache, we can
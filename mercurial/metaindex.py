@@ -0,0 +1,323 @@
+# metaindex.py - persistent columns of changeset metadata
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""persistent columns of changeset metadata
+
+Revsets filtering on the user, the date or the description of changesets
+(``user()``, ``date()``, ``desc()``, ``keyword()``) decompress and parse
+whole changelog entries and build a changectx for each revision. With
+``experimental.metaindex``, this metadata is kept in .hg/cache as columns
+holding one fixed size value per revision:
+
+- cm-node-v1: the first 4 bytes of the changeset node,
+- cm-user-v1: the number of the user, as a big-endian 32 bits integer,
+- cm-time-v1 and cm-tz-v1: the date, as a big-endian double and 32 bits
+  integer.
+
+cm-users-v1 holds the user names, separated by NUL bytes. It is
+append-only and each name is only stored once, so its position identifies
+it.
+
+With ``experimental.metaindex.descriptions``, the lowercased descriptions
+are kept as well, followed by a NUL byte, in cm-desc-<encoding>-v1, and the
+end of the description of each revision in cm-descend-<encoding>-v1. Case
+folding depends on the local encoding, which is thus part of their names.
+Searching the descriptions scans this file at once.
+
+Like for the revision branch cache, values are only used while the node
+prefix of their revision matches the changelog, and all columns are
+truncated from the first revision which does not match anymore, e.g. after
+a strip or a rollback. The columns are brought up to date when a
+transaction closes, and when they are used.
+"""
+
+from __future__ import absolute_import
+
+import array
+import bisect
+import re
+import struct
+import sys
+
+from . import (
+    encoding,
+    error,
+)
+
+_version = '-v1'
+_users = 'cache/cm-users' + _version
+
+def _nodeprefix(node):
+    return struct.unpack('>I', node[:4])[0]
+
+class _column(object):
+    """array of one fixed size value per revision, stored big-endian in
+    .hg/cache/cm-<name>-v1"""
+
+    def __init__(self, vfs, name, typecode):
+        self.name = 'cache/cm-%s%s' % (name, _version)
+        self.values = array.array(typecode)
+        try:
+            data = vfs.read(self.name)
+            self.values.fromstring(data[:len(data) - len(data) %
+                                        self.values.itemsize])
+            if sys.byteorder == 'little':
+                self.values.byteswap()
+        except (IOError, OSError):
+            pass
+        # number of values on disk
+        self.disklen = len(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def truncate(self, n):
+        del self.values[n:]
+        self.disklen = min(self.disklen, n)
+
+    def write(self, vfs):
+        if self.disklen == len(self.values):
+            return
+        values = self.values[self.disklen:]
+        if sys.byteorder == 'little':
+            values.byteswap()
+        f = vfs.open(self.name, 'ab')
+        try:
+            start = self.disklen * values.itemsize
+            if f.tell() != start:
+                f.seek(start)
+                f.truncate()
+            f.write(values.tostring())
+        finally:
+            f.close()
+        self.disklen = len(self.values)
+
+class changesetmetaindex(object):
+    """Persistent columns of the user, date and, optionally, lowercased
+    description of each changeset. This is a low level cache, independent
+    of filtering."""
+
+    def __init__(self, repo, descriptions=False):
+        assert repo.filtername is None
+        self._repo = repo
+        vfs = repo.vfs
+        self._users = [] # user names, their index being their number
+        try:
+            data = vfs.read(_users)
+            if data:
+                self._users = [encoding.tolocal(u) for u in data.split('\0')]
+        except (IOError, OSError) as inst:
+            repo.ui.debug("couldn't read changeset metadata index: %s\n"
+                          % inst)
+        self._nodes = _column(vfs, 'node', 'I')
+        self._userids = _column(vfs, 'user', 'I')
+        self._times = _column(vfs, 'time', 'd')
+        self._tzs = _column(vfs, 'tz', 'i')
+        self._columns = [self._nodes, self._userids, self._times, self._tzs]
+        # user numbers are written after the names they use
+        userids = self._userids.values
+        if userids and max(userids) >= len(self._users):
+            for c in self._columns:
+                c.truncate(0)
+        self._len = min(len(c) for c in self._columns)
+        self._descends = None
+        if descriptions:
+            # case folding depends on the encoding
+            enc = re.sub(r'[^a-z0-9]', '_', encoding.encoding.lower())
+            self._descname = 'cache/cm-desc-%s%s' % (enc, _version)
+            self._descends = _column(vfs, 'descend-' + enc, 'I')
+            try:
+                self._descs = vfs.read(self._descname)
+            except (IOError, OSError):
+                self._descs = ''
+            ends = self._descends.values
+            while ends and ends[-1] > len(self._descs):
+                ends.pop()
+            self._descends.truncate(len(ends))
+            self._descs = self._descs[:ends and ends[-1] or 0]
+            self._descsdisklen = len(self._descs)
+            self._newdescs = []
+        for c in self._allcolumns():
+            c.truncate(self._len)
+        self._usersreverse = dict((u, i) for i, u in enumerate(self._users))
+        self._userslen = len(self._users)
+        self._usersdatalen = len('\0'.join(encoding.fromlocal(u)
+                                           for u in self._users))
+
+    def __len__(self):
+        """number of revisions in the index"""
+        return self._len
+
+    def _allcolumns(self):
+        if self._descends is None:
+            return self._columns
+        return self._columns + [self._descends]
+
+    def _truncate(self, n):
+        """drop the values from revision n"""
+        self._flushdescs()
+        for c in self._allcolumns():
+            c.truncate(n)
+        if self._descends is not None:
+            ends = self._descends.values
+            self._descs = self._descs[:ends and ends[-1] or 0]
+            self._descsdisklen = min(self._descsdisklen, len(self._descs))
+        self._len = n
+
+    def _flushdescs(self):
+        if self._descends is not None and self._newdescs:
+            self._descs += ''.join(self._newdescs)
+            self._newdescs = []
+
+    def update(self):
+        """add the revisions missing from the index"""
+        cl = self._repo.changelog
+        node = cl.node
+        n = min(self._len, len(cl))
+        nodes = self._nodes.values
+        if n and nodes[n - 1] != _nodeprefix(node(n - 1)):
+            # the changelog only loses its last revisions: find the first
+            # one which changed
+            lo, hi = 0, n - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if nodes[mid] == _nodeprefix(node(mid)):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            n = lo
+        if n < self._len:
+            self._truncate(n)
+
+        users = self._users
+        usersreverse = self._usersreverse
+        start = self._len
+        descends = None
+        if self._descends is not None:
+            descends = self._descends.values
+            start = min(start, len(descends))
+            end = descends and descends[-1] or 0
+        for rev in xrange(start, len(cl)):
+            cnode = node(rev)
+            c = cl.read(cnode)
+            if rev >= self._len:
+                user = c[1]
+                i = usersreverse.get(user)
+                if i is None:
+                    i = usersreverse[user] = len(users)
+                    users.append(user)
+                nodes.append(_nodeprefix(cnode))
+                self._userids.values.append(i)
+                self._times.values.append(c[2][0])
+                self._tzs.values.append(c[2][1])
+                self._len += 1
+            if descends is not None:
+                desc = encoding.lower(c[4]) + '\0'
+                end += len(desc)
+                if end > 0xffffffff:
+                    # no room for more descriptions
+                    descends = None
+                    continue
+                self._newdescs.append(desc)
+                descends.append(end)
+
+    def matchusers(self, match):
+        """set of the numbers of the users for which match is True"""
+        return set(i for i, u in enumerate(self._users) if match(u))
+
+    def userid(self, rev):
+        return self._userids.values[rev]
+
+    def time(self, rev):
+        return self._times.values[rev]
+
+    def descriptionslen(self):
+        """number of revisions whose description is indexed"""
+        if self._descends is None:
+            return 0
+        return len(self._descends)
+
+    def descrevs(self, s):
+        """set of the revisions whose lowercased description contains s,
+        among the revisions whose description is indexed"""
+        self._flushdescs()
+        ends = self._descends.values
+        descs = self._descs
+        if not s:
+            return set(xrange(len(ends)))
+        revs = set()
+        pos = descs.find(s)
+        while pos >= 0:
+            rev = bisect.bisect_right(ends, pos)
+            revs.add(rev)
+            # the descriptions are separated by NUL bytes, a match cannot
+            # span two of them unless s contains one
+            pos = descs.find(s, ends[rev])
+        return revs
+
+    def write(self, tr=None):
+        """save the index if it changed
+
+        Nothing is written if the wlock cannot be acquired at once."""
+        self._flushdescs()
+        if (self._userslen == len(self._users)
+            and all(c.disklen == len(c) for c in self._allcolumns())
+            and (self._descends is None
+                 or self._descsdisklen == len(self._descs))):
+            return
+        repo = self._repo
+        vfs = repo.vfs
+        try:
+            wlock = repo.wlock(wait=False)
+        except error.LockError:
+            repo.ui.debug("not writing changeset metadata index: wlock cannot "
+                          "be acquired\n")
+            return
+        try:
+            if self._userslen < len(self._users):
+                f = None
+                if self._userslen:
+                    f = vfs.open(_users, 'ab')
+                    if f.tell() == self._usersdatalen:
+                        f.write('\0')
+                    else:
+                        f.close()
+                        f = None
+                        repo.ui.debug("%s changed - rewriting it\n" % _users)
+                        self._userslen = 0
+                        for c in self._columns:
+                            c.disklen = 0
+                if f is None:
+                    f = vfs.open(_users, 'wb')
+                try:
+                    f.write('\0'.join(encoding.fromlocal(u)
+                                      for u in self._users[self._userslen:]))
+                    self._usersdatalen = f.tell()
+                finally:
+                    f.close()
+                self._userslen = len(self._users)
+            # the nodes come last, so that values are only used once they
+            # are all written
+            for c in reversed(self._columns):
+                c.write(vfs)
+            if self._descends is not None:
+                if self._descsdisklen < len(self._descs):
+                    f = vfs.open(self._descname, 'ab')
+                    try:
+                        if f.tell() != self._descsdisklen:
+                            f.seek(self._descsdisklen)
+                            f.truncate()
+                        f.write(self._descs[self._descsdisklen:])
+                    finally:
+                        f.close()
+                    self._descsdisklen = len(self._descs)
+                self._descends.write(vfs)
+        except (IOError, OSError, error.Abort) as inst:
+            repo.ui.debug("couldn't write changeset metadata index: %s\n"
+                          % inst)
+        finally:
+            wlock.release()
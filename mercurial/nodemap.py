@@ -0,0 +1,394 @@
+# nodemap.py - persistent node -> rev mapping for revlogs
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""persistent on-disk mapping from nodes to revision numbers
+
+Building the node -> rev mapping of a large revlog requires scanning its
+whole index, which every process has to do again. This module stores the
+mapping on disk as a base-16 radix tree that can be queried without
+loading it entirely, and that is updated incrementally when revisions are
+added.
+
+Two files are stored next to the revlog index:
+
+``<name>.n`` (the docket) is small and rewritten atomically at the end of
+each transaction updating the revlog. It contains::
+
+    1 byte:   format version
+    8 bytes:  unique identifier of the data file content
+    4 bytes:  tip revision covered by the tree
+    20 bytes: node of that tip revision
+    8 bytes:  length of the tree data in use
+    8 bytes:  length of the unused tree data
+    4 bytes:  index of the root block
+
+``<name>.nd`` (the data file) starts with the same 8 bytes identifier,
+followed by the blocks of the tree. Each block is an array of 16 big
+endian signed 32 bits integers, one for each possible hexadecimal digit
+of the nodes at the depth of the block. An entry is either:
+
+- -1: no node,
+- a positive value: the index of a child block,
+- a value v <= -2: the revision -(v + 2).
+
+Existing blocks are never modified: updates copy the blocks on the path to
+the new entries and append them to the data file, leaving the old blocks
+unused. The tree is rewritten from scratch when too much data is unused.
+
+The mapping is only a hint: the revisions it returns are always checked
+against the revlog index, and the whole mapping is ignored when the revlog
+does not match the docket anymore (e.g. after a strip by a client not
+maintaining it).
+"""
+
+from __future__ import absolute_import
+
+import os
+import struct
+
+from .i18n import _
+from .node import (
+    hex,
+    nullid,
+)
+from . import (
+    error,
+)
+
+_pack = struct.pack
+_unpack = struct.unpack
+
+NODEMAP_VERSION = 1
+_docketformat = '>B8sl20sQQl'
+_docketsize = struct.calcsize(_docketformat)
+_uidsize = 8
+_blockformat = '>16l'
+_blocksize = struct.calcsize(_blockformat)
+_emptyblock = [-1] * 16
+
+def docketfile(indexfile):
+    return indexfile[:-2] + '.n'
+
+def datafile(indexfile):
+    return indexfile[:-2] + '.nd'
+
+def _opener(revlog):
+    # the changelog opener may divert or delay writes to its index, use the
+    # underlying vfs to access the nodemap files
+    return getattr(revlog, '_realopener', revlog.opener)
+
+def _newuid():
+    return os.urandom(_uidsize)
+
+def _torev(v):
+    return -(v + 2)
+
+def _fromrev(rev):
+    return -(rev + 2)
+
+class docket(object):
+    """description of the persisted tree"""
+    def __init__(self, uid=None, tiprev=-1, tipnode=nullid, datalength=0,
+                 unusedlength=0, root=0):
+        if uid is None:
+            uid = _newuid()
+        self.uid = uid
+        self.tiprev = tiprev
+        self.tipnode = tipnode
+        self.datalength = datalength
+        self.unusedlength = unusedlength
+        self.root = root
+
+    def serialize(self):
+        return _pack(_docketformat, NODEMAP_VERSION, self.uid, self.tiprev,
+                     self.tipnode, self.datalength, self.unusedlength,
+                     self.root)
+
+    @classmethod
+    def parse(cls, data):
+        if len(data) != _docketsize:
+            return None
+        (version, uid, tiprev, tipnode, datalength,
+         unusedlength, root) = _unpack(_docketformat, data)
+        if version != NODEMAP_VERSION:
+            return None
+        return cls(uid, tiprev, tipnode, datalength, unusedlength, root)
+
+    def validfor(self, revlog):
+        """tell if the tree describes the revisions of a revlog"""
+        if self.tiprev < 0:
+            return self.tipnode == nullid
+        return (self.tiprev < len(revlog)
+                and revlog.index[self.tiprev][7] == self.tipnode)
+
+def readdocket(opener, indexfile):
+    """read the docket of a revlog, returns None if missing or invalid"""
+    try:
+        data = opener.read(docketfile(indexfile))
+    except (IOError, OSError):
+        return None
+    return docket.parse(data)
+
+def readdata(opener, indexfile, dk):
+    """read the tree data described by a docket, None if inconsistent"""
+    try:
+        fp = opener(datafile(indexfile))
+    except (IOError, OSError):
+        return None
+    try:
+        data = fp.read(_uidsize + dk.datalength)
+    finally:
+        fp.close()
+    if len(data) != _uidsize + dk.datalength or data[:_uidsize] != dk.uid:
+        return None
+    return data
+
+class persistentnodemap(object):
+    """read-only access to the persisted node -> rev mapping of a revlog"""
+
+    def __init__(self, dk, data):
+        self.docket = dk
+        self._data = data
+        # nodes of the revisions added after the docket tip
+        self._tail = {}
+        self._tailrev = dk.tiprev
+
+    @property
+    def tiprev(self):
+        return self.docket.tiprev
+
+    def _block(self, idx):
+        offset = _uidsize + idx * _blocksize
+        return _unpack(_blockformat, self._data[offset:offset + _blocksize])
+
+    def _lookup(self, hexnode):
+        """return the candidate revision for a full or partial hex node
+
+        Returns -1 if no revision matches, the revision number if a single
+        revision may match, and None if several revisions match.
+        """
+        if not self.docket.datalength:
+            return -1
+        idx = self.docket.root
+        for c in hexnode:
+            v = self._block(idx)[int(c, 16)]
+            if v == -1:
+                return -1
+            if v <= -2:
+                return _torev(v)
+            idx = v
+        return None
+
+    def _scantail(self, revlog):
+        """index the nodes of revisions past the tree tip"""
+        index = revlog.index
+        tail = self._tail
+        for r in xrange(self._tailrev + 1, len(revlog)):
+            tail[index[r][7]] = r
+        self._tailrev = max(self._tailrev, len(revlog) - 1)
+
+    def rev(self, revlog, node):
+        """return the revision of a node, or None if it is not known"""
+        r = self._lookup(hex(node))
+        if r is not None and 0 <= r <= self.tiprev:
+            if revlog.index[r][7] == node:
+                return r
+        self._scantail(revlog)
+        return self._tail.get(node)
+
+    def partialmatch(self, revlog, prefix):
+        """return the node matching an hex prefix, or None
+
+        Raises RevlogError if the prefix is ambiguous and ValueError if it
+        is not hexadecimal.
+        """
+        int(prefix, 16) # raise ValueError if not hexadecimal
+        matches = []
+        r = self._lookup(prefix)
+        if r is None:
+            raise error.RevlogError(_('ambiguous identifier'))
+        if 0 <= r <= self.tiprev:
+            n = revlog.index[r][7]
+            if hex(n).startswith(prefix):
+                matches.append(n)
+        self._scantail(revlog)
+        for n in self._tail:
+            if hex(n).startswith(prefix):
+                matches.append(n)
+        if len(matches) > 1:
+            raise error.RevlogError(_('ambiguous identifier'))
+        if matches:
+            return matches[0]
+        return None
+
+    def dump(self):
+        """yield (hexprefix, rev) for all the entries of the tree"""
+        if not self.docket.datalength:
+            return
+        stack = [(self.docket.root, '')]
+        while stack:
+            idx, prefix = stack.pop()
+            block = self._block(idx)
+            for i in xrange(15, -1, -1):
+                v = block[i]
+                if v == -1:
+                    continue
+                p = prefix + '%x' % i
+                if v <= -2:
+                    yield p, _torev(v)
+                else:
+                    stack.append((v, p))
+
+def load(revlog):
+    """return the persistent nodemap of a revlog, None if unusable"""
+    opener = _opener(revlog)
+    dk = readdocket(opener, revlog.indexfile)
+    if dk is None or not dk.validfor(revlog):
+        return None
+    data = readdata(opener, revlog.indexfile, dk)
+    if data is None:
+        return None
+    return persistentnodemap(dk, data)
+
+class _treebuilder(object):
+    """add entries to a tree, copying the persisted blocks on write"""
+
+    def __init__(self, revlog, data='', dk=None):
+        self._revlog = revlog
+        self._data = data
+        self._persisted = max(0, len(data) - _uidsize) // _blocksize
+        self._new = {}
+        self._next = self._persisted
+        self.unusedlength = 0
+        if dk is not None:
+            self.unusedlength = dk.unusedlength
+        if dk is None or not dk.datalength:
+            self.root = self._newblock()[0]
+        else:
+            self.root = dk.root
+
+    def _newblock(self, block=_emptyblock):
+        idx = self._next
+        self._next += 1
+        block = list(block)
+        self._new[idx] = block
+        return idx, block
+
+    def _writable(self, idx):
+        block = self._new.get(idx)
+        if block is not None:
+            return idx, block
+        offset = _uidsize + idx * _blocksize
+        self.unusedlength += _blocksize
+        return self._newblock(_unpack(_blockformat,
+                                      self._data[offset:offset + _blocksize]))
+
+    def insert(self, node, rev):
+        self.root = self._insert(self.root, hex(node), 0, rev)
+
+    def _insert(self, idx, hexnode, level, rev):
+        idx, block = self._writable(idx)
+        nibble = int(hexnode[level], 16)
+        v = block[nibble]
+        if v == -1:
+            block[nibble] = _fromrev(rev)
+        elif v >= 0:
+            block[nibble] = self._insert(v, hexnode, level + 1, rev)
+        else:
+            # split the entry into a new block holding both revisions
+            other = _torev(v)
+            otherhex = hex(self._revlog.index[other][7])
+            if otherhex == hexnode:
+                block[nibble] = _fromrev(rev)
+                return idx
+            childidx, child = self._newblock()
+            child[int(otherhex[level + 1], 16)] = v
+            block[nibble] = self._insert(childidx, hexnode, level + 1, rev)
+        return idx
+
+    def newdata(self):
+        """return the serialized blocks added to the tree"""
+        return ''.join(_pack(_blockformat, *self._new[idx])
+                       for idx in xrange(self._persisted, self._next))
+
+def _shouldrebuild(dk):
+    """tell if the tree should be rewritten to drop the unused data"""
+    return dk.unusedlength > max(dk.datalength // 2, 64 * _blocksize)
+
+def _build(revlog, start, dk=None, data=''):
+    builder = _treebuilder(revlog, data, dk)
+    index = revlog.index
+    for r in xrange(start, len(revlog)):
+        builder.insert(index[r][7], r)
+    return builder
+
+def update(revlog, tr=None, force=False):
+    """bring the persistent nodemap of a revlog in sync with its index
+
+    The tree is updated incrementally when possible, and rebuilt from
+    scratch if missing, invalid, too fragmented or when ``force`` is set.
+    When a transaction is given, the changes to the data file are
+    registered in it so they are undone if it is rolled back. Returns the
+    new docket.
+    """
+    opener = _opener(revlog)
+    indexfile = revlog.indexfile
+    tiprev = len(revlog) - 1
+    tipnode = revlog.index[tiprev][7]
+    dk = None
+    data = None
+    if not force:
+        dk = readdocket(opener, indexfile)
+        if dk is not None and dk.validfor(revlog) and not _shouldrebuild(dk):
+            data = readdata(opener, indexfile, dk)
+    if data is not None:
+        if dk.tiprev == tiprev:
+            return dk
+        builder = _build(revlog, dk.tiprev + 1, dk, data)
+        newdata = builder.newdata()
+        if tr is not None:
+            tr.add(datafile(indexfile), _uidsize + dk.datalength)
+        fp = opener(datafile(indexfile), 'r+b')
+        try:
+            fp.seek(_uidsize + dk.datalength)
+            fp.write(newdata)
+        finally:
+            fp.close()
+        dk = docket(dk.uid, tiprev, tipnode, dk.datalength + len(newdata),
+                    builder.unusedlength, builder.root)
+    else:
+        builder = _build(revlog, 0)
+        newdata = builder.newdata()
+        dk = docket(tiprev=tiprev, tipnode=tipnode, datalength=len(newdata),
+                    root=builder.root)
+        if tr is not None:
+            if opener.exists(datafile(indexfile)):
+                tr.addbackup(datafile(indexfile))
+            else:
+                tr.add(datafile(indexfile), 0)
+        fp = opener(datafile(indexfile), 'w', atomictemp=True)
+        try:
+            fp.write(dk.uid)
+            fp.write(newdata)
+        finally:
+            fp.close()
+    return dk
+
+def setup(revlog, tr):
+    """update the persistent nodemap of a revlog when ``tr`` is closed"""
+    def write(fp):
+        fp.write(update(revlog, tr).serialize())
+    tr.addfilegenerator('nodemap-%s' % revlog.indexfile,
+                        (docketfile(revlog.indexfile),), write)
+
+def writedocket(revlog, dk):
+    """write a docket outside of any transaction"""
+    fp = _opener(revlog)(docketfile(revlog.indexfile), 'w', atomictemp=True)
+    try:
+        fp.write(dk.serialize())
+    finally:
+        fp.close()
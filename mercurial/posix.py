@@ -139,6 +139,16 @@ def copymode(src, dst, mode=None):
         st_mode &= 0o666
     os.chmod(dst, st_mode)
 
+def _checkdir(path):
+    """return the directory where to create the files checking path
+
+    Files are created in the cache of the repository of a working directory
+    rather than in the working directory itself, to not change its mtime."""
+    cachedir = os.path.join(path, '.hg', 'cache')
+    if os.path.isdir(cachedir):
+        return cachedir
+    return path
+
 def checkexec(path):
     """
     Check whether the given path is on a filesystem with UNIX-like exec flags
@@ -152,7 +162,7 @@ def checkexec(path):
 
     try:
         EXECFLAGS = stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
-        fh, fn = tempfile.mkstemp(dir=path, prefix='hg-checkexec-')
+        fh, fn = tempfile.mkstemp(dir=_checkdir(path), prefix='hg-checkexec-')
         try:
             os.close(fh)
             m = os.stat(fn).st_mode & 0o777
@@ -170,6 +180,7 @@ def checklink(path):
     """check whether the given path is on a symlink-capable filesystem"""
     # mktemp is not racy because symlink creation will fail if the
     # file already exists
+    path = _checkdir(path)
     while True:
         name = tempfile.mktemp(dir=path, prefix='hg-checklink-')
         try:
@@ -19,49 +19,120 @@ def dirstatetuple(*x):
     # x is a tuple
     return x
 
-def parse_index2(data, inline):
-    def gettype(q):
-        return int(q & 0xFFFF)
-
-    def offset_type(offset, type):
-        return long(long(offset) << 16 | type)
-
-    indexformatng = ">Qiiiiii20s12x"
-
-    s = struct.calcsize(indexformatng)
-    index = []
-    cache = None
-    off = 0
-
-    l = len(data) - s
-    append = index.append
-    if inline:
-        cache = (0, data)
+indexformatng = ">Qiiiiii20s12x"
+indexfirst = struct.calcsize('Q')
+sizeint = struct.calcsize('i')
+indexsize = struct.calcsize(indexformatng)
+
+def gettype(q):
+    return int(q & 0xFFFF)
+
+def offset_type(offset, type):
+    return long(long(offset) << 16 | type)
+
+class BaseIndexObject(object):
+    """lazily decoded RevlogNG index
+
+    Entries are only unpacked from the raw index data when accessed, so
+    the data can be a buffer over a memory-mapped file. Entries added
+    after loading are kept in a list. The last entry is a sentinel, always
+    a nullid.
+    """
+    def __len__(self):
+        return self._lgt + len(self._extra) + 1
+
+    def insert(self, i, tup):
+        assert i == -1
+        self._extra.append(tup)
+
+    def _fix_index(self, i):
+        if not isinstance(i, (int, long)):
+            raise TypeError("expecting int indexes")
+        if i < 0:
+            i = len(self) + i
+        if i < 0 or i >= len(self):
+            raise IndexError
+        return i
+
+    def __getitem__(self, i):
+        i = self._fix_index(i)
+        if i == len(self) - 1:
+            return (0, 0, 0, -1, -1, -1, -1, nullid)
+        if i >= self._lgt:
+            return self._extra[i - self._lgt]
+        index = self._calculate_index(i)
+        r = _unpack(indexformatng, self._data[index:index + indexsize])
+        if i == 0:
+            e = list(r)
+            type = gettype(e[0])
+            e[0] = offset_type(0, type)
+            return tuple(e)
+        return r
+
+    def _checkdelslice(self, i):
+        if not isinstance(i, slice) or i.stop != -1 or i.step is not None:
+            raise ValueError("deleting slices only supports a:-1 with step 1")
+        return self._fix_index(i.start)
+
+class IndexObject(BaseIndexObject):
+    def __init__(self, data):
+        if len(data) % indexsize:
+            raise ValueError('corrupt index file')
+        self._data = data
+        self._lgt = len(data) // indexsize
+        self._extra = []
+
+    def _calculate_index(self, i):
+        return i * indexsize
+
+    def __delitem__(self, i):
+        i = self._checkdelslice(i)
+        if i < self._lgt:
+            self._data = self._data[:i * indexsize]
+            self._lgt = i
+            self._extra = []
+        else:
+            self._extra = self._extra[:i - self._lgt]
+
+class InlinedIndexObject(BaseIndexObject):
+    def __init__(self, data):
+        self._data = data
+        self._offsets = self._inline_scan()
+        self._lgt = len(self._offsets)
+        self._extra = []
+
+    def _inline_scan(self):
+        """return the offsets of all the entries in the inline data"""
+        data = self._data
+        offsets = []
+        off = 0
+        l = len(data) - indexsize
         while off <= l:
-            e = _unpack(indexformatng, data[off:off + s])
-            append(e)
-            if e[1] < 0:
+            s = _unpack('>i', data[off + indexfirst:off + indexfirst + sizeint])
+            offsets.append(off)
+            if s[0] < 0:
                 break
-            off += e[1] + s
-    else:
-        while off <= l:
-            e = _unpack(indexformatng, data[off:off + s])
-            append(e)
-            off += s
-
-    if off != len(data):
-        raise ValueError('corrupt index file')
-
-    if index:
-        e = list(index[0])
-        type = gettype(e[0])
-        e[0] = offset_type(0, type)
-        index[0] = tuple(e)
+            off += indexsize + s[0]
+        if off != len(data):
+            raise ValueError('corrupt index file')
+        return offsets
+
+    def _calculate_index(self, i):
+        return self._offsets[i]
+
+    def __delitem__(self, i):
+        i = self._checkdelslice(i)
+        if i < self._lgt:
+            self._offsets = self._offsets[:i]
+            self._lgt = i
+            self._extra = []
+        else:
+            self._extra = self._extra[:i - self._lgt]
 
-    # add the magic null revision at -1
-    index.append((0, 0, 0, -1, -1, -1, -1, nullid))
-
-    return index, cache
+def parse_index2(data, inline):
+    if not inline:
+        return IndexObject(data), None
+    return InlinedIndexObject(data), (0, data)
 
 def parse_dirstate(dmap, copymap, st):
     parents = [st[:20], st[20: 40]]
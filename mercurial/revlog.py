@@ -12,16 +12,18 @@ and O(changes) merge between branches.
 """
 
 # import stuff from node for others to import from revlog
+import bisect
 import collections
+import heapq
 from node import bin, hex, nullid, nullrev
 from i18n import _
 import ancestor, mdiff, parsers, error, util, templatefilters
+import nodemap as nodemaputil
 import struct, zlib, errno
 
 _pack = struct.pack
 _unpack = struct.unpack
-_compress = zlib.compress
-_decompress = zlib.decompress
+_zlibdecompress = zlib.decompress
 _sha = util.sha1
 
 # revlog header flags
@@ -42,6 +44,24 @@ REVIDX_KNOWN_FLAGS = REVIDX_ISCENSORED
 # max size of revlog with inline data
 _maxinline = 131072
 _chunksize = 1048576
+# default total size of the data segments kept by the chunk cache
+_chunkcachebudget = 4 * _chunksize
+# defaults for sparse reads: minimal gap worth skipping and target ratio of
+# useful data over data read from disk
+_srmingapsize = 262144
+_srdensitythreshold = 0.25
+# when only sampling hashes, one revision read out of that many is checked
+_hashchecksamplerate = 16
+# compressed bytes revisions() reads at once
+_revisionsreadsize = 4 * _chunksize
+# the persistent nodemap answers at most one lookup per that many revisions
+# before the node tree of the index is built instead: a lookup in the
+# persistent nodemap costs about as much as indexing 100 revisions
+_nodemaplookupratio = 100
+
+# number of revision texts read whose hash was checked and whose check was
+# skipped by trusted reads, for the whole process
+hashcheckstats = {'checked': 0, 'skipped': 0}
 
 RevlogError = error.RevlogError
 LookupError = error.LookupError
@@ -79,21 +99,248 @@ def hash(text, p1, p2):
     s.update(text)
     return s.digest()
 
-def decompress(bin):
-    """ decompress the given input """
-    if not bin:
-        return bin
-    t = bin[0]
-    if t == '\0':
-        return bin
-    if t == 'x':
-        try:
-            return _decompress(bin)
-        except zlib.error as e:
-            raise RevlogError(_("revlog decompress error: %s") % str(e))
-    if t == 'u':
-        return bin[1:]
-    raise RevlogError(_("unknown compression type %r") % t)
+def _slicechunk(revlog, revs, pending=None):
+    """slice revs to reduce the amount of unrelated data read from disk
+
+    ``revs`` is sliced into groups of revisions that should be read in a
+    single read. The largest gaps between the chunks of consecutive
+    revisions are skipped until the ratio of useful data over data read
+    reaches the revlog density threshold. Gaps smaller than the revlog
+    minimal gap size are never skipped.
+
+    ``pending`` is an optional (offset, length) pair describing the data of
+    the revision about to be added, which ``revs`` may then end with.
+
+    Assumes that revs is in ascending order.
+    """
+    start = revlog.start
+    length = revlog.length
+    if pending is not None:
+        pendingrev = len(revlog)
+        pendingstart, pendinglength = pending
+        def start(rev, start=start):
+            if rev == pendingrev:
+                return pendingstart
+            return start(rev)
+        def length(rev, length=length):
+            if rev == pendingrev:
+                return pendinglength
+            return length(rev)
+
+    if len(revs) <= 1:
+        yield revs
+        return
+
+    startbyte = start(revs[0])
+    endbyte = start(revs[-1]) + length(revs[-1])
+    readdata = deltachainspan = endbyte - startbyte
+    chainpayload = sum(length(r) for r in revs)
+
+    if deltachainspan:
+        density = chainpayload / float(deltachainspan)
+    else:
+        density = 1.0
+
+    # gap sizes are stored negated to pop the largest gaps first
+    gapsheap = []
+    prevend = None
+    for i, rev in enumerate(revs):
+        revstart = start(rev)
+        if prevend is not None:
+            gapsize = revstart - prevend
+            if gapsize > revlog._srmingapsize:
+                heapq.heappush(gapsheap, (-gapsize, i))
+        prevend = revstart + length(rev)
+
+    # collect the indices of the largest gaps until the density is good
+    cutindices = []
+    while gapsheap and density < revlog._srdensitythreshold:
+        oppgapsize, gapidx = heapq.heappop(gapsheap)
+        cutindices.append(gapidx)
+        readdata += oppgapsize
+        if readdata > 0:
+            density = chainpayload / float(readdata)
+        else:
+            density = 1.0
+
+    previdx = 0
+    for idx in sorted(cutindices):
+        yield revs[previdx:idx]
+        previdx = idx
+    yield revs[previdx:]
+
+class chunkcache(object):
+    """LRU cache of raw revlog data segments, bounded by total size
+
+    The cache holds a set of (offset, data) windows of the data file (or
+    of the index file for inline revlogs). Lookups return a buffer over
+    the segment containing the requested range, and the least recently
+    used segments are dropped once the cached data exceeds ``maxbytes``.
+    The most recently added segment is always kept, even if it alone is
+    larger than the budget.
+
+    Hits, misses, the number of bytes read from disk and the number of
+    bytes actually requested by callers are counted so the effectiveness
+    of the cache can be measured.
+    """
+    def __init__(self, maxbytes=_chunkcachebudget):
+        self.maxbytes = maxbytes
+        # (offset, data) pairs, least recently used first
+        self._segments = []
+        # offsets of the segments in order, and the segment at each of them
+        self._offsets = []
+        self._byoffset = {}
+        # no segment is longer, bounding how far back lookups search
+        self._maxlen = 0
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytesread = 0
+        self.bytesused = 0
+
+    def __len__(self):
+        return len(self._segments)
+
+    @property
+    def size(self):
+        """total size of the cached segments"""
+        return self._size
+
+    def lookup(self, offset, length):
+        """return (segoffset, segdata) for a segment covering the range
+
+        Returns None if no cached segment covers ``length`` bytes starting
+        at ``offset``.
+        """
+        segments = self._segments
+        offsets = self._offsets
+        end = offset + length
+        # only the segments starting at most at offset, and close enough
+        # to it to be long enough, can cover the range
+        lowest = end - self._maxlen
+        i = bisect.bisect_right(offsets, offset) - 1
+        while i >= 0 and offsets[i] >= lowest:
+            seg = self._byoffset[offsets[i]]
+            o, d = seg
+            if end <= o + len(d):
+                if seg is not segments[-1]:
+                    # refresh the position of the segment in the LRU order
+                    segments.remove(seg)
+                    segments.append(seg)
+                self.hits += 1
+                return seg
+            i -= 1
+        self.misses += 1
+        return None
+
+    def _remove(self, seg):
+        """drop seg from the offset index"""
+        offsets = self._offsets
+        del offsets[bisect.bisect_left(offsets, seg[0])]
+        del self._byoffset[seg[0]]
+        self._size -= len(seg[1])
+
+    def add(self, offset, data):
+        """insert a segment read from disk at ``offset``"""
+        segments = self._segments
+        if segments:
+            # extend the most recent segment when reading sequentially
+            lastoffset, last = segments[-1]
+            if (lastoffset + len(last) == offset
+                and len(last) + len(data) < _chunksize):
+                self._remove(segments.pop())
+                offset, data = lastoffset, last + data
+        old = self._byoffset.get(offset)
+        if old is not None:
+            # replace a segment read before at the same offset
+            segments.remove(old)
+            self._remove(old)
+        seg = (offset, data)
+        segments.append(seg)
+        bisect.insort(self._offsets, offset)
+        self._byoffset[offset] = seg
+        self._maxlen = max(self._maxlen, len(data))
+        self._size += len(data)
+        while self._size > self.maxbytes and len(segments) > 1:
+            self._remove(segments.pop(0))
+
+    def clear(self):
+        self._segments = []
+        self._offsets = []
+        self._byoffset = {}
+        self._maxlen = 0
+        self._size = 0
+
+    def stats(self):
+        """return a dict describing the cache usage"""
+        return {'segments': len(self._segments),
+                'size': self._size,
+                'maxbytes': self.maxbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytesread': self.bytesread,
+                'bytesused': self.bytesused}
+
+class fulltextcache(object):
+    """LRU cache of revision fulltexts, bounded by their total size
+
+    Texts are keyed by revision number. A text larger than ``maxbytes`` is
+    never cached, and the least recently used texts are dropped once the
+    total size exceeds ``maxbytes``.
+    """
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self._texts = {}
+        self._order = collections.deque()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, rev):
+        return rev in self._texts
+
+    def __getitem__(self, rev):
+        text = self._texts[rev]
+        self._order.remove(rev)
+        self._order.append(rev)
+        self.hits += 1
+        return text
+
+    @property
+    def size(self):
+        """total size of the cached texts"""
+        return self._size
+
+    def add(self, rev, text):
+        l = len(text)
+        if l > self.maxbytes:
+            return
+        texts = self._texts
+        order = self._order
+        if rev in texts:
+            self._size -= len(texts[rev])
+            order.remove(rev)
+        texts[rev] = text
+        order.append(rev)
+        self._size += l
+        while self._size > self.maxbytes:
+            self._size -= len(texts.pop(order.popleft()))
+
+    def clear(self):
+        self._texts.clear()
+        self._order = collections.deque()
+        self._size = 0
+
+    def stats(self):
+        """return a dict describing the cache usage"""
+        return {'entries': len(self._texts),
+                'size': self._size,
+                'maxbytes': self.maxbytes,
+                'hits': self.hits,
+                'misses': self.misses}
 
 # index v0:
 #  4 bytes: offset
@@ -205,16 +452,34 @@ class revlog(object):
         self.indexfile = indexfile
         self.datafile = indexfile[:-2] + ".d"
         self.opener = opener
+        # generations.generationcache of a changelog, see localrepo
+        self.generations = None
         self._cache = None
         self._basecache = None
-        self._chunkcache = (0, '')
         self._chunkcachesize = 65536
+        self._chunkcachebudget = _chunkcachebudget
+        self._fulltextcache = None
+        self._withsparseread = False
+        self._srdensitythreshold = _srdensitythreshold
+        self._srmingapsize = _srmingapsize
         self._maxchainlen = None
         self._aggressivemergedeltas = False
+        self._deltasearch = False
+        self._compengine = 'zlib'
+        self._compengineopts = {}
+        self._decompressors = {}
+        self._sparserevlog = False
+        self._mmapindexthreshold = None
+        self._persistentnodemapenabled = False
+        # 'all', 'sample' or 'none' of the texts read have their hash checked
+        self._hashcheck = 'all'
+        self._hashchecksamplerate = _hashchecksamplerate
+        self._hashreads = 0
         self.index = []
         self._pcache = {}
         self._nodecache = {nullid: nullrev}
         self._nodepos = None
+        self._nodemaplookups = 0
 
         v = REVLOG_DEFAULT_VERSION
         opts = getattr(opener, 'options', None)
@@ -226,11 +491,37 @@ class revlog(object):
                 v = 0
             if 'chunkcachesize' in opts:
                 self._chunkcachesize = opts['chunkcachesize']
+            if 'chunkcachebudget' in opts:
+                self._chunkcachebudget = opts['chunkcachebudget']
             if 'maxchainlen' in opts:
                 self._maxchainlen = opts['maxchainlen']
+            if opts.get('fulltextcachesize'):
+                self._fulltextcache = fulltextcache(opts['fulltextcachesize'])
+            self._sparserevlog = 'sparserevlog' in opts
+            # sparse revlogs rely on sparse reads to bound the data read
+            self._withsparseread = (bool(opts.get('with-sparse-read', False))
+                                    or self._sparserevlog)
+            if 'sparse-read-density-threshold' in opts:
+                self._srdensitythreshold = opts['sparse-read-density-threshold']
+            if 'sparse-read-min-gap-size' in opts:
+                self._srmingapsize = opts['sparse-read-min-gap-size']
             if 'aggressivemergedeltas' in opts:
                 self._aggressivemergedeltas = opts['aggressivemergedeltas']
+            self._deltasearch = bool(opts.get('delta-search', False))
+            if 'compengine' in opts:
+                self._compengine = opts['compengine']
+            if opts.get('compenginelevel') is not None:
+                self._compengineopts['level'] = opts['compenginelevel']
+            if 'mmapindexthreshold' in opts:
+                self._mmapindexthreshold = opts['mmapindexthreshold']
+            if (opts.get('persistent-nodemap')
+                and indexfile in ('00changelog.i', '00manifest.i')):
+                self._persistentnodemapenabled = True
             self._lazydeltabase = bool(opts.get('lazydeltabase', False))
+            if 'hashcheck' in opts:
+                self._hashcheck = opts['hashcheck']
+            if 'hashchecksamplerate' in opts:
+                self._hashchecksamplerate = opts['hashchecksamplerate']
 
         if self._chunkcachesize <= 0:
             raise RevlogError(_('revlog chunk cache size %r is not greater '
@@ -238,13 +529,25 @@ class revlog(object):
         elif self._chunkcachesize & (self._chunkcachesize - 1):
             raise RevlogError(_('revlog chunk cache size %r is not a power '
                                 'of 2') % self._chunkcachesize)
+        # the budget holds at least one window of the chunk cache
+        self._chunkcachebudget = max(self._chunkcachebudget,
+                                     self._chunkcachesize)
+        if self._hashcheck not in ('all', 'sample', 'none'):
+            raise RevlogError(_('unknown revlog hash check mode %r')
+                              % self._hashcheck)
+        if self._hashchecksamplerate <= 0:
+            raise RevlogError(_('revlog hash check sample rate %r is not '
+                                'greater than 0') % self._hashchecksamplerate)
+        self._chunkcache = chunkcache(self._chunkcachebudget)
 
         indexdata = ''
         self._initempty = True
         try:
             f = self.opener(self.indexfile)
-            indexdata = f.read()
-            f.close()
+            try:
+                indexdata = self._readindex(f)
+            finally:
+                f.close()
             if len(indexdata) > 0:
                 v = struct.unpack(versionformat, indexdata[:4])[0]
                 self._initempty = False
@@ -255,6 +558,8 @@ class revlog(object):
         self.version = v
         self._inline = v & REVLOGNGINLINEDATA
         self._generaldelta = v & REVLOGGENERALDELTA
+        # intermediate snapshots are only possible with generaldelta
+        self._sparserevlog = bool(self._generaldelta and self._sparserevlog)
         flags = v & ~0xFFFF
         fmt = v & 0xFFFF
         if fmt == REVLOGV0 and flags:
@@ -274,14 +579,34 @@ class revlog(object):
             d = self._io.parseindex(indexdata, self._inline)
         except (ValueError, IndexError):
             raise RevlogError(_("index %s is corrupted") % (self.indexfile))
-        self.index, nodemap, self._chunkcache = d
+        self.index, nodemap, initialchunk = d
         if nodemap is not None:
             self.nodemap = self._nodecache = nodemap
-        if not self._chunkcache:
-            self._chunkclear()
+        if initialchunk:
+            self._chunkcache.add(*initialchunk)
         # revnum -> (chain-length, sum-delta-length)
         self._chaininfocache = {}
 
+    def _readindex(self, fp):
+        """read the content of the index file
+
+        Large indexes of non-inline revlogs are memory-mapped when
+        requested by the mmapindexthreshold option: entries are then only
+        decoded when accessed, and the pages are shared with the other
+        processes reading the same revlog.
+        """
+        threshold = self._mmapindexthreshold
+        if threshold is None or not util.safehasattr(fp, 'fileno'):
+            return fp.read()
+        header = fp.read(4)
+        if len(header) < 4:
+            return header
+        v = struct.unpack(versionformat, header)[0]
+        if (v & REVLOGNGINLINEDATA or (v & 0xFFFF) != REVLOGNG
+            or util.fstat(fp).st_size < threshold):
+            return header + fp.read()
+        return util.buffer(util.mmapread(fp))
+
     def tip(self):
         return self.node(len(self.index) - 2)
     def __contains__(self, rev):
@@ -303,8 +628,22 @@ class revlog(object):
 
     @util.propertycache
     def nodemap(self):
-        self.rev(self.node(0))
-        return self._nodecache
+        # lookups answered by the persistent nodemap leave holes in the pure
+        # python node cache: index every node and look them up there from
+        # now on
+        self._persistentnodemap = None
+        n = self._nodecache
+        if isinstance(n, dict):
+            i = self.index
+            p = self._nodepos
+            if p is None:
+                p = len(i) - 2
+            for r in xrange(p, -1, -1):
+                n[i[r][7]] = r
+            self._nodepos = -1
+        else:
+            self.rev(self.node(0))
+        return n
 
     def hasnode(self, node):
         try:
@@ -313,7 +652,15 @@ class revlog(object):
         except KeyError:
             return False
 
+    @util.propertycache
+    def _persistentnodemap(self):
+        if not self._persistentnodemapenabled:
+            return None
+        return nodemaputil.load(self)
+
     def clearcaches(self):
+        self.__dict__.pop('_persistentnodemap', None)
+        self._nodemaplookups = 0
         try:
             self._nodecache.clearcaches()
         except AttributeError:
@@ -321,6 +668,18 @@ class revlog(object):
             self._nodepos = None
 
     def rev(self, node):
+        pnm = self._persistentnodemap
+        if pnm is not None and node != nullid:
+            self._nodemaplookups += 1
+            if self._nodemaplookups * _nodemaplookupratio <= len(self):
+                r = pnm.rev(self, node)
+                if r is None:
+                    raise LookupError(node, self.indexfile, _('no node'))
+                self._nodecache[node] = r
+                return r
+            # enough lookups to pay for the node tree of the index, which
+            # answers the next ones faster than the persistent nodemap
+            self._persistentnodemap = None
         try:
             return self._nodecache[node]
         except TypeError:
@@ -369,6 +728,24 @@ class revlog(object):
     def chainlen(self, rev):
         return self._chaininfo(rev)[0]
 
+    def _deltachain(self, rev):
+        """return the revisions of the delta chain of rev, base first"""
+        index = self.index
+        generaldelta = self._generaldelta
+        chain = []
+        iterrev = rev
+        e = index[iterrev]
+        while iterrev != e[3]:
+            chain.append(iterrev)
+            if generaldelta:
+                iterrev = e[3]
+            else:
+                iterrev -= 1
+            e = index[iterrev]
+        chain.append(iterrev)
+        chain.reverse()
+        return chain
+
     def _chaininfo(self, rev):
         chaininfocache = self._chaininfocache
         if rev in chaininfocache:
@@ -418,8 +795,11 @@ class revlog(object):
 
         See the documentation for ancestor.lazyancestors for more details."""
 
+        genfunc = None
+        if self.generations is not None:
+            genfunc = self.generations.generation
         return ancestor.lazyancestors(self.parentrevs, revs, stoprev=stoprev,
-                                      inclusive=inclusive)
+                                      inclusive=inclusive, genfunc=genfunc)
 
     def descendants(self, revs):
         """Generate the descendants of 'revs' in revision order.
@@ -518,7 +898,11 @@ class revlog(object):
         if common is None:
             common = [nullrev]
 
-        return ancestor.incrementalmissingancestors(self.parentrevs, common)
+        genfunc = None
+        if self.generations is not None:
+            genfunc = self.generations.generation
+        return ancestor.incrementalmissingancestors(self.parentrevs, common,
+                                                    genfunc=genfunc)
 
     def findmissingrevs(self, common=None, heads=None):
         """Return the revision numbers of the ancestors of heads that
@@ -798,6 +1182,10 @@ class revlog(object):
     def descendant(self, start, end):
         if start == nullrev:
             return True
+        if (self.generations is not None and
+            self.generations.generation(start) >=
+            self.generations.generation(end)):
+            return False
         for i in self.descendants([start]):
             if i == end:
                 return True
@@ -819,6 +1207,11 @@ class revlog(object):
 
         The implementation of this is trivial but the use of
         commonancestorsheads is not."""
+        if self.generations is not None and a != b:
+            # an ancestor has a lower generation number
+            gen = self.generations.generation
+            if gen(self.rev(a)) >= gen(self.rev(b)):
+                return False
         return a in self.commonancestorsheads(a, b)
 
     def ancestor(self, a, b):
@@ -869,6 +1262,21 @@ class revlog(object):
                 pass
 
     def _partialmatch(self, id):
+        pnm = self._persistentnodemap
+        if pnm is not None:
+            try:
+                n = pnm.partialmatch(self, id)
+                if n and self.hasnode(n):
+                    return n
+                if n is None:
+                    return None
+            except RevlogError:
+                # ambiguous prefix, fall through to the slow path that
+                # filters hidden revisions
+                pass
+            except ValueError:
+                # not an hexadecimal prefix
+                pass
         try:
             n = self.index.partialmatch(id)
             if n and self.hasnode(n):
@@ -925,14 +1333,6 @@ class revlog(object):
         p1, p2 = self.parents(node)
         return hash(text, p1, p2) != node
 
-    def _addchunk(self, offset, data):
-        o, d = self._chunkcache
-        # try to add to existing cache
-        if o + len(d) == offset and len(d) + len(data) < _chunksize:
-            self._chunkcache = o, d + data
-        else:
-            self._chunkcache = offset, data
-
     def _loadchunk(self, offset, length, df=None):
         """Load a chunk/segment from the revlog.
 
@@ -941,6 +1341,9 @@ class revlog(object):
 
         If an existing file handle is passed, it will be seeked and the
         original seek position will NOT be restored.
+
+        Returns a (offset, data) tuple for the segment actually read, which
+        covers at least the requested range.
         """
         if df is not None:
             closehandle = False
@@ -962,25 +1365,30 @@ class revlog(object):
         d = df.read(reallength)
         if closehandle:
             df.close()
-        self._addchunk(realoffset, d)
-        if offset != realoffset or reallength != length:
-            return util.buffer(d, offset - realoffset, length)
-        return d
+        self._chunkcache.bytesread += len(d)
+        self._chunkcache.add(realoffset, d)
+        return realoffset, d
 
-    def _getchunk(self, offset, length, df=None):
-        o, d = self._chunkcache
-        l = len(d)
-
-        # is it in the cache?
-        cachestart = offset - o
-        cacheend = cachestart + length
-        if cachestart >= 0 and cacheend <= l:
-            if cachestart == 0 and cacheend == l:
-                return d # avoid a copy
-            return util.buffer(d, cachestart, cacheend - cachestart)
+    def _getsegment(self, offset, length, df=None):
+        """Obtain a segment of raw data from the revlog.
 
+        Returns a (offset, data) tuple where data covers at least
+        ``length`` bytes starting at ``offset``. The data is served from
+        the chunk cache when possible.
+        """
+        seg = self._chunkcache.lookup(offset, length)
+        if seg is not None:
+            return seg
         return self._loadchunk(offset, length, df=df)
 
+    def _getchunk(self, offset, length, df=None):
+        o, d = self._getsegment(offset, length, df=df)
+        self._chunkcache.bytesused += length
+        start = offset - o
+        if start == 0 and length == len(d):
+            return d # avoid a copy
+        return util.buffer(d, start, length)
+
     def _chunkraw(self, startrev, endrev, df=None):
         start = self.start(startrev)
         end = self.end(endrev)
@@ -991,7 +1399,7 @@ class revlog(object):
         return self._getchunk(start, length, df=df)
 
     def _chunk(self, rev, df=None):
-        return decompress(self._chunkraw(rev, rev, df=df))
+        return self.decompress(self._chunkraw(rev, rev, df=df))
 
     def _chunks(self, revs, df=None):
         '''faster version of [self._chunk(rev) for rev in revs]
@@ -1004,35 +1412,48 @@ class revlog(object):
         inline = self._inline
         iosize = self._io.size
         buffer = util.buffer
+        decompress = self.decompress
 
         l = []
         ladd = l.append
 
-        # preload the cache
-        try:
-            while True:
-                # ensure that the cache doesn't change out from under us
-                _cache = self._chunkcache
-                self._chunkraw(revs[0], revs[-1], df=df)
-                if _cache == self._chunkcache:
-                    break
-            offset, data = _cache
-        except OverflowError:
-            # issue4215 - we can't cache a run of chunks greater than
-            # 2G on Windows
-            return [self._chunk(rev, df=df) for rev in revs]
+        if not self._withsparseread:
+            slicedchunks = (revs,)
+        else:
+            slicedchunks = _slicechunk(self, revs)
 
-        for rev in revs:
-            chunkstart = start(rev)
+        for revschunk in slicedchunks:
+            # fetch a single segment covering all the revisions of the slice
+            firstrev, lastrev = revschunk[0], revschunk[-1]
+            segstart = start(firstrev)
+            segend = start(lastrev) + length(lastrev)
             if inline:
-                chunkstart += (rev + 1) * iosize
-            chunklength = length(rev)
-            ladd(decompress(buffer(data, chunkstart - offset, chunklength)))
+                segstart += (firstrev + 1) * iosize
+                segend += (lastrev + 1) * iosize
+            try:
+                offset, data = self._getsegment(segstart, segend - segstart,
+                                                df=df)
+            except OverflowError:
+                # issue4215 - we can't cache a run of chunks greater than
+                # 2G on Windows
+                l.extend(self._chunk(rev, df=df) for rev in revschunk)
+                continue
+
+            used = 0
+            for rev in revschunk:
+                chunkstart = start(rev)
+                if inline:
+                    chunkstart += (rev + 1) * iosize
+                chunklength = length(rev)
+                used += chunklength
+                ladd(decompress(buffer(data, chunkstart - offset,
+                                       chunklength)))
+            self._chunkcache.bytesused += used
 
         return l
 
     def _chunkclear(self):
-        self._chunkcache = (0, '')
+        self._chunkcache.clear()
 
     def deltaparent(self, rev):
         """return deltaparent of the given revision"""
@@ -1044,20 +1465,66 @@ class revlog(object):
         else:
             return rev - 1
 
-    def revdiff(self, rev1, rev2):
-        """return or calculate a delta between two revisions"""
+    def issnapshot(self, rev):
+        """tell whether rev is stored as a snapshot
+
+        Snapshots are full texts, and for sparse revlogs, intermediate
+        snapshots: deltas against another snapshot that is not a parent.
+        """
+        if rev == nullrev:
+            return True
+        deltap = self.deltaparent(rev)
+        if deltap == nullrev:
+            return True
+        if not self._sparserevlog:
+            return False
+        if deltap in self.parentrevs(rev):
+            return False
+        return self.issnapshot(deltap)
+
+    def snapshotdepth(self, rev):
+        """number of snapshots rev is based on (0 for a full text)"""
+        if not self.issnapshot(rev):
+            raise RevlogError(_('revision %d of %s is not a snapshot')
+                              % (rev, self.indexfile))
+        return len(self._deltachain(rev)) - 1
+
+    def _snapshotcandidates(self, parents):
+        """yield the snapshots the parents delta chains are based on
+
+        The deepest snapshots come first, each of them only once."""
+        seen = set()
+        for p in parents:
+            if p == nullrev:
+                continue
+            snapshots = [r for r in self._deltachain(p) if self.issnapshot(r)]
+            for r in reversed(snapshots):
+                if r not in seen:
+                    seen.add(r)
+                    yield r
+
+    def revdiff(self, rev1, rev2, _hashcheck=None):
+        """return or calculate a delta between two revisions
+
+        _hashcheck is passed to revision().
+        """
         if rev1 != nullrev and self.deltaparent(rev2) == rev1:
             return str(self._chunk(rev2))
 
-        return mdiff.textdiff(self.revision(rev1),
-                              self.revision(rev2))
+        return mdiff.textdiff(self.revision(rev1, _hashcheck=_hashcheck),
+                              self.revision(rev2, _hashcheck=_hashcheck))
 
-    def revision(self, nodeorrev, _df=None):
+    def revision(self, nodeorrev, _df=None, _hashcheck=None):
         """return an uncompressed revision of a given node or revision
         number.
 
         _df is an existing file handle to read from. It is meant to only be
         used internally.
+
+        _hashcheck overrides the hash check mode of the revlog for this
+        read only. It is meant to only be used internally. With 'all', the
+        texts cached by earlier reads, whose check may have been skipped,
+        are checked before being returned.
         """
         if isinstance(nodeorrev, int):
             rev = nodeorrev
@@ -1069,8 +1536,9 @@ class revlog(object):
         cachedrev = None
         if node == nullid:
             return ""
+        checkall = _hashcheck == 'all'
         if self._cache:
-            if self._cache[0] == node:
+            if self._cache[0] == node and not checkall:
                 return self._cache[2]
             cachedrev = self._cache[1]
 
@@ -1084,6 +1552,14 @@ class revlog(object):
             raise RevlogError(_('incompatible revision flag %x') %
                               (self.flags(rev) & ~REVIDX_KNOWN_FLAGS))
 
+        fulltexts = self._fulltextcache
+        if fulltexts is not None:
+            if rev in fulltexts and not checkall:
+                text = fulltexts[rev]
+                self._cache = (node, rev, text)
+                return text
+            fulltexts.misses += 1
+
         # build delta chain
         chain = []
         index = self.index # for performance
@@ -1091,6 +1567,9 @@ class revlog(object):
         iterrev = rev
         e = index[iterrev]
         while iterrev != e[3] and iterrev != cachedrev:
+            # stop at any intermediate revision we already know the text of
+            if fulltexts and iterrev in fulltexts:
+                break
             chain.append(iterrev)
             if generaldelta:
                 iterrev = e[3]
@@ -1101,6 +1580,8 @@ class revlog(object):
         if iterrev == cachedrev:
             # cache hit
             text = self._cache[2]
+        elif fulltexts and iterrev in fulltexts:
+            text = fulltexts[iterrev]
         else:
             chain.append(iterrev)
         chain.reverse()
@@ -1115,11 +1596,147 @@ class revlog(object):
 
         text = mdiff.patches(text, bins)
 
-        text = self._checkhash(text, node, rev)
+        text = self._checkhash(text, node, rev, _hashcheck)
 
         self._cache = (node, rev, text)
+        if fulltexts is not None:
+            fulltexts.add(rev, text)
         return text
 
+    def revisions(self, revs, _df=None, _hashcheck=None):
+        """generate the uncompressed texts of the given revision numbers
+
+        Texts are generated in the order of ``revs``. The delta chains of
+        all the revisions are planned together, so that a text several
+        chains go through is only restored once. The chunks they need are
+        read in ascending order, ``_revisionsreadsize`` compressed bytes at
+        a time, and dropped once their chain used them.
+
+        _df is an existing file handle to read from. _hashcheck overrides
+        the hash check mode of the revlog, as for revision(). They are
+        meant to only be used internally.
+        """
+        revs = list(revs)
+        fulltexts = self._fulltextcache
+        index = self.index
+        generaldelta = self._generaldelta
+
+        # remaining number of times each revision has to be generated
+        wanted = {}
+        for rev in revs:
+            wanted[rev] = wanted.get(rev, 0) + 1
+            if rev != nullrev and self.flags(rev) & ~REVIDX_KNOWN_FLAGS:
+                raise RevlogError(_('incompatible revision flag %x') %
+                                  (self.flags(rev) & ~REVIDX_KNOWN_FLAGS))
+        todo = sorted(r for r in wanted if r != nullrev)
+
+        # build the delta chains in the order revisions are restored. A chain
+        # starts from its base, from a revision of an earlier chain (restored
+        # by then) or from a text of the fulltext cache (copied, as the cache
+        # may evict it meanwhile).
+        texts = {nullrev: ""}
+        chains = {}
+        users = {}
+        seen = set()
+        needed = []
+        for rev in todo:
+            chain = []
+            iterrev = rev
+            e = index[iterrev]
+            while iterrev not in seen and iterrev != e[3]:
+                if fulltexts and iterrev in fulltexts:
+                    texts[iterrev] = fulltexts[iterrev]
+                    break
+                chain.append(iterrev)
+                if generaldelta:
+                    iterrev = e[3]
+                else:
+                    iterrev -= 1
+                e = index[iterrev]
+            fromtext = iterrev in seen or iterrev in texts
+            chain.append(iterrev)
+            chain.reverse()
+            chains[rev] = chain
+            seen.update(chain)
+            if not fromtext:
+                needed.append(iterrev)
+            elif iterrev != rev:
+                # keep the text until all the chains starting from it are done
+                users[iterrev] = users.get(iterrev, 0) + 1
+            needed.extend(chain[1:])
+
+        needed.sort()
+        chunks = {}
+        used = set()
+        length = self.length
+
+        def getchunk(rev):
+            if rev not in chunks:
+                # read the next chunks not read yet, from rev on
+                batch = []
+                size = 0
+                for r in needed[bisect.bisect_left(needed, rev):]:
+                    if r in chunks or r in used:
+                        continue
+                    if batch and size + length(r) > _revisionsreadsize:
+                        break
+                    batch.append(r)
+                    size += length(r)
+                chunks.update(zip(batch, self._chunks(batch, df=_df)))
+            used.add(rev)
+            return chunks.pop(rev)
+
+        def release(rev):
+            if not users.get(rev) and rev not in wanted and rev != nullrev:
+                texts.pop(rev, None)
+
+        def restore(rev):
+            chain = chains[rev]
+            start = chain[0]
+            if start == rev:
+                # a full text, unless it comes from the fulltext cache
+                if rev not in texts:
+                    node = self.node(rev)
+                    texts[rev] = self._checkhash(str(getchunk(rev)), node,
+                                                 rev, _hashcheck)
+                    self._cache = (node, rev, texts[rev])
+                return
+            if start in texts:
+                text = texts[start]
+                users[start] -= 1
+                release(start)
+            else:
+                text = str(getchunk(start))
+                if start in users:
+                    texts[start] = text
+            bins = []
+            for r in chain[1:-1]:
+                bins.append(getchunk(r))
+                if r in users:
+                    text = mdiff.patches(text, bins)
+                    bins = []
+                    texts[r] = text
+            bins.append(getchunk(rev))
+            text = mdiff.patches(text, bins)
+            node = self.node(rev)
+            text = self._checkhash(text, node, rev, _hashcheck)
+            texts[rev] = text
+            self._cache = (node, rev, text)
+            if fulltexts is not None:
+                fulltexts.add(rev, text)
+
+        # delta parents always come first, restore in ascending order
+        todo.reverse()
+        for rev in revs:
+            while rev not in texts:
+                restore(todo.pop())
+            text = texts[rev]
+            wanted[rev] -= 1
+            if not wanted[rev]:
+                del wanted[rev]
+                release(rev)
+            yield text
+
     def hash(self, text, p1, p2):
         """Compute a node hash.
 
@@ -1128,7 +1745,18 @@ class revlog(object):
         """
         return hash(text, p1, p2)
 
-    def _checkhash(self, text, node, rev):
+    def _checkhash(self, text, node, rev, hashcheck=None):
+        if hashcheck is None:
+            hashcheck = self._hashcheck
+        if hashcheck != 'all' and not self.flags(rev):
+            # trusted read: the store is covered by verify, or the text is
+            # hashed again by whoever receives it
+            sampled = not self._hashreads % self._hashchecksamplerate
+            self._hashreads += 1
+            if hashcheck == 'none' or not sampled:
+                hashcheckstats['skipped'] += 1
+                return text
+        hashcheckstats['checked'] += 1
         p1, p2 = self.parents(node)
         self.checkhash(text, p1, p2, node, rev)
         return text
@@ -1217,6 +1845,9 @@ class revlog(object):
         if node in self.nodemap:
             return node
 
+        if self._persistentnodemapenabled:
+            nodemaputil.setup(self, transaction)
+
         dfh = None
         if not self._inline:
             dfh = self.opener(self.datafile, "a+")
@@ -1229,34 +1860,56 @@ class revlog(object):
                 dfh.close()
             ifh.close()
 
+    @util.propertycache
+    def _compressor(self):
+        engine = util.compengines[self._compengine]
+        return engine.revlogcompressor(self._compengineopts)
+
     def compress(self, text):
-        """ generate a possibly-compressed representation of text """
+        """ generate a possibly-compressed representation of text
+
+        Returns a (header, data) tuple: the data holds the header of the
+        compression engine used, or is preceded by 'u' when it is stored
+        uncompressed."""
         if not text:
             return ("", text)
-        l = len(text)
-        bin = None
-        if l < 44:
-            pass
-        elif l > 1000000:
-            # zlib makes an internal copy, thus doubling memory usage for
-            # large files, so lets do this in pieces
-            z = zlib.compressobj()
-            p = []
-            pos = 0
-            while pos < l:
-                pos2 = pos + 2**20
-                p.append(z.compress(text[pos:pos2]))
-                pos = pos2
-            p.append(z.flush())
-            if sum(map(len, p)) < l:
-                bin = "".join(p)
-        else:
-            bin = _compress(text)
-        if bin is None or len(bin) > l:
-            if text[0] == '\0':
-                return ("", text)
-            return ('u', text)
-        return ("", bin)
+        bin = self._compressor.compress(text)
+        if bin is not None:
+            return ("", bin)
+        if text[0] == '\0':
+            return ("", text)
+        return ('u', text)
+
+    def decompress(self, bin):
+        """ decompress the given input
+
+        The compression engine is found from the first byte of the data,
+        so revlogs may hold chunks compressed by different engines."""
+        if not bin:
+            return bin
+        t = bin[0]
+        if t == '\0':
+            return bin
+        if t == 'x':
+            # zlib is the historical default, avoid the engine lookup
+            try:
+                return _zlibdecompress(bin)
+            except zlib.error as e:
+                raise RevlogError(_("revlog decompress error: %s") % str(e))
+        if t == 'u':
+            return bin[1:]
+        compressor = self._decompressors.get(t)
+        if compressor is None:
+            try:
+                engine = util.compengines.forrevlogheader(t)
+            except KeyError:
+                raise RevlogError(_("unknown compression type %r") % t)
+            if not engine.available():
+                raise RevlogError(_("compression engine %s is not available")
+                                  % engine.name())
+            compressor = engine.revlogcompressor()
+            self._decompressors[t] = compressor
+        return compressor.decompress(bin)
 
     def _isgooddelta(self, d, textlen):
         """Returns True if the given delta is good. Good means that it is within
@@ -1269,12 +1922,26 @@ class revlog(object):
         #   the amount of I/O we need to do.
         # - 'compresseddeltalen' is the sum of the total size of deltas we need
         #   to apply -- bounding it limits the amount of CPU we consume.
-        dist, l, data, base, chainbase, chainlen, compresseddeltalen = d
-        if (dist > textlen * 4 or l > textlen or
+        # - 'snapshotdepth' is set for deltas against a snapshot other than
+        #   the parents (sparse revlogs only), each intermediate snapshot
+        #   level must be smaller than the previous one.
+        (dist, l, data, base, chainbase, chainlen, compresseddeltalen,
+         snapshotdepth) = d
+        maxdist = textlen * 4
+        if self._sparserevlog:
+            # 'dist' is the largest sparse read, reading small areas is fine
+            maxdist = max(maxdist, self._srmingapsize)
+        if (dist > maxdist or l > textlen or
             compresseddeltalen > textlen * 2 or
             (self._maxchainlen and chainlen > self._maxchainlen)):
             return False
 
+        if snapshotdepth is not None:
+            if l > textlen >> snapshotdepth:
+                return False
+            if snapshotdepth and l > self.length(base):
+                return False
+
         return True
 
     def _addrevision(self, node, text, transaction, link, p1, p2, flags,
@@ -1340,7 +2007,22 @@ class revlog(object):
                 chainbase = basecache[1]
             else:
                 chainbase = self.chainbase(rev)
-            dist = l + offset - self.start(chainbase)
+            snapshotdepth = None
+            if self._sparserevlog:
+                # the chain is read in several slices, bound the largest one
+                def readspan(revs):
+                    if revs[0] == curr:
+                        return l
+                    if revs[-1] == curr:
+                        return offset + l - self.start(revs[0])
+                    return self.end(revs[-1]) - self.start(revs[0])
+                chain = self._deltachain(rev) + [curr]
+                dist = max(readspan(revs)
+                           for revs in _slicechunk(self, chain, (offset, l)))
+                if rev not in (p1r, p2r):
+                    snapshotdepth = self.snapshotdepth(rev) + 1
+            else:
+                dist = l + offset - self.start(chainbase)
             if self._generaldelta:
                 base = rev
             else:
@@ -1348,7 +2030,8 @@ class revlog(object):
             chainlen, compresseddeltalen = self._chaininfo(rev)
             chainlen += 1
             compresseddeltalen += l
-            return dist, l, data, base, chainbase, chainlen, compresseddeltalen
+            return (dist, l, data, base, chainbase, chainlen,
+                    compresseddeltalen, snapshotdepth)
 
         curr = len(self)
         prev = curr - 1
@@ -1371,12 +2054,33 @@ class revlog(object):
 
         # should we try to build a delta?
         if prev != nullrev:
-            if cachedelta and self._generaldelta and self._lazydeltabase:
+            sparse = self._sparserevlog
+            if (cachedelta and self._generaldelta and self._lazydeltabase
+                and (not sparse or cachedelta[0] in (p1r, p2r)
+                     or self.issnapshot(cachedelta[0]))):
                 # Assume what we received from the server is a good choice
                 # build delta will reuse the cache
                 d = builddelta(cachedelta[0])
             elif self._generaldelta:
-                if p2r != nullrev and self._aggressivemergedeltas:
+                tried = set((p1r, p2r))
+                if self._deltasearch:
+                    # Evaluate the parents, the previous revision and the
+                    # closest snapshot, and keep the smallest good delta.
+                    closest = next(self._snapshotcandidates((p1r, p2r)), None)
+                    candidates = set((p1r, p2r, prev, closest))
+                    if (sparse and prev not in tried
+                        and not self.issnapshot(prev)):
+                        # only snapshots may be used as non-parent bases
+                        candidates.discard(prev)
+                    candidates.discard(None)
+                    candidates.discard(nullrev)
+                    tried.update(candidates)
+                    for rev in sorted(candidates, reverse=True):
+                        d2 = builddelta(rev)
+                        if (self._isgooddelta(d2, textlen)
+                            and (d is None or d2[1] < d[1])):
+                            d = d2
+                elif p2r != nullrev and self._aggressivemergedeltas:
                     d = builddelta(p1r)
                     d2 = builddelta(p2r)
                     p1good = self._isgooddelta(d, textlen)
@@ -1390,7 +2094,7 @@ class revlog(object):
                         d = d2
                     elif p1good:
                         pass
-                    else:
+                    elif not sparse:
                         # Neither is good, try against prev to hopefully save us
                         # a fulltext.
                         d = builddelta(prev)
@@ -1399,14 +2103,30 @@ class revlog(object):
                     # chance of having to build a fulltext). Since
                     # nullrev == -1, any non-merge commit will always pick p1r.
                     drev = p2r if p2r > p1r else p1r
-                    d = builddelta(drev)
+                    if drev != nullrev or not sparse:
+                        d = builddelta(drev)
                     # If the chosen delta will result in us making a full text,
                     # give it one last try against prev.
-                    if drev != prev and not self._isgooddelta(d, textlen):
+                    if (drev != prev and not sparse
+                        and not self._isgooddelta(d, textlen)):
                         d = builddelta(prev)
+                if sparse and not self._isgooddelta(d, textlen):
+                    # Deltas against unrelated revisions would make the chains
+                    # span large areas. Store an intermediate snapshot (a delta
+                    # against a snapshot the parents are based on) instead of
+                    # a full text.
+                    for snaprev in self._snapshotcandidates((p1r, p2r)):
+                        if snaprev in tried:
+                            continue
+                        d2 = builddelta(snaprev)
+                        if self._isgooddelta(d2, textlen):
+                            d = d2
+                            break
             else:
                 d = builddelta(prev)
-            dist, l, data, base, chainbase, chainlen, compresseddeltalen = d
+            if d is not None:
+                (dist, l, data, base, chainbase, chainlen, compresseddeltalen,
+                 snapshotdepth) = d
 
         if not self._isgooddelta(d, textlen):
             text = buildtext()
@@ -1427,6 +2147,8 @@ class revlog(object):
 
         if type(text) == str: # only accept immutable objects
             self._cache = (node, curr, text)
+            if self._fulltextcache is not None:
+                self._fulltextcache.add(curr, text)
         self._basecache = (curr, chainbase)
         return node
 
@@ -1463,6 +2185,9 @@ class revlog(object):
         content = []
         node = None
 
+        if self._persistentnodemapenabled:
+            nodemaputil.setup(self, transaction)
+
         r = len(self)
         end = 0
         if r:
@@ -1633,6 +2358,11 @@ class revlog(object):
 
         # then reset internal state in memory to forget those revisions
         self._cache = None
+        if self._persistentnodemapenabled:
+            self._persistentnodemap = None
+            nodemaputil.setup(self, transaction)
+        if self._fulltextcache is not None:
+            self._fulltextcache.clear()
         self._chaininfocache = {}
         self._chunkclear()
         for x in xrange(rev, len(self)):
@@ -7,6 +7,7 @@
 
 from __future__ import absolute_import
 
+import binascii
 import heapq
 import re
 
@@ -26,13 +27,19 @@ from . import (
     util,
 )
 
-def _revancestors(repo, revs, followfirst):
-    """Like revlog.ancestors(), but supports followfirst."""
+def _revancestors(repo, revs, followfirst, mingen=None):
+    """Like revlog.ancestors(), but supports followfirst.
+
+    If mingen is given, the parents of revisions with a generation number
+    not above it are not walked: their ancestors are only needed to tell
+    revisions of a lower generation number."""
     if followfirst:
         cut = 1
     else:
         cut = None
     cl = repo.changelog
+    if mingen is not None:
+        gen = cl.generations.generation
 
     def iterate():
         revs.sort(reverse=True)
@@ -43,24 +50,34 @@ def _revancestors(repo, revs, followfirst):
         if inputrev is not None:
             heapq.heappush(h, -inputrev)
 
-        seen = set()
+        # revisions come out of the heap in descending order, so copies of
+        # a revision come out in a row
+        last = None
         while h:
             current = -heapq.heappop(h)
             if current == inputrev:
                 inputrev = next(irevs, None)
                 if inputrev is not None:
                     heapq.heappush(h, -inputrev)
-            if current not in seen:
-                seen.add(current)
+            if current != last:
+                last = current
                 yield current
+                if mingen is not None and gen(current) <= mingen:
+                    continue
                 for parent in cl.parentrevs(current)[:cut]:
                     if parent != node.nullrev:
                         heapq.heappush(h, -parent)
 
-    return generatorset(iterate(), iterasc=False)
+    if node.nullrev in revs:
+        # bitmaps cannot hold the null revision
+        return generatorset(iterate(), iterasc=False)
+    return lazybitmapset(iterate())
+
+def _revdescendants(repo, revs, followfirst, maxgen=None):
+    """Like revlog.descendants() but supports followfirst.
 
-def _revdescendants(repo, revs, followfirst):
-    """Like revlog.descendants() but supports followfirst."""
+    If maxgen is given, revisions with a higher generation number are
+    neither generated nor walked."""
     if followfirst:
         cut = 1
     else:
@@ -79,7 +96,11 @@ def _revdescendants(repo, revs, followfirst):
                 yield i
         else:
             seen = set(revs)
+            if maxgen is not None:
+                gen = cl.generations.generation
             for i in cl.revs(first + 1):
+                if maxgen is not None and gen(i) > maxgen:
+                    continue
                 for x in cl.parentrevs(i)[:cut]:
                     if x != nullrev and x in seen:
                         seen.add(i)
@@ -88,6 +109,48 @@ def _revdescendants(repo, revs, followfirst):
 
     return generatorset(iterate(), iterasc=True)
 
+def _generationfilter(repo, subset, revs, ancestors):
+    """filter out of subset the revisions which generation numbers tell are
+    not ancestors (or descendants, when ancestors is False) of any of revs,
+    or of revs themselves
+
+    This only applies to explicit subsets, which walking the graph would
+    otherwise have to reach to tell."""
+    gens = repo.changelog.generations
+    if gens is None or not isinstance(subset, baseset):
+        return subset
+    nrevs = len(repo.changelog)
+    if not all(node.nullrev <= r < nrevs for r in revs):
+        return subset
+    gen = gens.generation
+    if ancestors:
+        bound = max(gen(r) for r in revs)
+        return subset.filter(lambda r: not node.nullrev <= r < nrevs
+                                       or gen(r) <= bound)
+    bound = min(gen(r) for r in revs)
+    return subset.filter(lambda r: not node.nullrev <= r < nrevs
+                                   or gen(r) >= bound)
+
+def _generationbound(repo, subset, revs, ancestors):
+    """return the lowest generation number of the revisions of subset, or
+    the highest one when ancestors is False
+
+    Walking the ancestors (or descendants) of revs past that generation
+    number cannot reach a revision of subset anymore. None is returned when
+    generation numbers cannot tell, e.g. for lazy subsets."""
+    gens = repo.changelog.generations
+    if gens is None or not isinstance(subset, baseset) or not subset:
+        return None
+    nrevs = len(repo.changelog)
+    if not all(node.nullrev <= r < nrevs for r in revs):
+        return None
+    if not all(0 <= r < nrevs for r in subset):
+        return None
+    gen = gens.generation
+    if ancestors:
+        return min(gen(r) for r in subset)
+    return max(gen(r) for r in subset)
+
 def _reachablerootspure(repo, minroot, roots, heads, includepath):
     """return (heads(::<roots> and ::<heads>))
 
@@ -515,7 +578,9 @@ def _ancestors(repo, subset, x, followfirst=False):
     heads = getset(repo, fullreposet(repo), x)
     if not heads:
         return baseset()
-    s = _revancestors(repo, heads, followfirst)
+    s = _revancestors(repo, heads, followfirst,
+                      mingen=_generationbound(repo, subset, heads, True))
+    subset = _generationfilter(repo, subset, heads, True)
     return subset & s
 
 def ancestors(repo, subset, x):
@@ -553,6 +618,14 @@ def author(repo, subset, x):
     # i18n: "author" is a keyword
     n = encoding.lower(getstring(x, _("author requires a string")))
     kind, pattern, matcher = _substringmatcher(n)
+    index = repo.changesetmetaindex()
+    if index is not None:
+        # match each user name once
+        users = index.matchusers(lambda u: matcher(encoding.lower(u)))
+        indexed = len(index)
+        userid = index.userid
+        return subset.filter(lambda x: userid(x) in users if 0 <= x < indexed
+                             else matcher(encoding.lower(repo[x].user())))
     return subset.filter(lambda x: matcher(encoding.lower(repo[x].user())))
 
 def bisect(repo, subset, x):
@@ -677,6 +750,12 @@ def bundle(repo, subset, x):
 def checkstatus(repo, subset, pat, field):
     hasset = matchmod.patkind(pat) == 'set'
 
+    index = repo.changedfilesindex()
+    if index is not None:
+        getfiles = index.files
+    else:
+        getfiles = lambda x: repo[x].files()
+
     mcache = [None]
     def matches(x):
         c = repo[x]
@@ -687,10 +766,10 @@ def checkstatus(repo, subset, pat, field):
         if not m.anypats() and len(m.files()) == 1:
             fname = m.files()[0]
         if fname is not None:
-            if fname not in c.files():
+            if fname not in getfiles(x):
                 return False
         else:
-            for f in c.files():
+            for f in getfiles(x):
                 if m(f):
                     break
             else:
@@ -794,6 +873,12 @@ def date(repo, subset, x):
     # i18n: "date" is a keyword
     ds = getstring(x, _("date requires a string"))
     dm = util.matchdate(ds)
+    index = repo.changesetmetaindex()
+    if index is not None:
+        indexed = len(index)
+        time = index.time
+        return subset.filter(lambda x: dm(time(x)) if 0 <= x < indexed
+                             else dm(repo[x].date()[0]))
     return subset.filter(lambda x: dm(repo[x].date()[0]))
 
 def desc(repo, subset, x):
@@ -807,13 +892,24 @@ def desc(repo, subset, x):
         c = repo[x]
         return ds in encoding.lower(c.description())
 
+    index = repo.changesetmetaindex()
+    if index is not None and index.descriptionslen():
+        # search all the indexed descriptions at once
+        revs = index.descrevs(ds)
+        indexed = index.descriptionslen()
+        return subset.filter(lambda x: x in revs if 0 <= x < indexed
+                             else matches(x))
+
     return subset.filter(matches)
 
 def _descendants(repo, subset, x, followfirst=False):
     roots = getset(repo, fullreposet(repo), x)
     if not roots:
         return baseset()
-    s = _revdescendants(repo, roots, followfirst)
+    s = _revdescendants(repo, roots, followfirst,
+                        maxgen=_generationbound(repo, subset, roots,
+                                                 False))
+    subset = _generationfilter(repo, subset, roots, False)
 
     # Both sets need to be ascending in order to lazily return the union
     # in the correct order.
@@ -1170,6 +1266,15 @@ def _matchfiles(repo, subset, x):
                 return True
         return False
 
+    index = repo.changedfilesindex()
+    if index is not None:
+        # look the matching files up in the index rather than reading the
+        # changesets
+        revs = index.matchrevs(m)
+        indexed = len(index)
+        return subset.filter(lambda r: r in revs if 0 <= r < indexed
+                             else matches(r))
+
     return subset.filter(matches)
 
 def hasfile(repo, subset, x):
@@ -1231,6 +1336,25 @@ def keyword(repo, subset, x):
         return any(kw in encoding.lower(t)
                    for t in c.files() + [c.user(), c.description()])
 
+    index = repo.changesetmetaindex()
+    if index is not None and index.descriptionslen():
+        revs = index.descrevs(kw)
+        users = index.matchusers(lambda u: kw in encoding.lower(u))
+        userid = index.userid
+        indexed = index.descriptionslen()
+        filesindex = repo.changedfilesindex()
+        if filesindex is not None:
+            getfiles = filesindex.files
+        else:
+            getfiles = lambda r: repo[r].files()
+
+        def indexmatches(r):
+            if not 0 <= r < indexed:
+                return matches(r)
+            return (r in revs or userid(r) in users
+                    or any(kw in encoding.lower(f) for f in getfiles(r)))
+        return subset.filter(indexmatches)
+
     return subset.filter(matches)
 
 def limit(repo, subset, x):
@@ -1580,18 +1704,30 @@ def parents(repo, subset, x):
     ps -= set([node.nullrev])
     return subset & ps
 
+def _phaseset(repo, targets):
+    """bitmapset of the visible revisions in one of the phases of targets"""
+    phasecache = repo._phasecache
+    cl = repo.changelog
+    if (phasecache._phaserevs is not None
+        and len(phasecache._phaserevs) < len(cl)):
+        phasecache.invalidate()
+    phasecache.loadphaserevs(repo) # ensure phase's revs are loaded
+    # one '1' or '0' per revision, telling whether it is in targets
+    table = ''.join(i in targets and '1' or '0' for i in xrange(256))
+    flags = str(bytearray(phasecache._phaserevs)).translate(table)
+    bits = _bitmaplongfromflags(flags)
+    if cl.filteredrevs:
+        bits &= ~_bitmaptolong(_bitmapfromrevs(cl.filteredrevs))
+    return bitmapset(bitmap=_longtobitmap(bits))
+
 def _phase(repo, subset, target):
     """helper to select all rev in phase <target>"""
-    repo._phasecache.loadphaserevs(repo) # ensure phase's sets are loaded
-    if repo._phasecache._phasesets:
-        s = repo._phasecache._phasesets[target] - repo.changelog.filteredrevs
-        s = baseset(s)
-        s.sort() # set are non ordered, so we enforce ascending
-        return subset & s
-    else:
-        phase = repo._phasecache.phase
-        condition = lambda r: phase(repo, r) == target
-        return subset.filter(condition, cache=False)
+    s = _phaseset(repo, (target,))
+    if target == phases.public and node.nullrev in subset:
+        # the null revision is public but cannot be in a bitmap
+        return subset.filter(lambda r: r == node.nullrev or r in s,
+                             cache=False)
+    return subset & s
 
 def draft(repo, subset, x):
     """``draft()``
@@ -1651,29 +1787,15 @@ def present(repo, subset, x):
 # for internal use
 def _notpublic(repo, subset, x):
     getargs(x, 0, 0, "_notpublic takes no arguments")
-    repo._phasecache.loadphaserevs(repo) # ensure phase's sets are loaded
-    if repo._phasecache._phasesets:
-        s = set()
-        for u in repo._phasecache._phasesets[1:]:
-            s.update(u)
-        s = baseset(s - repo.changelog.filteredrevs)
-        s.sort()
-        return subset & s
-    else:
-        phase = repo._phasecache.phase
-        target = phases.public
-        condition = lambda r: phase(repo, r) != target
-        return subset.filter(condition, cache=False)
+    return subset & _phaseset(repo, phases.trackedphases)
 
 def public(repo, subset, x):
     """``public()``
     Changeset in public phase."""
     # i18n: "public" is a keyword
     getargs(x, 0, 0, _("public takes no arguments"))
-    phase = repo._phasecache.phase
     target = phases.public
-    condition = lambda r: phase(repo, r) == target
-    return subset.filter(condition, cache=False)
+    return _phase(repo, subset, target)
 
 def remote(repo, subset, x):
     """``remote([id [,path]])``
@@ -2242,6 +2364,38 @@ safesymbols = set([
     "_hexlist",
 ])
 
+# builtin predicates, to tell those added or wrapped by extensions apart
+_builtinsymbols = symbols.copy()
+
+# builtin predicates whose results depend on more than the state of the
+# repository the revset cache is keyed on (see revsetcache.py)
+_uncacheablesymbols = set([
+    "_destupdate",
+    "_destmerge",
+    "bisect",
+    "bisected",
+    "bundle",
+    "date",
+    "named",
+    "outgoing",
+    "remote",
+    "wdir",
+])
+
+# builtin predicates whose arguments are file patterns, relative to the
+# current directory
+_patternsymbols = set([
+    "_followfirst",
+    "_matchfiles",
+    "adds",
+    "contains",
+    "file",
+    "filelog",
+    "follow",
+    "modifies",
+    "removes",
+])
+
 methods = {
     "range": rangeset,
     "dagrange": dagrange,
@@ -2698,18 +2852,25 @@ def posttreebuilthook(tree, repo):
     # hook for extensions to execute code on the optimized tree
     pass
 
-def match(ui, spec, repo=None):
+def match(ui, spec, repo=None, cache=False):
+    """Create a matcher for a single revision spec
+
+    With cache, the results of the matcher may be kept in the revset cache
+    of the repository. It is meant for revsets supplied by users, which are
+    likely to be evaluated again."""
     if not spec:
         raise error.ParseError(_("empty query"))
     lookup = None
     if repo:
         lookup = repo.__contains__
     tree = parse(spec, lookup)
-    return _makematcher(ui, tree, repo)
+    return _makematcher(ui, tree, repo, cache)
 
-def matchany(ui, specs, repo=None):
+def matchany(ui, specs, repo=None, cache=False):
     """Create a matcher that will include any revisions matching one of the
-    given specs"""
+    given specs
+
+    cache is the same as for match()."""
     if not specs:
         def mfunc(repo, subset=None):
             return baseset()
@@ -2723,16 +2884,45 @@ def matchany(ui, specs, repo=None):
         tree = parse(specs[0], lookup)
     else:
         tree = ('or',) + tuple(parse(s, lookup) for s in specs)
-    return _makematcher(ui, tree, repo)
+    return _makematcher(ui, tree, repo, cache)
+
+def _cacheable(tree):
+    """True if the result of the revset tree may be kept in the revset
+    cache"""
+    if not isinstance(tree, tuple):
+        return True
+    op = tree[0]
+    if op == 'func':
+        name = tree[1][1]
+        if (name in _uncacheablesymbols or name not in _builtinsymbols
+            or symbols.get(name) is not _builtinsymbols[name]):
+            return False
+        if name in _patternsymbols and tree[2] is not None:
+            return False
+    elif op == 'string' and 'set:' in tree[1]:
+        # filesets are evaluated against the working directory
+        return False
+    return all(_cacheable(t) for t in tree[1:])
 
-def _makematcher(ui, tree, repo):
+def _makematcher(ui, tree, repo, cache=False):
     if ui:
         tree = findaliases(ui, tree, showwarning=ui.warn)
     tree = foldconcat(tree)
     weight, tree = optimize(tree, True)
     posttreebuilthook(tree, repo)
+    cacheable = cache and _cacheable(tree)
     def mfunc(repo, subset=None):
         if subset is None:
+            cache = None
+            if cacheable:
+                cache = repo.revsetcache()
+            if cache is not None:
+                key = cache.key(repo, repr(tree))
+                result = cache.get(key)
+                if result is None:
+                    result = getset(repo, fullreposet(repo), tree)
+                    result = cache.set(key, result)
+                return result
             subset = fullreposet(repo)
         if util.safehasattr(subset, 'isascending'):
             result = getset(repo, subset, tree)
@@ -3555,7 +3745,7 @@ class generatorset(abstractsmartset):
             # we need to consume all and try again
             for x in self._consumegen():
                 pass
-            return self.first()
+            return self.last()
         return next(it(), None)
 
     def __repr__(self):
@@ -3602,6 +3792,31 @@ class spanset(abstractsmartset):
             if r not in s:
                 yield r
 
+    def _bitmaplong(self):
+        """bits of the revisions of the set as a long"""
+        bits = (1 << self._end) - (1 << self._start)
+        if self._hiddenrevs:
+            bits &= ~_bitmaptolong(_bitmapfromrevs(self._hiddenrevs))
+        return bits
+
+    def __and__(self, other):
+        if isinstance(other, bitmapset):
+            bits = other._bitmaplong()
+            if bits is not None:
+                bits = self._bitmaplong() & bits
+                return bitmapset(bitmap=_longtobitmap(bits),
+                                 ascending=self._ascending)
+        return super(spanset, self).__and__(other)
+
+    def __sub__(self, other):
+        if isinstance(other, bitmapset):
+            bits = other._bitmaplong()
+            if bits is not None:
+                bits = self._bitmaplong() & ~bits
+                return bitmapset(bitmap=_longtobitmap(bits),
+                                 ascending=self._ascending)
+        return super(spanset, self).__sub__(other)
+
     def __iter__(self):
         if self._ascending:
             return self.fastasc()
@@ -3710,6 +3925,312 @@ class fullreposet(spanset):
         other.sort(reverse=self.isdescending())
         return other
 
+# positions of the bits set in each byte value, in ascending and descending
+# order, and number of bits set in each byte value
+_bytebitsasc = tuple(tuple(i for i in xrange(8) if b & (1 << i))
+                     for b in xrange(256))
+_bytebitsdesc = tuple(tuple(reversed(bits)) for bits in _bytebitsasc)
+_bytepopcount = ''.join(chr(len(bits)) for bits in _bytebitsasc)
+
+def _bitmapfromrevs(revs):
+    """bitmap of an iterable of revisions"""
+    bitmap = bytearray()
+    for r in revs:
+        if r < 0:
+            raise ValueError('cannot store negative revision %d in a bitmap'
+                             % r)
+        i = r >> 3
+        if i >= len(bitmap):
+            bitmap.extend(bytearray(i + 1 - len(bitmap)))
+        bitmap[i] |= 1 << (r & 7)
+    return bitmap
+
+def _bitmaptolong(bitmap):
+    """long integer whose bit i is the bit of revision i in bitmap"""
+    if not bitmap:
+        return 0
+    return long(binascii.hexlify(bitmap[::-1]), 16)
+
+def _longtobitmap(bits):
+    """bitmap of the revisions whose bits are set in the long bits
+
+    The bitmap has no trailing null byte."""
+    if not bits:
+        return bytearray()
+    h = '%x' % bits
+    if len(h) & 1:
+        h = '0' + h
+    return bytearray(binascii.unhexlify(h))[::-1]
+
+def _bitmaplongfromflags(flags):
+    """long integer whose bit i is set if flags[i] is '1'
+
+    flags is a string of '0' and '1', one per revision."""
+    flags = flags.rstrip('0')
+    if not flags:
+        return 0
+    return long(flags[::-1], 2)
+
+def _lowestbit(bits):
+    """position of the lowest bit set in the long bits"""
+    return (bits & -bits).bit_length() - 1
+
+def _iterbitmapasc(bitmap):
+    bytebits = _bytebitsasc
+    for i, b in enumerate(bitmap):
+        if b:
+            base = i << 3
+            for j in bytebits[b]:
+                yield base + j
+
+def _iterbitmapdesc(bitmap, start=0, stop=None):
+    """revisions of bitmap from stop - 1 down to start, in descending order"""
+    if stop is None:
+        stop = len(bitmap) << 3
+    bytebits = _bytebitsdesc
+    for i in xrange((stop - 1) >> 3, (start >> 3) - 1, -1):
+        b = bitmap[i]
+        if b:
+            base = i << 3
+            for j in bytebits[b]:
+                r = base + j
+                if start <= r < stop:
+                    yield r
+
+class bitmapset(abstractsmartset):
+    """Duck type for baseset class which stores the revisions as the bits of
+    a bytearray, bit r % 8 of byte r // 8 being set if revision r is in the
+    set
+
+    This takes one bit per revision up to the highest one in the set, whatever
+    the number of revisions in it, and is thus a much more compact way to
+    hold dense sets than lists and sets of integers. Membership is a single
+    lookup, and intersection, difference and union with bitmapsets and
+    spansets are done on whole bitmaps instead of revision by revision.
+
+    Bitmapsets iterate in ascending or descending order, and cannot hold
+    negative revisions.
+    """
+    def __init__(self, revs=(), ascending=True, bitmap=None):
+        """
+        revs:   revisions of the set, if bitmap is None
+        bitmap: bytearray of the bits of the revisions of the set, without
+                trailing null byte
+        """
+        if bitmap is None:
+            bitmap = _bitmapfromrevs(revs).rstrip('\0')
+        self._bits = bitmap
+        self._ascending = ascending
+
+    def _bitmaplong(self):
+        """bits of the revisions of the set as a long, or None if they are
+        not known without iterating over the set"""
+        return _bitmaptolong(self._bits)
+
+    def _combine(self, other, op):
+        """bitmapset of op applied to the bits of self and other, or None if
+        they cannot be combined as bitmaps"""
+        if not isinstance(other, (bitmapset, spanset)):
+            return None
+        bits = self._bitmaplong()
+        if bits is None:
+            return None
+        otherbits = other._bitmaplong()
+        if otherbits is None:
+            return None
+        return op(bits, otherbits)
+
+    def __and__(self, other):
+        if isinstance(other, fullreposet):
+            return self
+        bits = self._combine(other, lambda a, b: a & b)
+        if bits is None:
+            return super(bitmapset, self).__and__(other)
+        return bitmapset(bitmap=_longtobitmap(bits),
+                         ascending=self._ascending)
+
+    def __sub__(self, other):
+        bits = self._combine(other, lambda a, b: a & ~b)
+        if bits is None:
+            return super(bitmapset, self).__sub__(other)
+        return bitmapset(bitmap=_longtobitmap(bits),
+                         ascending=self._ascending)
+
+    def __add__(self, other):
+        # a union iterates over self first, then over the revisions only in
+        # other: it is only sorted when the latter all come after the former
+        extra = self._combine(other, lambda a, b: b & ~a)
+        if extra is not None and self:
+            if not extra:
+                return bitmapset(bitmap=self._bits, ascending=self._ascending)
+            if self._ascending == other.isascending():
+                if self._ascending:
+                    inorder = _lowestbit(extra) > self.max()
+                else:
+                    inorder = extra.bit_length() - 1 < self.min()
+                if inorder:
+                    bits = self._bitmaplong() | extra
+                    return bitmapset(bitmap=_longtobitmap(bits),
+                                     ascending=self._ascending)
+        return super(bitmapset, self).__add__(other)
+
+    def __contains__(self, rev):
+        bits = self._bits
+        i = rev >> 3
+        return 0 <= i < len(bits) and bool(bits[i] & (1 << (rev & 7)))
+
+    def __iter__(self):
+        if self._ascending:
+            return self.fastasc()
+        else:
+            return self.fastdesc()
+
+    def fastasc(self):
+        return _iterbitmapasc(self._bits)
+
+    def fastdesc(self):
+        return _iterbitmapdesc(self._bits)
+
+    def __nonzero__(self):
+        return bool(self._bits)
+
+    def __len__(self):
+        return sum(self._bits.translate(_bytepopcount))
+
+    def min(self):
+        bits = self._bits
+        if not bits:
+            raise ValueError('arg is an empty sequence')
+        i = len(bits) - len(bits.lstrip('\0'))
+        return (i << 3) + _bytebitsasc[bits[i]][0]
+
+    def max(self):
+        bits = self._bits
+        if not bits:
+            raise ValueError('arg is an empty sequence')
+        i = len(bits) - 1
+        return (i << 3) + _bytebitsdesc[bits[i]][0]
+
+    def sort(self, reverse=False):
+        self._ascending = not reverse
+
+    def reverse(self):
+        self._ascending = not self._ascending
+
+    def isascending(self):
+        return self._ascending
+
+    def isdescending(self):
+        return not self._ascending
+
+    def first(self):
+        if not self:
+            return None
+        if self._ascending:
+            return self.min()
+        return self.max()
+
+    def last(self):
+        if not self:
+            return None
+        if self._ascending:
+            return self.max()
+        return self.min()
+
+    def __repr__(self):
+        d = {False: '-', True: '+'}[self._ascending]
+        return '<%s%s %r>' % (type(self).__name__, d, list(self))
+
+class lazybitmapset(bitmapset):
+    """bitmapset of the revisions yielded by a generator, in descending order
+
+    The generator is only consumed as far as needed to answer membership
+    tests and descending iterations, like with generatorset. The other
+    operations need the whole set.
+    """
+    def __init__(self, gen, ascending=False):
+        self._gen = gen
+        self._ascending = ascending
+        self._partial = bytearray()
+        self._low = None # lowest revision generated so far
+        self._finished = False
+
+    def _next(self):
+        """add the next revision of the generator to the set and return it,
+        or None if there is none"""
+        if self._finished:
+            return None
+        r = next(self._gen, None)
+        if r is None:
+            self._finished = True
+            self._gen = None
+            return None
+        if self._low is None:
+            # the first revision is the highest one
+            self._partial = bytearray((r >> 3) + 1)
+        self._low = r
+        self._partial[r >> 3] |= 1 << (r & 7)
+        return r
+
+    @util.propertycache
+    def _bits(self):
+        while self._next() is not None:
+            pass
+        return self._partial
+
+    def _bitmaplong(self):
+        if not self._finished:
+            return None
+        return _bitmaptolong(self._bits)
+
+    def __contains__(self, rev):
+        if rev < 0:
+            return False
+        while self._low is None or rev < self._low:
+            if self._next() is None:
+                break
+        bits = self._partial
+        i = rev >> 3
+        return i < len(bits) and bool(bits[i] & (1 << (rev & 7)))
+
+    def fastdesc(self):
+        if self._finished:
+            return _iterbitmapdesc(self._partial)
+        return self._iterdesc()
+
+    def _iterdesc(self):
+        # all revisions from cursor were yielded
+        cursor = None
+        while True:
+            low = self._low
+            if low is not None and (cursor is None or low < cursor):
+                # revisions generated by someone else in the meantime
+                for r in _iterbitmapdesc(self._partial, low, cursor):
+                    yield r
+                cursor = low
+            else:
+                r = self._next()
+                if r is None:
+                    return
+                cursor = r
+                yield r
+
+    def __nonzero__(self):
+        return self._low is not None or self._next() is not None
+
+    def max(self):
+        if self._low is None:
+            self._next()
+        bits = self._partial
+        if not bits:
+            raise ValueError('arg is an empty sequence')
+        i = len(bits) - 1
+        return (i << 3) + _bytebitsdesc[bits[i]][0]
+
+    def __repr__(self):
+        d = {False: '-', True: '+'}[self._ascending]
+        return '<%s%s>' % (type(self).__name__, d)
+
 def prettyformatset(revs):
     lines = []
     rs = repr(revs)
@@ -0,0 +1,216 @@
+# revsetcache.py - persistent cache of revset results
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""persistent cache of revset results
+
+Tools like dashboards or hgweb evaluate the same revsets again and again
+against a repository which did not change. With ``experimental.revsetcache``,
+the results of the revsets given by users (``--rev`` options, hgweb
+searches) evaluated against the whole repository are kept in
+.hg/cache/revsets-v1, keyed by their optimized parse tree and by a hash of
+the state of the repository they depend on. Revsets evaluated internally
+with ``repo.revs()`` are neither looked up nor cached. The key covers:
+
+- the filter level and the tip of the changelog,
+- the phase roots,
+- the bookmarks,
+- the size and modification time of the obsstore,
+- the parents of the working directory and the local tags, which also
+  change the filtered revisions,
+- the evolution options.
+
+Revsets using predicates which depend on something else, such as
+``date()``, ``bisect()``, ``remote()`` or ``wdir()``, file patterns, which
+are relative to the current directory, predicates provided by extensions or
+filesets, are not cached (see revset._cacheable). Names provided by the
+namespaces of extensions are not part of the key either.
+
+Ordered results are only cached once they have been iterated over
+entirely, so that a caller only using the first revisions, like ``hg log
+-l``, does not evaluate the rest. The cache holds at most
+``experimental.revsetcache.size`` results (100 by default), the least
+recently used ones being evicted first, and results of more than
+``_maxrevs`` revisions are not kept. The file is rewritten when
+the repository is closed, after results were added to the cache: looking
+results up does not write anything, the order in which they were used is
+only saved along with new results. It holds one entry
+per result, from the least recently used: an ``_entryfmt`` header (state
+hash, order of the result, length of the expression, number of revisions),
+the expression, and the revisions as big-endian 32 bits integers.
+"""
+
+from __future__ import absolute_import
+
+import array
+import itertools
+import struct
+import sys
+
+from . import (
+    error,
+    revset,
+    util,
+)
+
+_filename = 'cache/revsets-v1'
+# [20 byte state hash][1 byte order][4 byte expression length]
+# [4 byte number of revisions]
+_entryfmt = '>20sBII'
+_entrysize = struct.calcsize(_entryfmt)
+# results larger than this are not cached
+_maxrevs = 1000000
+
+# order of the results
+_unordered = 0
+_ascending = 1
+_descending = 2
+
+def _revarray(data=''):
+    a = array.array('i')
+    if a.itemsize != 4:
+        a = array.array('l')
+    a.fromstring(data)
+    if sys.byteorder == 'little':
+        a.byteswap()
+    return a
+
+def _revdata(a):
+    if sys.byteorder == 'little':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return a.tostring()
+
+class revsetcache(object):
+    """Least recently used revset results, keyed by the state of the
+    repository and the revset expression"""
+
+    def __init__(self, repo, size):
+        assert repo.filtername is None
+        self._repo = repo
+        self._entries = util.lrucachedict(size)
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        try:
+            data = repo.vfs.read(_filename)
+            pos = 0
+            while pos + _entrysize <= len(data):
+                state, order, exprlen, count = struct.unpack_from(_entryfmt,
+                                                                 data, pos)
+                pos += _entrysize
+                if pos + exprlen + 4 * count > len(data):
+                    # ignore anything left unfinished
+                    break
+                expr = data[pos:pos + exprlen]
+                pos += exprlen
+                revs = _revarray(data[pos:pos + 4 * count])
+                pos += 4 * count
+                self._entries[(state, expr)] = (order, revs)
+        except (IOError, OSError) as inst:
+            repo.ui.debug("couldn't read revset cache: %s\n" % inst)
+
+    def key(self, repo, expr):
+        """key of the result of the normalized revset expr in repo"""
+        unfi = repo.unfiltered()
+        cl = unfi.changelog
+        s = util.sha1()
+        s.update('%s\0%d\0%s\0' % (repo.filtername or '', len(cl), cl.tip()))
+        for phase, roots in enumerate(unfi._phasecache.phaseroots):
+            s.update('%d\0%s\0' % (phase, ''.join(sorted(roots))))
+        for name, node in sorted(unfi._bookmarks.iteritems()):
+            s.update('%s\0%s\0' % (name, node))
+        try:
+            st = unfi.svfs.stat('obsstore')
+            s.update('%d\0%d\0' % (st.st_size, st.st_mtime))
+        except OSError:
+            s.update('\0')
+        s.update(''.join(unfi.dirstate.parents()))
+        s.update(unfi.vfs.tryread('localtags'))
+        s.update('\0'.join(unfi.ui.configlist('experimental', 'evolution')))
+        return s.digest(), expr
+
+    def get(self, key):
+        """smartset of the cached result for key, or None"""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._smartset(*self._entries[key])
+
+    def set(self, key, result):
+        """cache the result of a revset once it has been iterated over,
+        and return the smartset to use instead of it"""
+        if result.isascending():
+            order = _ascending
+        elif result.isdescending():
+            order = _descending
+        else:
+            order = _unordered
+        revs = _revarray()
+        if order == _unordered or isinstance(result, revset.baseset):
+            # a generatorset cannot keep the order of an unordered result
+            revs.extend(itertools.islice(result, _maxrevs + 1))
+            if len(revs) > _maxrevs:
+                return result
+            self._store(key, order, revs)
+            return self._smartset(order, revs)
+
+        def record():
+            for rev in result:
+                if len(revs) <= _maxrevs:
+                    revs.append(rev)
+                yield rev
+            self._store(key, order, revs)
+
+        s = revset.generatorset(record(), iterasc=order == _ascending)
+        if order == _descending:
+            s.reverse()
+        return s
+
+    def _store(self, key, order, revs):
+        if len(revs) <= _maxrevs:
+            self._entries[key] = (order, revs)
+            self._dirty = True
+
+    def _smartset(self, order, revs):
+        s = revset.baseset(revs.tolist())
+        if order == _ascending:
+            s.sort()
+        elif order == _descending:
+            s.sort(reverse=True)
+        return s
+
+    def write(self, tr=None):
+        """save the cache if it changed
+
+        Nothing is written if the wlock cannot be acquired at once."""
+        if not self._dirty:
+            return
+        repo = self._repo
+        try:
+            wlock = repo.wlock(wait=False)
+        except error.LockError:
+            repo.ui.debug("not writing revset cache: wlock cannot be "
+                          "acquired\n")
+            return
+        try:
+            f = repo.vfs.open(_filename, 'wb', atomictemp=True)
+            try:
+                for key in self._entries:
+                    state, expr = key
+                    order, revs = self._entries.peek(key)
+                    f.write(struct.pack(_entryfmt, state, order, len(expr),
+                                        len(revs)))
+                    f.write(expr)
+                    f.write(_revdata(revs))
+            finally:
+                f.close()
+            self._dirty = False
+        except (IOError, OSError, error.Abort) as inst:
+            repo.ui.debug("couldn't write revset cache: %s\n" % inst)
+        finally:
+            wlock.release()
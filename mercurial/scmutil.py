@@ -730,11 +730,14 @@ def revpair(repo, revs):
 def revrange(repo, revs):
     """Yield revision as strings from a list of revision specifications."""
     allspecs = []
+    # only cache the revsets given by users, not revision numbers
+    cache = True
     for spec in revs:
         if isinstance(spec, int):
             spec = revset.formatspec('rev(%d)', spec)
+            cache = False
         allspecs.append(spec)
-    m = revset.matchany(repo.ui, allspecs, repo)
+    m = revset.matchany(repo.ui, allspecs, repo, cache=cache)
     return m(repo)
 
 def meaningfulparents(repo, ctx):
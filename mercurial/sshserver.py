@@ -19,6 +19,8 @@ from . import (
 )
 
 class sshserver(wireproto.abstractserverproto):
+    name = 'ssh'
+
     def __init__(self, ui, repo):
         self.ui = ui
         self.repo = repo
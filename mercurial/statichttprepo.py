@@ -153,6 +153,9 @@ class statichttprepository(localrepo.localrepository):
         self.nodetagscache = None
         self._branchcaches = {}
         self._revbranchcache = None
+        self._changedfilesindex = None
+        self._changesetmetaindex = None
+        self._revsetcache = None
         self.encodepats = None
         self.decodepats = None
         self._transref = None
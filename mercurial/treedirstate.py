@@ -0,0 +1,420 @@
+# treedirstate.py - tree-structured on-disk format of the dirstate
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com> and others
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""tree-structured on-disk format of the dirstate
+
+With the ``treedirstate`` requirement, .hg/dirstate is a small file holding
+the parents of the working directory, the copies and the location of the
+root node of a tree stored in an append-only data file,
+.hg/dirstate.tree.<id>. Each node holds the entries of the files of one
+directory and the location of the nodes of its subdirectories.
+
+Writing the dirstate appends the nodes of the directories which changed,
+and of their parents, to the data file before replacing .hg/dirstate.
+.hg/dirstate records how much of the data file it uses: appending does not
+disturb readers, and older copies of .hg/dirstate (backups, pending
+changes) stay valid. Once most of the data file is made of nodes which are
+not used anymore, it is rewritten under a new identifier and the data files
+no dirstate file refers to are removed.
+
+Nodes are read from a memory map of the data file as they are needed:
+looking up a file only reads the nodes of the directories on its path.
+
+.hg/dirstate format:
+
+- the two parents (40 bytes), like the flat format,
+- ``_magic``, starting with a NUL byte a flat dirstate entry cannot start
+  with,
+- ``_docket``: identifier of the data file, offset and length of the root
+  node, size of the data used and size of the data reachable from the root,
+- the copies, as NUL separated destination and source pairs.
+
+Node format: ``_nodeheader`` (number of files and of subdirectories), then
+for each file ``_fileentry`` (state, mode, size, mtime and name length)
+followed by the name, then for each subdirectory ``_direntry`` (offset and
+length of its node, name length) followed by the name. Names are relative to
+the directory of the node.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import mmap
+import os
+import struct
+
+from .i18n import _
+from . import (
+    error,
+    parsers,
+)
+
+dirstatetuple = parsers.dirstatetuple
+
+_magic = '\0treedirstate1\n'
+_docket = struct.Struct('>16sQIQQ')
+_nodeheader = struct.Struct('>II')
+_fileentry = struct.Struct('>cllll')
+_direntry = struct.Struct('>QII')
+_dataprefix = 'dirstate.tree.'
+
+# the data file is rewritten when less than half of it is used, once it is
+# bigger than this
+_mincompactsize = 64 * 1024
+
+def istree(data):
+    """tell if data is the content of a tree dirstate file"""
+    return data[40:40 + len(_magic)] == _magic
+
+def _datafile(dataid):
+    return _dataprefix + dataid
+
+def _damaged():
+    return error.Abort(_('working directory state appears damaged!'))
+
+def _depth(d):
+    return d and d.count('/') + 1 or 0
+
+def _dirname(f):
+    return f[:max(f.rfind('/'), 0)]
+
+class treemap(object):
+    """dict-like map from file name to dirstatetuple, reading the nodes of
+    the tree as they are needed"""
+
+    def __init__(self, dataid=None, data='', root=None, datasize=0,
+                 livesize=0):
+        self.dataid = dataid
+        self.datasize = datasize
+        self.livesize = livesize
+        self._data = data
+        # entries of the files of the loaded directories
+        self._map = {}
+        # directory -> (offset, length) of its node, None when not written
+        self._nodes = {'': root}
+        # loaded directory -> (file names, subdirectory names)
+        self._children = {}
+        # directories whose node has to be written
+        self._dirty = set()
+        self._complete = root is None
+        if root is None:
+            self._children[''] = (set(), set())
+            self._dirty.add('')
+
+    @classmethod
+    def frommap(cls, dmap):
+        m = cls()
+        for f, e in dmap.iteritems():
+            m[f] = e
+        return m
+
+    def _loaddir(self, d):
+        offset, length = self._nodes[d]
+        data = self._data[offset:offset + length]
+        prefix = d and d + '/' or ''
+        dmap = self._map
+        files = set()
+        dirs = set()
+        try:
+            nfiles, ndirs = _nodeheader.unpack_from(data, 0)
+            pos = _nodeheader.size
+            for i in xrange(nfiles):
+                state, mode, size, mtime, l = _fileentry.unpack_from(data, pos)
+                pos += _fileentry.size
+                name = data[pos:pos + l]
+                pos += l
+                dmap[prefix + name] = dirstatetuple(state, mode, size, mtime)
+                files.add(name)
+            for i in xrange(ndirs):
+                suboffset, sublength, l = _direntry.unpack_from(data, pos)
+                pos += _direntry.size
+                name = data[pos:pos + l]
+                pos += l
+                self._nodes[prefix + name] = (suboffset, sublength)
+                dirs.add(name)
+        except struct.error:
+            raise _damaged()
+        if pos != length:
+            raise _damaged()
+        self._children[d] = (files, dirs)
+
+    def _loadpath(self, f):
+        """load the nodes of the directories on the path of f"""
+        d = ''
+        start = 0
+        while True:
+            if d not in self._children:
+                if d not in self._nodes:
+                    return
+                self._loaddir(d)
+            end = f.find('/', start)
+            if end < 0:
+                return
+            d = f[:end]
+            start = end + 1
+
+    def _loadall(self):
+        if self._complete:
+            return
+        # the nodes of the subdirectories of a directory are known once it
+        # is loaded
+        while len(self._children) < len(self._nodes):
+            for d in [d for d in self._nodes if d not in self._children]:
+                self._loaddir(d)
+        self._complete = True
+        # nothing has to be read anymore
+        self._data = ''
+
+    def _adddirs(self, f):
+        """create the missing directories on the path of f, return the
+        directory of f"""
+        parent = ''
+        start = 0
+        while True:
+            end = f.find('/', start)
+            if end < 0:
+                return parent
+            d = f[:end]
+            if d not in self._children:
+                self._children[d] = (set(), set())
+                self._nodes[d] = None
+                self._children[parent][1].add(f[start:end])
+            parent = d
+            start = end + 1
+
+    def _markdirty(self, d):
+        dirty = self._dirty
+        while d not in dirty:
+            dirty.add(d)
+            if not d:
+                break
+            d = _dirname(d)
+
+    def __getitem__(self, f):
+        if not self._complete:
+            self._loadpath(f)
+        return self._map[f]
+
+    def __contains__(self, f):
+        if not self._complete:
+            self._loadpath(f)
+        return f in self._map
+
+    def get(self, f, default=None):
+        if not self._complete:
+            self._loadpath(f)
+        return self._map.get(f, default)
+
+    def __setitem__(self, f, e):
+        if not self._complete:
+            self._loadpath(f)
+        if f in self._map:
+            d = _dirname(f)
+        else:
+            d = self._adddirs(f)
+            self._children[d][0].add(f[f.rfind('/') + 1:])
+        self._map[f] = e
+        self._markdirty(d)
+
+    def __delitem__(self, f):
+        if not self._complete:
+            self._loadpath(f)
+        del self._map[f]
+        d = _dirname(f)
+        files, dirs = self._children[d]
+        files.discard(f[f.rfind('/') + 1:])
+        # forget the directories left empty
+        while d and not files and not dirs:
+            del self._children[d]
+            old = self._nodes.pop(d)
+            if old is not None:
+                self.livesize -= old[1]
+            self._dirty.discard(d)
+            name = d[d.rfind('/') + 1:]
+            d = _dirname(d)
+            files, dirs = self._children[d]
+            dirs.discard(name)
+        self._markdirty(d)
+
+    def pop(self, f, *default):
+        try:
+            e = self[f]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[f]
+        return e
+
+    def __len__(self):
+        self._loadall()
+        return len(self._map)
+
+    def __iter__(self):
+        self._loadall()
+        return iter(self._map)
+
+    def iteritems(self):
+        self._loadall()
+        return self._map.iteritems()
+
+    def keys(self):
+        self._loadall()
+        return self._map.keys()
+
+    def _rewrite(self, dataid):
+        """prepare to write every node in a new data file"""
+        self._loadall()
+        for d in self._nodes:
+            self._nodes[d] = None
+        self._dirty = set(self._nodes)
+        self.dataid = dataid
+        self.datasize = self.livesize = 0
+
+    def _write(self, fp, now):
+        """append the nodes of the changed directories to fp"""
+        dmap = self._map
+        offset = self.datasize
+        live = self.livesize
+        chunks = []
+        for d in sorted(self._dirty, key=_depth, reverse=True):
+            files, dirs = self._children[d]
+            prefix = d and d + '/' or ''
+            parts = [_nodeheader.pack(len(files), len(dirs))]
+            for name in sorted(files):
+                f = prefix + name
+                e = dmap[f]
+                if e[0] == 'n' and e[3] == now:
+                    # like pack_dirstate, the file may change again in the
+                    # same second without its mtime changing
+                    e = dirstatetuple(e[0], e[1], e[2], -1)
+                    dmap[f] = e
+                parts.append(_fileentry.pack(e[0], e[1], e[2], e[3],
+                                             len(name)))
+                parts.append(name)
+            for name in sorted(dirs):
+                suboffset, sublength = self._nodes[prefix + name]
+                parts.append(_direntry.pack(suboffset, sublength, len(name)))
+                parts.append(name)
+            node = ''.join(parts)
+            old = self._nodes[d]
+            if old is not None:
+                live -= old[1]
+            self._nodes[d] = (offset, len(node))
+            offset += len(node)
+            live += len(node)
+            chunks.append(node)
+        fp.write(''.join(chunks))
+        self._dirty.clear()
+        self.datasize = offset
+        self.livesize = live
+
+def _parsedocket(data):
+    pos = 40 + len(_magic)
+    try:
+        docket = _docket.unpack_from(data, pos)
+    except struct.error:
+        raise _damaged()
+    copymap = {}
+    copies = data[pos + _docket.size:]
+    if copies:
+        fields = copies.split('\0')
+        if len(fields) % 2:
+            raise _damaged()
+        for i in xrange(0, len(fields), 2):
+            copymap[fields[i]] = fields[i + 1]
+    return docket, copymap
+
+def read(opener, data):
+    """return the (map, copymap) of the dirstate file content data
+
+    IOError is raised with ENOENT if the data file is missing: since data
+    was read, a concurrent write may have replaced the dirstate file and
+    removed the data file it referred to."""
+    (dataid, rootoffset, rootlength, datasize,
+     livesize), copymap = _parsedocket(data)
+    fp = opener(_datafile(dataid))
+    try:
+        if datasize:
+            try:
+                buf = mmap.mmap(fp.fileno(), datasize,
+                                access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # no memory map for this file, e.g. a shorter one
+                buf = fp.read(datasize)
+            if len(buf) != datasize:
+                raise _damaged()
+        else:
+            buf = ''
+    finally:
+        fp.close()
+    dmap = treemap(dataid, buf, (rootoffset, rootlength), datasize,
+                   livesize)
+    return dmap, copymap
+
+def write(opener, fp, dmap, copymap, pl, now):
+    """write the dirstate file to fp, appending the changed nodes of dmap to
+    its data file
+
+    dmap may be a dict, e.g. read from a flat dirstate. Returns the map to
+    use from now on, and whether a new data file was started."""
+    if not isinstance(dmap, treemap):
+        dmap = treemap.frommap(dmap)
+    newfile = (dmap.dataid is None
+               or (dmap.datasize > _mincompactsize
+                   and dmap.datasize > 2 * dmap.livesize))
+    if newfile:
+        dmap._rewrite(os.urandom(8).encode('hex'))
+    datafp = opener(_datafile(dmap.dataid), 'ab')
+    try:
+        # pending changes never written out may lie after the data used
+        datafp.seek(0, os.SEEK_END)
+        dmap.datasize = datafp.tell()
+        dmap._write(datafp, now)
+    finally:
+        datafp.close()
+    rootoffset, rootlength = dmap._nodes['']
+    fields = []
+    for dest, source in sorted(copymap.iteritems()):
+        # like pack_dirstate, drop the copies of files not in the dirstate
+        if dest in dmap:
+            fields.extend([dest, source])
+    fp.write(''.join([pl[0], pl[1], _magic,
+                      _docket.pack(dmap.dataid, rootoffset, rootlength,
+                                   dmap.datasize, dmap.livesize),
+                      '\0'.join(fields)]))
+    return dmap, newfile
+
+def cleanup(opener):
+    """remove the data files no dirstate file refers to
+
+    The dirstate files are .hg/dirstate and its copies: pending changes,
+    backups and journal files, all with 'dirstate' in their name."""
+    datafiles = set()
+    used = set()
+    headersize = 40 + len(_magic) + _docket.size
+    for name in opener.listdir():
+        if name.startswith(_dataprefix):
+            datafiles.add(name)
+        elif 'dirstate' in name:
+            try:
+                fp = opener(name)
+            except IOError:
+                continue
+            try:
+                data = fp.read(headersize)
+            finally:
+                fp.close()
+            if istree(data) and len(data) == headersize:
+                used.add(_datafile(_docket.unpack_from(data, 40 +
+                                                       len(_magic))[0]))
+    for name in datafiles - used:
+        try:
+            opener.unlink(name)
+        except OSError as inst:
+            if inst.errno != errno.ENOENT:
+                raise
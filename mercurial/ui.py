@@ -349,6 +349,34 @@ class ui(object):
             raise error.ConfigError(_("%s.%s is not an integer ('%s')")
                                     % (section, name, v))
 
+    def configfloat(self, section, name, default=None, untrusted=False):
+        """parse a configuration element as a float number
+
+        >>> u = ui(); s = 'foo'
+        >>> u.setconfig(s, 'float1', '42')
+        >>> u.configfloat(s, 'float1')
+        42.0
+        >>> u.setconfig(s, 'float2', '-42.25')
+        >>> u.configfloat(s, 'float2')
+        -42.25
+        >>> u.configfloat(s, 'unknown', 0.5)
+        0.5
+        >>> u.setconfig(s, 'invalid', 'somevalue')
+        >>> u.configfloat(s, 'invalid')
+        Traceback (most recent call last):
+            ...
+        ConfigError: foo.invalid is not a float ('somevalue')
+        """
+
+        v = self.config(section, name, None, untrusted)
+        if v is None:
+            return default
+        try:
+            return float(v)
+        except ValueError:
+            raise error.ConfigError(_("%s.%s is not a float ('%s')")
+                                    % (section, name, v))
+
     def configbytes(self, section, name, default=0, untrusted=False):
         """parse a configuration element as a quantity in bytes
 
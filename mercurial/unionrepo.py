@@ -81,7 +81,7 @@ class unionrevlog(revlog.revlog):
             return revlog.revlog._chunk(self, rev)
         return self.revlog2._chunk(self.node(rev))
 
-    def revdiff(self, rev1, rev2):
+    def revdiff(self, rev1, rev2, _hashcheck=None):
         """return or calculate a delta between two revisions"""
         if rev1 > self.repotiprev and rev2 > self.repotiprev:
             return self.revlog2.revdiff(
@@ -93,7 +93,7 @@ class unionrevlog(revlog.revlog):
         return mdiff.textdiff(self.revision(self.node(rev1)),
                               self.revision(self.node(rev2)))
 
-    def revision(self, nodeorrev):
+    def revision(self, nodeorrev, _hashcheck=None):
         """return an uncompressed revision of a given node or revision
         number.
         """
@@ -108,13 +108,18 @@ class unionrevlog(revlog.revlog):
             return ""
 
         if rev > self.repotiprev:
-            text = self.revlog2.revision(node)
+            text = self.revlog2.revision(node, _hashcheck=_hashcheck)
             self._cache = (node, rev, text)
         else:
             text = self.baserevision(rev)
             # already cached
         return text
 
+    def revisions(self, revs, _df=None, _hashcheck=None):
+        # the chunks of revlog2 are not in the revlog file
+        for rev in revs:
+            yield self.revision(rev, _hashcheck=_hashcheck)
+
     def baserevision(self, nodeorrev):
         # Revlog subclasses may override 'revision' method to modify format of
         # content retrieved from revlog. To use unionrevlog with such class one
@@ -164,6 +169,12 @@ class unionmanifest(unionrevlog, manifest.manifest):
     def baserevdiff(self, rev1, rev2):
         return manifest.manifest.revdiff(self, rev1, rev2)
 
+    def deltadiff(self, node1, node2, match=None):
+        # the deltas of the revisions from revlog2 are not in the revlog
+        if max(self.rev(node1), self.rev(node2)) > self.repotiprev:
+            return None
+        return manifest.manifest.deltadiff(self, node1, node2, match)
+
 class unionfilelog(unionrevlog, filelog.filelog):
     def __init__(self, opener, path, opener2, linkmapper, repo):
         filelog.filelog.__init__(self, opener, path)
@@ -0,0 +1,246 @@
+# upgrade.py - functions for re-encoding the storage of a repository
+#
+# Copyright 2016 Matt Mackall <mpm@selenic.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+from __future__ import absolute_import
+
+import shutil
+import tempfile
+
+from .i18n import _
+from . import (
+    changelog,
+    error,
+    filelog,
+    localrepo,
+    lock as lockmod,
+    manifest,
+    scmutil,
+    util,
+)
+
+# store files other than revlogs carried over to the upgraded store
+_storefiles = ('phaseroots', 'obsstore')
+# number of revisions restored at once while copying a revlog
+_copybatchsize = 1000
+
+def _isformatrequirement(req):
+    """return True if the requirement only changes how revlogs store data
+
+    Those are the requirements an upgrade can add or remove: revlogs are
+    rewritten revision by revision, the layout of the store and the content
+    of the revisions are left untouched."""
+    return (req in ('generaldelta', 'sparserevlog')
+            or req.startswith('exp-compression-'))
+
+def upgraderequirements(repo):
+    """return the requirements of the repository once upgraded
+
+    Revlog format requirements follow the configuration used to create new
+    repositories, all the other requirements are preserved."""
+    newreqs = localrepo.newreporequirements(repo)
+    reqs = set(r for r in repo.requirements if not _isformatrequirement(r))
+    reqs.update(r for r in newreqs if _isformatrequirement(r))
+    return reqs
+
+def _revlogfrompath(repo, path):
+    """return the revlog stored in the store file path of repo"""
+    if path == '00changelog.i':
+        return changelog.changelog(repo.svfs)
+    elif path.endswith('00manifest.i'):
+        mandir = path[:-len('00manifest.i')]
+        if mandir.startswith('meta/'):
+            mandir = mandir[len('meta/'):]
+        return manifest.manifest(repo.svfs, mandir)
+    else:
+        # filelogs are stored as data/<path>.i
+        return filelog.filelog(repo.svfs, path[len('data/'):-len('.i')])
+
+def _manifestdirs(repo):
+    """return the directories of the tree manifest revlogs of repo
+
+    The store does not list the meta/ revlogs, subdirectories are found in
+    the revisions of the revlog of their parent directory."""
+    mf = repo.manifest
+    dirs = set([''])
+    todo = ['']
+    while todo:
+        d = todo.pop()
+        rl = mf.dirlog(d)
+        for start in xrange(0, len(rl), _copybatchsize):
+            revs = xrange(start, min(start + _copybatchsize, len(rl)))
+            for text in rl.revisions(revs):
+                for f, n, fl in manifest._parse(text):
+                    if fl == 'd' and d + f + '/' not in dirs:
+                        dirs.add(d + f + '/')
+                        todo.append(d + f + '/')
+    return sorted(dirs)
+
+def _revlogpaths(repo):
+    paths = [unencoded for unencoded, encoded, size in repo.store.walk()
+             if unencoded.endswith('.i')]
+    if 'treemanifest' in repo.requirements:
+        paths.extend('meta/%s00manifest.i' % d for d in _manifestdirs(repo)
+                     if d)
+    return paths
+
+def storestats(repo):
+    """return a (size, readcost, maxchainlen) tuple for the store of repo
+
+    'size' is the size of all revlog files, 'readcost' the number of
+    compressed bytes read to restore every revision once and 'maxchainlen'
+    the length of the longest delta chain."""
+    size = readcost = maxchainlen = 0
+    for unencoded, encoded, filesize in repo.store.walk():
+        size += filesize
+    for path in _revlogpaths(repo):
+        if path.startswith('meta/'):
+            for f in (path, path[:-2] + '.d'):
+                if repo.svfs.exists(f):
+                    size += repo.svfs.stat(f).st_size
+        rl = _revlogfrompath(repo, path)
+        for rev in rl:
+            chainlen, deltalen = rl._chaininfo(rev)
+            readcost += deltalen
+            maxchainlen = max(maxchainlen, chainlen)
+    return size, readcost, maxchainlen
+
+def _copyrevlogs(ui, srcrepo, dstrepo, tr):
+    """add every revision of srcrepo to dstrepo, computing new deltas
+
+    Returns the number of revlogs and revisions copied."""
+    paths = _revlogpaths(srcrepo)
+    revcount = 0
+    for i, path in enumerate(paths):
+        ui.progress(_('upgrading'), i, item=path, total=len(paths),
+                    unit=_('revlogs'))
+        oldrl = _revlogfrompath(srcrepo, path)
+        newrl = _revlogfrompath(dstrepo, path)
+        for start in xrange(0, len(oldrl), _copybatchsize):
+            revs = xrange(start, min(start + _copybatchsize, len(oldrl)))
+            for rev, text in zip(revs, oldrl.revisions(revs)):
+                node = oldrl.node(rev)
+                p1, p2 = oldrl.parents(node)
+                # no cached delta: the new revlog chooses its delta bases,
+                # and compresses them, according to its own configuration
+                newrl.addrevision(text, tr, oldrl.linkrev(rev), p1, p2,
+                                  node=node)
+                revcount += 1
+    ui.progress(_('upgrading'), None)
+    for f in _storefiles:
+        if srcrepo.svfs.exists(f):
+            util.copyfile(srcrepo.sjoin(f), dstrepo.sjoin(f))
+    return len(paths), revcount
+
+def _swapstore(repo, dstrepo, newreqs):
+    """replace the store of repo with the one of dstrepo
+
+    Returns the path where the old store was moved."""
+    backuppath = tempfile.mkdtemp(prefix='upgradebackup.', dir=repo.path)
+    backupvfs = scmutil.vfs(backuppath)
+    util.copyfile(repo.join('requires'), backupvfs.join('requires'))
+    # the undo files of the copy transaction would let a rollback empty
+    # the upgraded store
+    for f in dstrepo.svfs.listdir():
+        if f.startswith('undo'):
+            dstrepo.svfs.unlink(f)
+    # readers see an unsupported requirement instead of a missing store
+    # while the stores are being swapped
+    scmutil.writerequires(repo.vfs, repo.requirements | set(['upgrading']))
+    # the store of dstrepo is locked as well, so the repository stays locked
+    # once the new store is in place
+    util.rename(repo.spath, backupvfs.join('store'))
+    util.rename(dstrepo.spath, repo.spath)
+    scmutil.writerequires(repo.vfs, newreqs)
+    # the lock file of the old store moved along with it
+    backupvfs.unlinkpath('store/lock', ignoremissing=True)
+    return backupvfs.join('store')
+
+def upgraderepo(ui, repo, run=False):
+    """re-encode the revlogs of repo with the configured storage format
+
+    Every revision is added again to a temporary store, letting the revlogs
+    compute new deltas and compress them as the configuration says (delta
+    policy, format.maxchainlen, compression engine...). The temporary store
+    then replaces the original one, which is kept as a backup.
+
+    Without run, only report what an upgrade would change."""
+    repo = repo.unfiltered()
+    if 'store' not in repo.requirements:
+        raise error.Abort(_('cannot upgrade repository without a store'))
+    if repo.sharedpath != repo.path:
+        raise error.Abort(_('cannot upgrade a shared repository'),
+                          hint=_('upgrade the source repository instead'))
+
+    newreqs = upgraderequirements(repo)
+    ui.write(_('requirements\n'))
+    ui.write(_('   preserved: %s\n')
+             % ', '.join(sorted(newreqs & repo.requirements)))
+    if repo.requirements - newreqs:
+        ui.write(_('   removed: %s\n')
+                 % ', '.join(sorted(repo.requirements - newreqs)))
+    if newreqs - repo.requirements:
+        ui.write(_('   added: %s\n')
+                 % ', '.join(sorted(newreqs - repo.requirements)))
+    ui.write('\n')
+
+    if not run:
+        size, readcost, maxchainlen = storestats(repo)
+        ui.write(_('store size: %d bytes\n') % size)
+        ui.write(_('read cost: %d bytes\n') % readcost)
+        ui.write(_('longest delta chain: %d\n') % maxchainlen)
+        ui.write(_('\n(run with --run to upgrade the repository)\n'))
+        return
+
+    # the temporary repository is created with the layout of repo, only the
+    # format of its revlogs follows the configuration
+    dstui = repo.ui.copy()
+    for section, name, req in [('format', 'usefncache', 'fncache'),
+                               ('format', 'dotencode', 'dotencode'),
+                               ('experimental', 'treemanifest', 'treemanifest'),
+                               ('experimental', 'manifestv2', 'manifestv2')]:
+        dstui.setconfig(section, name, req in newreqs, 'upgrade')
+
+    wlock = lock = dstlock = None
+    tmppath = None
+    try:
+        wlock = repo.wlock()
+        lock = repo.lock()
+        before = storestats(repo)
+
+        tmppath = tempfile.mkdtemp(prefix='upgrade.', dir=repo.path)
+        dstrepo = localrepo.localrepository(dstui, path=tmppath, create=True)
+        dstrepo.requirements = newreqs
+        dstrepo._applyopenerreqs()
+        dstlock = dstrepo.lock()
+
+        tr = dstrepo.transaction('upgrade')
+        try:
+            revlogcount, revcount = _copyrevlogs(ui, repo, dstrepo, tr)
+            tr.close()
+        finally:
+            tr.release()
+        after = storestats(dstrepo)
+
+        backuppath = _swapstore(repo, dstrepo, newreqs)
+        repo.requirements = newreqs
+        repo.invalidate()
+    finally:
+        lockmod.release(dstlock, lock, wlock)
+        if tmppath is not None:
+            shutil.rmtree(tmppath, True)
+
+    ui.write(_('upgraded %d revlogs containing %d revisions\n')
+             % (revlogcount, revcount))
+    for label, unit, old, new in [(_('store size'), _(' bytes'),
+                                   before[0], after[0]),
+                                  (_('read cost'), _(' bytes'),
+                                   before[1], after[1]),
+                                  (_('longest delta chain'), '',
+                                   before[2], after[2])]:
+        ui.write(_('%s: %d -> %d%s\n') % (label, old, new, unit))
+    ui.write(_('old store backed up in %s\n') % backuppath)
+    ui.write(_('(remove it once the upgraded repository is verified)\n'))
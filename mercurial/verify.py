@@ -17,6 +17,7 @@ from .node import (
 
 from . import (
     error,
+    filelog,
     revlog,
     util,
 )
@@ -28,6 +29,22 @@ def verify(repo):
     finally:
         lock.release()
 
+def _textreader(rl):
+    """return a function giving the text of each revision of rl in turn
+
+    The texts are restored together by revlog.revisions(), checking every
+    hash. After an error, the remaining revisions are read one by one, for
+    each error to be reported on the revision it affects."""
+    texts = [rl.revisions(rl, _hashcheck='all')]
+    def read(rev):
+        if texts[0] is not None:
+            try:
+                return next(texts[0])
+            except Exception:
+                texts[0] = None
+        return rl.revision(rev, _hashcheck='all')
+    return read
+
 def _normpath(f):
     # under hg < 2.4, convert didn't sanitize paths properly, so a
     # converted repo may contain repeated slashes
@@ -160,6 +177,9 @@ def _verify(repo):
         checkentry(cl, i, n, seen, [i], "changelog")
 
         try:
+            # every hash is checked, whatever the trusted read
+            # configuration; read() then reuses the text just checked
+            cl.revision(n, _hashcheck='all')
             changes = cl.read(n)
             if changes[0] != nullid:
                 mflinkrevs.setdefault(changes[0], []).append(i)
@@ -189,7 +209,7 @@ def _verify(repo):
             err(lr, _("%s not in changesets") % short(n), "manifest")
 
         try:
-            for f, fn in mf.readdelta(n).iteritems():
+            for f, fn in mf.readdelta(n, _hashcheck='all').iteritems():
                 if not f:
                     err(lr, _("file without name in manifest"))
                 elif f != "/dev/null": # ignore this in very old repos
@@ -276,6 +296,7 @@ def _verify(repo):
         checklog(fl, f, lr)
         seen = {}
         rp = None
+        readtext = _textreader(fl)
         for i in fl:
             revisions += 1
             n = fl.node(i)
@@ -288,7 +309,8 @@ def _verify(repo):
 
             # verify contents
             try:
-                l = len(fl.read(n))
+                text = readtext(i)
+                l = len(text) - (filelog.parsemeta(text)[1] or 0)
                 rp = fl.renamed(n)
                 if l != fl.size(i):
                     if len(fl.revision(n)) != fl.size(i):
@@ -481,7 +481,7 @@ cmdclass = {'build': hgbuild,
 
 packages = ['mercurial', 'mercurial.hgweb', 'mercurial.httpclient',
             'hgext', 'hgext.convert', 'hgext.highlight', 'hgext.zeroconf',
-            'hgext.largefiles']
+            'hgext.largefiles', 'hgext.fsmonitor']
 
 pymodules = []
 
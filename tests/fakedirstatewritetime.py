@@ -6,6 +6,7 @@
 #   - 'committablectx.markcommitted()'
 
 from mercurial import context, dirstate, extensions, parsers, util
+from mercurial import treedirstate
 
 def pack_dirstate(fakenow, orig, dmap, copymap, pl, now):
     # execute what original parsers.pack_dirstate should do actually
@@ -18,6 +19,16 @@ def pack_dirstate(fakenow, orig, dmap, copymap, pl, now):
 
     return orig(dmap, copymap, pl, fakenow)
 
+def treewrite(fakenow, orig, opener, fp, dmap, copymap, pl, now):
+    # same as pack_dirstate above, for the tree format
+    actualnow = int(now)
+    for f, e in dmap.iteritems():
+        if e[0] == 'n' and e[3] == actualnow:
+            e = parsers.dirstatetuple(e[0], e[1], e[2], -1)
+            dmap[f] = e
+
+    return orig(opener, fp, dmap, copymap, pl, fakenow)
+
 def fakewrite(ui, func):
     # fake "now" of 'pack_dirstate' only if it is invoked while 'func'
 
@@ -35,15 +46,20 @@ def fakewrite(ui, func):
 
     orig_pack_dirstate = parsers.pack_dirstate
     orig_dirstate_getfsnow = dirstate._getfsnow
+    orig_treedirstate_write = treedirstate.write
     wrapper = lambda *args: pack_dirstate(fakenow, orig_pack_dirstate, *args)
+    treewrapper = lambda *args: treewrite(fakenow, orig_treedirstate_write,
+                                          *args)
 
     parsers.pack_dirstate = wrapper
     dirstate._getfsnow = lambda *args: fakenow
+    treedirstate.write = treewrapper
     try:
         return func()
     finally:
         parsers.pack_dirstate = orig_pack_dirstate
         dirstate._getfsnow = orig_dirstate_getfsnow
+        treedirstate.write = orig_treedirstate_write
 
 def _checklookup(orig, workingctx, files):
     ui = workingctx.repo().ui
@@ -314,6 +314,15 @@ def has_unix_permissions():
 def has_unix_socket():
     return getattr(socket, 'AF_UNIX', None) is not None
 
+@check("inotify", "Linux inotify interface")
+def has_inotify():
+    try:
+        from hgext.fsmonitor import watcher
+        watcher._loadlibc()
+        return True
+    except (ImportError, OSError):
+        return False
+
 @check("root", "root permissions")
 def has_root():
     return getattr(os, 'geteuid', None) and os.geteuid() == 0
@@ -41,6 +41,12 @@ def buildancestorsets(graph):
             ancs[i].update(ancs[p])
     return ancs
 
+def buildgenerations(graph):
+    gens = {nullrev: 0}
+    for i in xrange(len(graph)):
+        gens[i] = max(gens[p] for p in graph[i]) + 1
+    return gens
+
 class naiveincrementalmissingancestors(object):
     def __init__(self, ancs, bases):
         self.ancs = ancs
@@ -92,6 +98,7 @@ def test_missingancestors(seed, rng):
     for g in xrange(graphcount):
         graph = buildgraph(rng)
         ancs = buildancestorsets(graph)
+        gens = buildgenerations(graph)
         gerrs = [0]
         for _ in xrange(testcount):
             # start from nullrev to include it as a possibility
@@ -100,6 +107,9 @@ def test_missingancestors(seed, rng):
 
             # fast algorithm
             inc = ancestor.incrementalmissingancestors(graph.__getitem__, bases)
+            # fast algorithm pruned by generation numbers
+            geninc = ancestor.incrementalmissingancestors(
+                graph.__getitem__, bases, genfunc=gens.__getitem__)
             # reference slow algorithm
             naiveinc = naiveincrementalmissingancestors(ancs, bases)
             seq = []
@@ -109,25 +119,34 @@ def test_missingancestors(seed, rng):
                     newbases = samplerevs(graphnodes)
                     seq.append(('addbases', newbases))
                     inc.addbases(newbases)
+                    geninc.addbases(newbases)
                     naiveinc.addbases(newbases)
                 if rng.random() < 0.4:
                     # larger set so that there are more revs to remove from
                     revs = samplerevs(graphnodes, mu=1.5)
                     seq.append(('removeancestorsfrom', revs))
                     hrevs = set(revs)
+                    grevs = set(revs)
                     rrevs = set(revs)
                     inc.removeancestorsfrom(hrevs)
+                    geninc.removeancestorsfrom(grevs)
                     naiveinc.removeancestorsfrom(rrevs)
                     if hrevs != rrevs:
                         err(seed, graph, bases, seq, sorted(hrevs),
                             sorted(rrevs))
+                    if grevs != rrevs:
+                        err(seed, graph, bases, seq, sorted(grevs),
+                            sorted(rrevs))
                 else:
                     revs = samplerevs(graphnodes)
                     seq.append(('missingancestors', revs))
                     h = inc.missingancestors(revs)
+                    g = geninc.missingancestors(revs)
                     r = naiveinc.missingancestors(revs)
                     if h != r:
                         err(seed, graph, bases, seq, h, r)
+                    if g != r:
+                        err(seed, graph, bases, seq, g, r)
 
 # graph is a dict of child->parent adjacency lists for this graph:
 # o  13
@@ -0,0 +1,177 @@
+  $ cat >> $HGRCPATH <<EOF
+  > [experimental]
+  > changedfilesindex = true
+  > [extensions]
+  > strip =
+  > EOF
+
+  $ cat > $TESTTMP/dumpindex.py <<EOF
+  > from mercurial import hg, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.')
+  > index = repo.unfiltered()._changedfilesindex
+  > if index is None:
+  >     from mercurial import filesindex
+  >     index = filesindex.changedfilesindex(repo.unfiltered())
+  > for rev in xrange(len(index)):
+  >     print rev, ' '.join(index.files(rev))
+  > EOF
+  $ dumpindex() {
+  >     python $TESTTMP/dumpindex.py
+  > }
+
+  $ hg init repo
+  $ cd repo
+  $ mkdir -p a/b c
+  $ echo a > a/f
+  $ echo b > a/b/g
+  $ hg commit -qAm 0
+  $ echo c > c/h
+  $ echo a >> a/f
+  $ hg commit -qAm 1
+  $ hg remove -q a/b/g
+  $ hg commit -qm 2
+  $ hg copy -q c/h a/b/g
+  $ hg commit -qm 3
+
+The index is written when transactions close
+
+  $ ls .hg/cache | grep cf-
+  cf-files-v1
+  cf-heads-v1
+  cf-links-v1
+  cf-names-v1
+  cf-revs-v1
+  $ dumpindex
+  0 a/b/g a/f
+  1 a/f c/h
+  2 a/b/g
+  3 a/b/g
+
+File-scoped revsets and log use it
+
+  $ hg log -T '{rev} ' -r 'file("path:a/b")'; echo
+  0 2 3 
+  $ hg log -T '{rev} ' -r 'file("glob:**/h")'; echo
+  1 
+  $ hg log -T '{rev} ' -r 'adds("a/b/g")'; echo
+  0 3 
+  $ hg log -T '{rev} ' -r 'removes("a/b/g")'; echo
+  2 
+  $ hg log -T '{rev} ' -r 'modifies("a/f")'; echo
+  1 
+  $ hg log -T '{rev} ' a; echo
+  3 2 1 0 
+  $ hg log -T '{rev} ' -r 'file("a/b/g")' --config experimental.changedfilesindex=false; echo
+  0 2 3 
+
+Names matched by paths are looked up instead of matching every name
+
+  $ cat > $TESTTMP/candidates.py <<EOF
+  > from mercurial import hg, match as matchmod, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.')
+  > index = repo.changedfilesindex()
+  > def show(m):
+  >     c = index._candidates(m)
+  >     if c is not None:
+  >         c = sorted(index._names[i] for i in c)
+  >     print c, ' '.join(str(r) for r in sorted(index.matchrevs(m)))
+  > for pats in (['path:a/b'], ['path:c', 'path:a/f'], ['path:a/f/x'],
+  >              ['glob:**/h'], ['path:.']):
+  >     show(matchmod.match(repo.root, '', pats))
+  > show(matchmod.exact(repo.root, '', ['a/b/g', 'c', 'x']))
+  > EOF
+  $ python $TESTTMP/candidates.py
+  ['a/b/g'] 0 2 3
+  ['a/f', 'c/h'] 0 1
+  [] 
+  None 1
+  None 0 1 2 3
+  ['a/b/g'] 0 2 3
+
+The working directory is not in the index
+
+  $ echo a >> a/f
+  $ hg log -T '{rev}\n' -r 'wdir() and modifies("a/f")'
+  2147483647
+  $ hg log -T '{rev}\n' -r 'wdir() and file("path:c")'
+  $ hg revert -q --no-backup a/f
+
+Revisions missing from the index are added when it is used, and written
+unless the wlock is held
+
+  $ rm .hg/cache/cf-revs-v1
+  $ echo d > c/d
+  $ hg commit -qAm 4 --config experimental.changedfilesindex=false
+  $ ln -s otherhost:12345 .hg/wlock
+  $ hg log -r 'file("path:c")' --debug | grep 'changed files index'
+  couldn't read changed files index: * (glob)
+  not writing changed files index: wlock cannot be acquired
+  $ ls .hg/cache | grep cf-revs
+  [1]
+  $ rm .hg/wlock
+  $ hg log -T '{rev} ' -r 'file("path:c")'; echo
+  1 4 
+  $ dumpindex
+  0 a/b/g a/f
+  1 a/f c/h
+  2 a/b/g
+  3 a/b/g
+  4 c/d
+
+Records of stripped revisions are dropped
+
+  $ hg strip -q 3 --config experimental.changedfilesindex=false
+  $ echo e > c/e
+  $ hg commit -qAm 3bis --config experimental.changedfilesindex=false
+  $ hg log -T '{rev} ' -r 'file("path:c")'; echo
+  1 3 
+  $ dumpindex
+  0 a/b/g a/f
+  1 a/f c/h
+  2 a/b/g
+  3 c/e
+  $ hg log -T '{rev} ' -r 'file("a/b/g")'; echo
+  0 2 
+
+The links from each name to the revisions changing it are completed when
+they are missing, and follow strips
+
+  $ rm .hg/cache/cf-heads-v1
+  $ hg log -T '{rev} ' -r 'sort(file("path:c") or file("a/b/g"))'; echo
+  0 1 2 3 
+  $ rm .hg/cache/cf-links-v1
+  $ hg log -T '{rev} ' -r 'sort(file("path:c") or file("a/b/g"))'; echo
+  0 1 2 3 
+  $ ls .hg/cache | grep -c cf-
+  5
+  $ hg strip -q --no-backup 2
+  $ hg log -T '{rev} ' -r 'sort(file("path:c") or file("a/b/g"))'; echo
+  0 1 
+  $ echo e > c/e
+  $ hg commit -qAm 2bis
+  $ echo g >> a/b/g
+  $ hg commit -qm 3bis
+  $ hg log -T '{rev} ' -r 'sort(file("path:c") or file("a/b/g"))'; echo
+  0 1 2 3 
+  $ hg log -T '{rev} ' -r 'file("a/b/g")'; echo
+  0 3 
+  $ dumpindex
+  0 a/b/g a/f
+  1 a/f c/h
+  2 c/e
+  3 a/b/g
+
+A damaged index is ignored
+
+  $ echo garbage > .hg/cache/cf-names-v1
+  $ hg log -T '{rev} ' -r 'file("path:c")'; echo
+  1 2 
+  $ hg log -T '{rev} ' -r 'file("a/b/g")'; echo
+  0 3 
+  $ dumpindex
+  0 a/b/g a/f
+  1 a/f c/h
+  2 c/e
+  3 a/b/g
+
+  $ cd ..
@@ -80,7 +80,9 @@ Show debug commands if there are no other candidates
   debugdag
   debugdata
   debugdate
+  debugdeltachain
   debugdirstate
+  debugdirstateformat
   debugdiscovery
   debugextensions
   debugfileset
@@ -95,6 +97,7 @@ Show debug commands if there are no other candidates
   debuglocks
   debugmergestate
   debugnamecomplete
+  debugnodemap
   debugobsolete
   debugpathcomplete
   debugpushkey
@@ -107,6 +110,7 @@ Show debug commands if there are no other candidates
   debugsetparents
   debugsub
   debugsuccessorssets
+  debugupgraderepo
   debugwalk
   debugwireargs
 
@@ -243,6 +247,8 @@ Show all commands + options
   debugdag: tags, branches, dots, spaces
   debugdata: changelog, manifest, dir
   debugdate: extended
+  debugdeltachain: changelog, manifest, dir, summary, top, template
+  debugdirstateformat: 
   debugdirstate: nodates, datesort
   debugdiscovery: old, nonheads, ssh, remotecmd, insecure
   debugextensions: template
@@ -258,6 +264,7 @@ Show all commands + options
   debuglocks: force-lock, force-wlock
   debugmergestate: 
   debugnamecomplete: 
+  debugnodemap: changelog, manifest, dump, check, rebuild
   debugobsolete: flags, record-parents, rev, date, user
   debugpathcomplete: full, normal, added, removed
   debugpushkey: 
@@ -270,6 +277,7 @@ Show all commands + options
   debugsetparents: 
   debugsub: rev
   debugsuccessorssets: 
+  debugupgraderepo: run
   debugwalk: include, exclude
   debugwireargs: three, four, five, ssh, remotecmd, insecure
   files: rev, print0, include, exclude, template, subrepos
@@ -22,6 +22,11 @@
       full      : 44 (100.00%)
       deltas    :  0 ( 0.00%)
   
+  chunks        :  1
+      0x75 (u)  :  1 (100.00%)
+  chunks size   : 44
+      0x75 (u)  : 44 (100.00%)
+  
   avg chain length  : 0
   max chain length  : 0
   compression ratio : 0
@@ -78,6 +83,53 @@ Test max chain len
       6     5    -1   ???   ???        ???  ???  ???    0     ???      ????           ?     1        1 (glob)
       7     6    -1   ???   ???        ???  ???  ???    0     ???      ????           ?     1        2 (glob)
       8     7    -1   ???   ???        ???  ???  ???    0     ???      ????           ?     1        3 (glob)
+
+Test debugdeltachain; the chains are bounded by maxchainlen
+
+  $ hg debugdeltachain a
+      rev  chain# chainlen     prev   delta       size    rawsize  chainsize     ratio   lindist extradist extraratio   readsize    readamp
+        0       1        1       -1    base          3          2          3   1.50000         3         0    0.00000          3    1.50000
+        1       1        2        0      p1        110        119        113   0.94958       113         0    0.00000        113    0.94958
+        2       1        3        1      p1         14        121        127   1.04959       127         0    0.00000        127    1.04959
+        3       1        4        2      p1         14        123        141   1.14634       141         0    0.00000        141    1.14634
+        4       1        5        3      p1         14        125        155   1.24000       155         0    0.00000        155    1.24000
+        5       2        1       -1    base        108        127        108   0.85039       108         0    0.00000        108    0.85039
+        6       2        2        5      p1         14        129        122   0.94574       122         0    0.00000        122    0.94574
+        7       2        3        6      p1         14        131        136   1.03817       136         0    0.00000        136    1.03817
+        8       2        4        7      p1         14        133        150   1.12782       150         0    0.00000        150    1.12782
+  $ hg debugdeltachain a -T '{rev} {chainid} {chainlen} {prevrev} {deltatype}\n'
+  0 1 1 -1 base
+  1 1 2 0 p1
+  2 1 3 1 p1
+  3 1 4 2 p1
+  4 1 5 3 p1
+  5 2 1 -1 base
+  6 2 2 5 p1
+  7 2 3 6 p1
+  8 2 4 7 p1
+  $ hg debugdeltachain -m -Tjson | egrep '"(rev|deltatype)"' | head -4
+    "deltatype": "base",
+    "rev": 0,
+    "deltatype": "base",
+    "rev": 1,
+  $ hg debugdeltachain a --summary
+  metric            mean        p50        p90        p99        max  maxrev
+  chainlen         2.78          3          5          5          5       4
+  chainsize      117.22        127        155        155        155       4
+  chainratio       1.09       1.05       1.50       1.50       1.50       0
+  lindist        117.22        127        155        155        155       4
+  readsize       117.22        127        155        155        155       4
+  readamp          1.09       1.05       1.50       1.50       1.50       0
+  $ hg debugdeltachain a --summary -T '{metric} {max} {maxrev}\n'
+  chainlen 5 4
+  chainsize 155 4
+  chainratio 1.5 0
+  lindist 155 4
+  readsize 155 4
+  readamp 1.5 0
+  $ hg debugdeltachain a --top 2 -T '{rev} {readsize} {readamp}\n'
+  0 3 1.5
+  4 155 1.24
   $ cd ..
 
 Test internal debugstacktrace command
@@ -0,0 +1,86 @@
+  $ cat >> $HGRCPATH <<EOF
+  > [experimental]
+  > dirstate.dircache = true
+  > EOF
+
+Directories are listed again when their mtime changes: give them one in the
+past to not depend on the time the test takes
+
+  $ backdate() {
+  >     find . -name .hg -prune -o -type d -exec touch -t $1 {} \;
+  > }
+
+  $ hg init repo
+  $ cd repo
+  $ mkdir -p a/b c
+  $ echo a > a/f
+  $ echo b > a/b/g
+  $ echo c > c/h
+  $ hg commit -qAm 0 a
+  $ backdate 200001010000
+
+  $ hg status --debug
+  dircache: listed 4 directories, 0 from cache
+  ? c/h
+  $ hg status --debug
+  dircache: listed 0 directories, 4 from cache
+  ? c/h
+
+Changes to tracked files are found in directories from the cache
+
+  $ echo aa > a/f
+  $ rm a/b/g
+  $ hg status --debug
+  dircache: listed 1 directories, 3 from cache
+  M a/f
+  ! a/b/g
+  ? c/h
+  $ hg revert -q a/b/g
+  $ backdate 200001010000
+
+New files are found in directories whose mtime changed
+
+  $ echo u > a/b/u
+  $ touch -t 200101010000 a/b
+  $ hg status --debug
+  dircache: listed 1 directories, 3 from cache
+  M a/f
+  ? a/b/u
+  ? c/h
+  $ hg status --debug a
+  dircache: listed 0 directories, 2 from cache
+  M a/f
+  ? a/b/u
+
+Removed directories are forgotten
+
+  $ rm -r c
+  $ backdate 200201010000
+  $ hg status --debug
+  dircache: listed 3 directories, 0 from cache
+  M a/f
+  ? a/b/u
+  $ tr '\000' '\n' < .hg/cache/dircache | grep -x c
+  [1]
+
+The ignore rules apply to the entries from the cache
+
+  $ echo 'a/b/u' > .hgignore
+  $ touch -t 200301010000 .
+  $ hg status --debug
+  dircache: listed 1 directories, 2 from cache
+  M a/f
+  ? .hgignore
+  $ hg status --debug -i
+  dircache: listed 0 directories, 3 from cache
+  I a/b/u
+
+A damaged cache is ignored
+
+  $ echo garbage > .hg/cache/dircache
+  $ hg status --debug
+  dircache: listed 3 directories, 0 from cache
+  M a/f
+  ? .hgignore
+
+  $ cd ..
@@ -0,0 +1,93 @@
+Status is the same whether files are stat'ed serially or by stat workers
+
+  $ hg init repo
+  $ cd repo
+  $ mkdir -p a/b c d
+  $ for f in a/f a/b/g a/b/h c/i c/k d/j top; do echo $f > $f; done
+  $ echo 'glob:d/ig*' > .hgignore
+  $ hg commit -qAm 0
+  $ echo changed >> a/f
+  $ rm a/b/g
+  $ hg remove -q c/i
+  $ echo new > a/b/new
+  $ hg add -q a/b/new
+  $ echo unknown > c/unknown
+  $ echo ignored > d/ignored
+  $ ln -s top link
+
+  $ compare() {
+  >     hg status "$@" > $TESTTMP/serial
+  >     hg status --config experimental.dirstate.statworkers=4 "$@" \
+  >         > $TESTTMP/parallel
+  >     cmp $TESTTMP/serial $TESTTMP/parallel && cat $TESTTMP/parallel
+  > }
+
+  $ compare -A
+  M a/f
+  A a/b/new
+  R c/i
+  ! a/b/g
+  ? c/unknown
+  ? link
+  I d/ignored
+  C .hgignore
+  C a/b/h
+  C c/k
+  C d/j
+  C top
+  $ compare
+  M a/f
+  A a/b/new
+  R c/i
+  ! a/b/g
+  ? c/unknown
+  ? link
+  $ compare -mard
+  M a/f
+  A a/b/new
+  R c/i
+  ! a/b/g
+  $ compare a/b/g a/f c d/ignored missing
+  missing: No such file or directory
+  missing: No such file or directory
+  M a/f
+  R c/i
+  ! a/b/g
+  ? c/unknown
+  $ compare -A 'glob:**/*g*'
+  ! a/b/g
+  I d/ignored
+  C .hgignore
+
+Files listed from the directory cache are stat'ed by the workers too
+
+  $ compare --config experimental.dirstate.dircache=true
+  M a/f
+  A a/b/new
+  R c/i
+  ! a/b/g
+  ? c/unknown
+  ? link
+  $ compare --config experimental.dirstate.dircache=true
+  M a/f
+  A a/b/new
+  R c/i
+  ! a/b/g
+  ? c/unknown
+  ? link
+
+Adding files stats them with the workers as well
+
+  $ hg addremove --config experimental.dirstate.statworkers=4
+  removing a/b/g
+  adding c/unknown
+  adding link
+  $ compare
+  M a/f
+  A a/b/new
+  A c/unknown
+  A link
+  R a/b/g
+  R c/i
+
+  $ cd ..
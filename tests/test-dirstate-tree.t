@@ -0,0 +1,178 @@
+  $ cat > $TESTTMP/datasize.py <<EOF
+  > from mercurial import treedirstate
+  > docket, copymap = treedirstate._parsedocket(open('.hg/dirstate').read())
+  > print 'data size %d, used %d' % docket[3:5]
+  > EOF
+  $ datasize() {
+  >     python $TESTTMP/datasize.py
+  > }
+
+  $ hg init repo --config experimental.treedirstate=true
+  $ cd repo
+  $ grep treedirstate .hg/requires
+  treedirstate
+  $ hg debugdirstateformat
+  tree
+  $ mkdir -p a/b c
+  $ echo f > a/f
+  $ echo g > a/b/g
+  $ echo h > c/h
+  $ echo top > top
+  $ touch -t 200001010000 a/f a/b/g c/h top
+  $ hg commit -qAm 0
+  $ hg debugstate --nodates
+  n 644          2 set                 a/b/g
+  n 644          2 set                 a/f
+  n 644          2 set                 c/h
+  n 644          4 set                 top
+
+Rewriting the dirstate in its format starts a new data file with a node for
+each directory
+
+  $ ls .hg | grep dirstate.tree > $TESTTMP/oldfiles
+  $ hg debugdirstateformat tree
+  $ ls .hg | grep dirstate.tree | grep -v -f $TESTTMP/oldfiles
+  dirstate.tree.* (glob)
+  $ datasize
+  data size 157, used 157
+
+Changes append the nodes of the directories changed and of their parents:
+the root and c here
+
+  $ hg forget c/h
+  $ datasize
+  data size 245, used 157
+  $ hg add c/h
+  $ datasize
+  data size 333, used 157
+  $ hg copy -q a/f a/b/f2
+  $ echo g >> a/b/g
+  $ hg status -C
+  M a/b/g
+  A a/b/f2
+    a/f
+  $ touch -t 200001010000 a/b/f2 a/b/g
+
+Looking up a file only reads the nodes of the directories on its path
+
+  $ cat > $TESTTMP/lookup.py <<EOF
+  > from mercurial import hg, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.')
+  > dmap = repo.dirstate._map
+  > print dmap['a/b/g'][0], 'c/x' in dmap, 'x/y' in dmap
+  > print sorted(dmap._children)
+  > print len(dmap), sorted(dmap._children)
+  > EOF
+  $ python $TESTTMP/lookup.py
+  n False False
+  ['', 'a', 'a/b', 'c']
+  5 ['', 'a', 'a/b', 'c']
+
+  $ hg commit -qm 1
+  $ hg debugstate --nodates
+  n 644          2 set                 a/b/f2
+  n 644          4 set                 a/b/g
+  n 644          2 set                 a/f
+  n 644          2 set                 c/h
+  n 644          4 set                 top
+
+Conversion to the flat format and back
+
+  $ hg debugstate --nodates > $TESTTMP/tree
+  $ hg debugdirstateformat flat
+  $ hg debugdirstateformat
+  flat
+  $ grep treedirstate .hg/requires
+  [1]
+  $ hg debugstate --nodates > $TESTTMP/flat
+  $ cmp $TESTTMP/tree $TESTTMP/flat
+  $ hg debugdirstateformat tree
+  $ grep treedirstate .hg/requires
+  treedirstate
+  $ hg debugstate --nodates > $TESTTMP/tree
+  $ cmp $TESTTMP/tree $TESTTMP/flat
+  $ hg debugdirstateformat foo
+  abort: unknown dirstate format foo
+  [255]
+
+Removing every file of a directory forgets it, its node no longer counts
+as used
+
+  $ hg remove -q c/h a/b
+  $ hg commit -qm 2
+  $ datasize
+  data size *, used 71 (glob)
+  $ hg debugdirstateformat tree
+  $ datasize
+  data size 71, used 71
+  $ hg status
+  $ hg debugstate --nodates
+  n 644          2 set                 a/f
+  n 644          4 set                 top
+  $ hg up -q 1
+  $ hg status
+  $ hg files
+  a/b/f2
+  a/b/g
+  a/f
+  c/h
+  top
+
+Rollback restores a copy of .hg/dirstate referring to the data file in use
+at the time
+
+  $ hg debugdirstateformat tree
+  $ echo h >> c/h
+  $ hg commit -qm 3
+  $ hg debugdirstateformat tree
+  $ hg rollback -q
+  $ hg status
+  M c/h
+
+Data files are removed once no dirstate file refers to them
+
+  $ ls .hg | grep dirstate
+  dirstate
+  dirstate.tree.* (glob)
+  dirstate.tree.* (glob)
+  undo.backup.dirstate
+  $ rm .hg/undo.backup.dirstate
+  $ hg debugdirstateformat tree
+  $ ls .hg | grep -c dirstate.tree
+  1
+
+A data file removed by a concurrent write after .hg/dirstate was read is
+read again from the new .hg/dirstate
+
+  $ cat > $TESTTMP/concurrent.py <<EOF
+  > from mercurial import extensions, treedirstate, util
+  > def read(orig, opener, data):
+  >     if not opener.exists('concurrent'):
+  >         opener.write('concurrent', '')
+  >         util.system('hg debugdirstateformat tree')
+  >     return orig(opener, data)
+  > def extsetup(ui):
+  >     extensions.wrapfunction(treedirstate, 'read', read)
+  > EOF
+  $ hg status --config extensions.concurrent=$TESTTMP/concurrent.py
+  M c/h
+  $ rm .hg/concurrent
+
+A missing data file is detected
+
+  $ datafile=`echo .hg/dirstate.tree.*`
+  $ mv $datafile $TESTTMP/data
+  $ hg status
+  abort: working directory state appears damaged!
+  [255]
+  $ mv $TESTTMP/data $datafile
+
+A damaged data file is detected
+
+  $ cp .hg/dirstate.tree.* $TESTTMP/data
+  $ dd if=$TESTTMP/data of=`echo .hg/dirstate.tree.*` bs=100 count=1 2> /dev/null
+  $ hg status
+  abort: working directory state appears damaged!
+  [255]
+
+  $ cd ..
@@ -0,0 +1,210 @@
+#require unix-socket
+
+  $ cat >> $HGRCPATH <<EOF
+  > [extensions]
+  > fsmonitor =
+  > [fsmonitor]
+  > watcher = poll
+  > EOF
+
+Files are dated in the past once written, for their dirstate entries not to
+depend on the time of the commands, and the counts of files looked at to be
+stable
+
+  $ backdate() {
+  >     touch -t 200001010000 "$@"
+  > }
+
+  $ hg init repo
+  $ cd repo
+  $ mkdir dir
+  $ for f in a b c dir/d dir/e; do echo $f > $f; done
+  $ cat > .hgignore <<EOF
+  > syntax: glob
+  > ignored*
+  > EOF
+  $ backdate a b c dir/d dir/e .hgignore
+  $ hg commit -qAm 0
+
+Without daemon, status walks the working directory
+
+  $ echo a >> a
+  $ hg status --debug
+  fsmonitor: no file watching daemon: [Errno 2] No such file or directory
+  M a
+
+  $ hg fswatch -d --pid-file ../fswatch.pid
+  $ cat ../fswatch.pid >> $DAEMON_PIDS
+  $ hg fswatch -d
+  abort: a file watching daemon is already running
+  [255]
+
+The first status walks the whole working directory
+
+  $ hg status --debug
+  fsmonitor: walking the whole working directory
+  M a
+
+Later ones only look at the files changed and at the ones still modified
+
+  $ hg status --debug
+  fsmonitor: looking at 1 files
+  M a
+  $ echo b >> b
+  $ echo unknown > dir/unknown
+  $ echo ignored > ignored
+  $ hg status --debug
+  fsmonitor: looking at 4 files
+  M a
+  M b
+  ? dir/unknown
+  $ hg add -q dir/unknown
+  $ hg rm -q c
+  $ rm dir/d
+  $ hg status --debug
+  fsmonitor: looking at 5 files
+  M a
+  M b
+  A dir/unknown
+  R c
+  ! dir/d
+
+Reverting makes files clean again
+
+  $ hg revert -q --all --no-backup
+  $ backdate a b c dir/d
+  $ hg status --debug
+  fsmonitor: looking at 5 files
+  ? dir/unknown
+  $ rm dir/unknown
+  $ hg status --debug
+  fsmonitor: looking at 5 files
+  $ hg status --debug
+  fsmonitor: looking at 0 files
+
+Removed directories
+
+  $ rm -r dir
+  $ hg status
+  ! dir/d
+  ! dir/e
+  $ hg revert -q --all
+  $ backdate dir/d dir/e
+
+Statuses restricted to some files keep track of the other changes
+
+  $ echo a >> a
+  $ echo b >> b
+  $ hg status b
+  M b
+  $ hg status --debug
+  fsmonitor: looking at 4 files
+  M a
+  M b
+  $ backdate a b
+  $ hg commit -qm 1
+  $ hg status --debug
+  fsmonitor: looking at 2 files
+
+Listing ignored or clean files walks the working directory
+
+  $ hg status -i
+  I ignored
+  $ hg status -c dir
+  C dir/d
+  C dir/e
+
+Changing the ignore rules walks the working directory again
+
+  $ echo 'unknown*' >> .hgignore
+  $ hg status --debug
+  fsmonitor: walking the whole working directory
+  M .hgignore
+
+So does a restart of the daemon
+
+  $ hg fswatch --stop
+  $ hg fswatch --stop
+  abort: no file watching daemon is running
+  [255]
+  $ hg fswatch -d --pid-file ../fswatch.pid
+  $ cat ../fswatch.pid >> $DAEMON_PIDS
+  $ hg status --debug
+  fsmonitor: walking the whole working directory
+  M .hgignore
+
+Commands relying on status
+
+  $ echo c > c2
+  $ backdate .hgignore c2
+  $ hg commit -qAm 2
+  $ hg status --debug
+  fsmonitor: looking at 2 files
+  $ echo d >> dir/d
+  $ hg diff --nodates
+  diff -r * dir/d (glob)
+  --- a/dir/d
+  +++ b/dir/d
+  @@ -1,1 +1,2 @@
+   dir/d
+  +d
+  $ backdate dir/d
+  $ hg commit -m 3
+  $ hg status --debug
+  fsmonitor: looking at 1 files
+
+Commands rewriting the dirstate without touching the files walk the working
+directory again
+
+  $ echo a >> a
+  $ backdate a
+  $ hg commit -m 4
+  $ hg status --debug
+  fsmonitor: looking at 1 files
+  $ hg rollback -q
+  $ hg status --debug
+  fsmonitor: walking the whole working directory
+  M a
+  $ hg status --debug
+  fsmonitor: looking at 1 files
+  M a
+  $ hg debugrebuildstate
+  $ hg status --debug
+  fsmonitor: walking the whole working directory
+  M a
+
+  $ hg fswatch --stop
+  $ cd ..
+
+#if inotify
+
+The inotify watcher
+
+  $ hg init inotify
+  $ cd inotify
+  $ mkdir dir
+  $ echo a > dir/a
+  $ backdate dir/a
+  $ hg commit -qAm 0
+  $ hg fswatch -d --pid-file ../fswatch.pid --config fsmonitor.watcher=inotify
+  $ cat ../fswatch.pid >> $DAEMON_PIDS
+  $ hg status --debug
+  fsmonitor: walking the whole working directory
+  $ echo a >> dir/a
+  $ mkdir -p new/sub
+  $ echo b > new/sub/b
+  $ hg status --debug
+  fsmonitor: looking at 2 files
+  M dir/a
+  ? new/sub/b
+  $ backdate dir/a new/sub/b
+  $ hg commit -qAm 1
+  $ mv dir moved
+  $ hg status --debug
+  fsmonitor: looking at 3 files
+  ! dir/a
+  ? moved/a
+  $ hg fswatch --stop
+  $ cd ..
+
+#endif
@@ -157,3 +157,38 @@ Test that strip bundle use bundle2
       1c5d4dc9a8b8d6e1750966d343e94db665e7a1e9
 
   $ cd ..
+
+Test experimental.delta-search: the parents, the previous revision and the
+closest snapshot are all evaluated and the smallest good delta is kept.
+
+  $ hg init --config format.generaldelta=1 search
+  $ cd search
+  $ python -c 'for x in range(500): print "line %d" % x' > a
+  $ hg commit -Aqm base
+  $ python -c 'for x in range(100): print "new %d" % x' >> a
+  $ hg commit -qm new
+  $ hg up -q 0
+  $ python -c 'for x in range(100): print "new %d" % x' >> a
+  $ echo other >> a
+  $ hg commit -qm other
+
+- Without the search, the delta is stored against p1 (revision 0)
+  $ hg debugindex a
+     rev    offset  length  delta linkrev nodeid       p1           p2
+       0         0     979     -1       0 aa50f38a0cb1 000000000000 000000000000
+       1       979     208      0       1 b9d56c3d17f3 aa50f38a0cb1 000000000000
+       2      1187     217      0       2 0b5a1e25c8a5 aa50f38a0cb1 000000000000
+
+- With it, against the previous revision (revision 1)
+  $ hg strip -q -r . --config extensions.strip=
+  $ hg up -q 0
+  $ python -c 'for x in range(100): print "new %d" % x' >> a
+  $ echo other >> a
+  $ hg commit -qm other --config experimental.delta-search=yes
+  $ hg debugindex a
+     rev    offset  length  delta linkrev nodeid       p1           p2
+       0         0     979     -1       0 aa50f38a0cb1 000000000000 000000000000
+       1       979     208      0       1 b9d56c3d17f3 aa50f38a0cb1 000000000000
+       2      1187      18      1       2 0b5a1e25c8a5 aa50f38a0cb1 000000000000
+  $ hg verify -q
+  $ cd ..
@@ -0,0 +1,153 @@
+  $ cat >> $HGRCPATH <<EOF
+  > [experimental]
+  > generationnumbers = true
+  > [extensions]
+  > strip =
+  > EOF
+
+  $ cat > $TESTTMP/dumpgen.py <<EOF
+  > from mercurial import hg, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.')
+  > cl = repo.changelog
+  > print ' '.join('%d:%d' % (r, cl.generations.generation(r)) for r in cl)
+  > EOF
+  $ dumpgen() {
+  >     python $TESTTMP/dumpgen.py
+  > }
+
+  $ hg init repo
+  $ cd repo
+  $ hg debugbuilddag '+3:base +3:a *base +1:b /a'
+  $ hg log -G -T '{rev} '
+  o    8
+  |\
+  | o  7
+  | |
+  | o  6
+  | |
+  o |  5
+  | |
+  o |  4
+  | |
+  o |  3
+  |/
+  o  2
+  |
+  o  1
+  |
+  o  0
+  
+
+Generation numbers are one more than the highest of the parents, and are
+written when transactions close
+
+  $ dumpgen
+  0:1 1:2 2:3 3:4 4:5 5:6 6:4 7:5 8:7
+  $ f --size .hg/cache/generations-v1
+  .hg/cache/generations-v1: size=72
+
+Ancestry checks use them to answer without walking the graph
+
+  $ revs() {
+  >     hg log -T '{rev} ' -r "$1"; echo
+  >     hg log -T '{rev} ' -r "$1" --config experimental.generationnumbers=false
+  >     echo
+  > }
+  $ revs '(1+4+6+7+8) and ::7'
+  1 6 7 
+  1 6 7 
+  $ revs '(0+3+5+7+8) and 6::'
+  7 8 
+  7 8 
+  $ revs '(0+3+5+7) and descendants(3+6)'
+  3 5 7 
+  3 5 7 
+  $ revs 'null:: and (0+1)'
+  0 1 
+  0 1 
+  $ cat > $TESTTMP/ancestry.py <<EOF
+  > from mercurial import hg, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.')
+  > cl = repo.changelog
+  > for a, b in [(3, 7), (7, 3), (2, 7), (7, 8), (8, 7), (6, 6), (6, 5)]:
+  >     print a, b, cl.isancestor(cl.node(a), cl.node(b)), \
+  >         cl.descendant(a, b), a in cl.ancestors([b]), \
+  >         a in cl.ancestors([b], inclusive=True)
+  > EOF
+  $ python $TESTTMP/ancestry.py > $TESTTMP/withgen
+  $ cat $TESTTMP/withgen
+  3 7 False False False False
+  7 3 False False False False
+  2 7 True True True True
+  7 8 True True True True
+  8 7 False False False False
+  6 6 True False False True
+  6 5 False False False False
+  $ python $TESTTMP/ancestry.py \
+  >     --config experimental.generationnumbers=false > /dev/null
+  $ HGRCPATH= python $TESTTMP/ancestry.py | cmp - $TESTTMP/withgen
+
+Walks of the graph stop once generation numbers rule out the revisions they
+look for
+
+  $ cat > $TESTTMP/walks.py <<EOF
+  > import sys
+  > from mercurial import changelog, hg, revlog, ui as uimod
+  > walked = []
+  > def parentrevs(self, rev):
+  >     walked.append(rev)
+  >     return revlog.revlog.parentrevs(self, rev)
+  > changelog.changelog.parentrevs = parentrevs
+  > ui = uimod.ui()
+  > ui.setconfig('experimental', 'generationnumbers', sys.argv[1])
+  > repo = hg.repository(ui, '.')
+  > cl = repo.changelog
+  > if cl.generations is not None:
+  >     cl.generations.generation(len(cl) - 1)
+  > def walk(f, *args):
+  >     del walked[:]
+  >     print list(f(*args)), sorted(set(walked))
+  > walk(repo.revs, '%ld and ::%d', [3, 6], 7)
+  > walk(repo.revs, '%ld and %d::', [4, 7], 2)
+  > inc = cl.incrementalmissingrevs([5, 7])
+  > revs = set([1, 3, 6, 8])
+  > walk(lambda: inc.removeancestorsfrom(revs) or sorted(revs))
+  > EOF
+  $ python $TESTTMP/walks.py true
+  [6] [7]
+  [4, 7] [3, 4, 6, 7]
+  [8] [2, 3, 4, 5, 6, 7]
+  $ python $TESTTMP/walks.py false
+  [6] [6, 7]
+  [4, 7] [3, 4, 5, 6, 7]
+  [8] [1, 2, 3, 4, 5, 6, 7]
+
+Records of stripped revisions are dropped, and missing ones computed again
+
+  $ hg strip -q 5 --config experimental.generationnumbers=false
+  $ hg up -q 2
+  $ f --size .hg/cache/generations-v1
+  .hg/cache/generations-v1: size=56
+  $ echo x > x
+  $ hg commit -qAm x --config experimental.generationnumbers=false
+  $ dumpgen
+  0:1 1:2 2:3 3:4 4:5 5:4 6:5 7:4
+  $ hg phase -p 7
+  $ f --size .hg/cache/generations-v1
+  .hg/cache/generations-v1: size=64
+
+Generation numbers are not written while the wlock is held
+
+  $ rm .hg/cache/generations-v1
+  $ ln -s otherhost:12345 .hg/wlock
+  $ hg log -r '2::' --debug -T '{rev}\n' | grep 'generation numbers'
+  not writing generation numbers: wlock cannot be acquired
+  $ ls .hg/cache | grep generations
+  [1]
+  $ rm .hg/wlock
+  $ hg log -r '2::' -T '{rev} '; echo
+  2 3 4 5 6 7 
+  $ f --size .hg/cache/generations-v1
+  .hg/cache/generations-v1: size=64
+
+  $ cd ..
@@ -799,8 +799,12 @@ Test list of internal help commands
                  description
    debugdata     dump the contents of a data file revision
    debugdate     parse and display a date
+   debugdeltachain
+                 dump information about delta chains in a revlog
    debugdirstate
                  show the contents of the current dirstate
+   debugdirstateformat
+                 show or change the on-disk format of the dirstate
    debugdiscovery
                  runs the changeset discovery protocol in isolation
    debugextensions
@@ -820,6 +824,7 @@ Test list of internal help commands
                  print merge state
    debugnamecomplete
                  complete "names" - tags, open branch names, bookmark names
+   debugnodemap  inspect or rebuild the persistent nodemap of a revlog
    debugobsolete
                  create arbitrary obsolete marker
    debugoptDEP   (no help text available)
@@ -841,6 +846,8 @@ Test list of internal help commands
    debugsub      (no help text available)
    debugsuccessorssets
                  show set of successors for revision
+   debugupgraderepo
+                 re-encode the revlogs of the repository
    debugwalk     show how files match on given patterns
    debugwireargs
                  (no help text available)
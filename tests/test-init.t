@@ -59,6 +59,14 @@ test custom revlog chunk cache sizes
   +this
   
 
+a chunk cache size above the chunk cache budget grows the budget
+
+  $ hg --config format.chunkcachesize=16777216 log -R local -T '{rev}\n'
+  0
+  $ hg --config format.chunkcachesize=16384 \
+  >   --config format.chunkcachebudget=4096 log -R local -T '{rev}\n'
+  0
+
 creating repo with format.usestore=false
 
   $ hg --config format.usestore=false init old
@@ -31,6 +31,11 @@ def test_lrucachedict():
     d['f'] = 'vf'
     printifpresent(d, ['b', 'c', 'd', 'e', 'f'])
 
+    # keys from the least recently used one, peek does not change the order
+    print list(d)
+    print d.peek('c')
+    print list(d)
+
     d.clear()
     printifpresent(d, ['b', 'c', 'd', 'e', 'f'])
 
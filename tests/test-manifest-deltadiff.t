@@ -0,0 +1,90 @@
+Diff of manifests derived from the deltas stored between them
+
+  $ hg init repo
+  $ cd repo
+  $ for i in 0 1 2 3 4 5 6 7 8 9; do echo $i > f$i; done
+  $ mkdir d
+  $ echo d > d/a
+  $ hg commit -qAm 0
+  $ echo 1 >> f1
+  $ hg rm -q f2
+  $ hg commit -qm 1
+  $ echo new > f10
+  $ chmod +x f3
+  $ hg commit -qAm 2
+  $ ln -s f4 link
+  $ echo 5 >> f5
+  $ hg commit -qAm 3
+  $ hg up -q 1
+  $ echo branch >> f9
+  $ echo 2 > f2
+  $ hg commit -qAm 4
+  $ hg rm -q d/a f0
+  $ hg commit -qm 5
+
+  $ cat > $TESTTMP/check.py <<EOF
+  > from mercurial import hg, match as matchmod, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.')
+  > mf = repo.manifest
+  > derived = 0
+  > for r1 in mf:
+  >     for r2 in mf:
+  >         n1, n2 = mf.node(r1), mf.node(r2)
+  >         d = mf.deltadiff(n1, n2)
+  >         if d is None:
+  >             continue
+  >         derived += 1
+  >         expected = mf.read(n1).diff(mf.read(n2))
+  >         assert d == expected, (r1, r2, d, expected)
+  >         m = matchmod.match(repo.root, '', ['glob:f*'])
+  >         expected = dict((f, v) for f, v in expected.iteritems() if m(f))
+  >         assert mf.deltadiff(n1, n2, m) == expected
+  > print 'derived %d diffs out of %d' % (derived, len(mf) * len(mf))
+  > EOF
+
+Without general delta, the deltas between consecutive revisions are used
+
+  $ python $TESTTMP/check.py
+  derived 36 diffs out of 36
+
+With general delta, revisions of the same delta chain
+
+  $ hg clone -q --pull --config format.generaldelta=yes . ../gd
+  $ cd ../gd
+  $ hg debugdeltachain -m -T '{rev} {chainid}\n'
+  0 1
+  1 1
+  2 1
+  3 1
+  4 1
+  5 1
+  $ python $TESTTMP/check.py
+  derived 28 diffs out of 36
+
+Status and copy tracing between stored revisions give the same results
+
+  $ hg status --rev 3 --rev 5
+  M f3
+  M f5
+  M f9
+  A f2
+  R d/a
+  R f0
+  R f10
+  R link
+  $ hg status --rev 3 --rev 5 --config experimental.revlog.hashcheck=none
+  M f3
+  M f5
+  M f9
+  A f2
+  R d/a
+  R f0
+  R f10
+  R link
+  $ hg cp -q f1 copied
+  $ hg commit -qm copy
+  $ hg status --rev 0 --rev 6 -C 'glob:c*'
+  A copied
+    f1
+
+  $ cd ..
@@ -0,0 +1,142 @@
+  $ cat >> $HGRCPATH <<EOF
+  > [experimental]
+  > manifestcache.disksize = 1k
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ echo a > a
+  $ echo b > b
+  $ hg commit -qAm 0
+  $ echo c > c
+  $ hg commit -qAm 1
+
+Reading the manifest of a parent of the working directory stores its fulltext
+in the cache, as the commit of 1 did for 0, reading other manifests does not
+
+  $ ls .hg/cache/manifest
+  d21b1fcf7281e9a3af7120d86bff39d1cc81c5e0
+  $ rm -r .hg/cache/manifest
+  $ hg manifest -r 0
+  a
+  b
+  $ ls .hg/cache/manifest
+  ls: *: No such file or directory (glob)
+  [2]
+  $ hg manifest --debug > /dev/null
+  $ ls .hg/cache/manifest
+  365c3318d7f56e8c26ffd7ad2b5beff776a916b6
+  $ hg update -q 0
+  $ hg manifest
+  a
+  b
+  $ ls .hg/cache/manifest
+  365c3318d7f56e8c26ffd7ad2b5beff776a916b6
+  d21b1fcf7281e9a3af7120d86bff39d1cc81c5e0
+  $ hg update -q 1
+  $ hg log -p -q > /dev/null
+  $ ls .hg/cache/manifest
+  365c3318d7f56e8c26ffd7ad2b5beff776a916b6
+  d21b1fcf7281e9a3af7120d86bff39d1cc81c5e0
+
+Cached fulltexts are used by later processes, without hash checks they are
+trusted as is
+
+  $ cat > $TESTTMP/tamper.py <<EOF
+  > import sys
+  > path = '.hg/cache/manifest/' + sys.argv[1]
+  > data = open(path, 'rb').read()
+  > open(path, 'wb').write(data[:20] + data[20:].replace('a\0', '0\0'))
+  > EOF
+  $ python $TESTTMP/tamper.py d21b1fcf7281e9a3af7120d86bff39d1cc81c5e0
+  $ hg manifest -r 0 --config experimental.revlog.hashcheck=none
+  0
+  b
+
+Damaged entries are detected and dropped
+
+  $ hg manifest -r 0
+  a
+  b
+  $ hg manifest -r 0 --config experimental.revlog.hashcheck=none
+  a
+  b
+
+Entries of stripped revisions are ignored
+
+  $ hg rollback -q
+  $ hg forget c
+  $ rm c
+  $ ls .hg/cache/manifest
+  365c3318d7f56e8c26ffd7ad2b5beff776a916b6
+  $ echo d > d
+  $ hg commit -qAm 1bis
+  $ hg manifest
+  a
+  b
+  d
+
+The least recently used entries are evicted (entries are made older before
+each use, for uses to happen at distinct times)
+
+  $ cat > $TESTTMP/entries.py <<EOF
+  > import os
+  > from mercurial import hg, node, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.')
+  > path = '.hg/cache/manifest'
+  > names = os.listdir(path)
+  > revs = sorted(repo.manifest.rev(node.bin(n)) for n in names)
+  > print 'revisions:', ' '.join(str(r) for r in revs)
+  > print 'size:', sum(os.path.getsize(os.path.join(path, n)) for n in names)
+  > EOF
+  $ cat > $TESTTMP/age.py <<EOF
+  > import os
+  > path = '.hg/cache/manifest'
+  > for n in os.path.isdir(path) and os.listdir(path) or []:
+  >     st = os.stat(os.path.join(path, n))
+  >     os.utime(os.path.join(path, n), (st.st_atime, st.st_mtime - 10))
+  > EOF
+  $ use() {
+  >     python $TESTTMP/age.py
+  >     hg debugsetparents $1
+  >     hg manifest > /dev/null
+  > }
+
+  $ for i in 0 1 2 3 4 5 6 7 8 9; do echo $i > f$i; hg commit -qAm $i; done
+  $ rm -r .hg/cache/manifest
+  $ for r in 0 1 2 3 4 5 6 7 8 9 10 11; do use $r; done
+  $ python $TESTTMP/entries.py
+  revisions: 11
+  size: 589
+  $ use 0
+  $ use 1
+  $ python $TESTTMP/entries.py
+  revisions: 0 1 11
+  size: 844
+
+Using an entry keeps it: 0 is evicted first, not 11
+
+  $ use 11
+  $ use 2
+  $ python $TESTTMP/entries.py
+  revisions: 1 2 11
+  size: 931
+
+Everything stays consistent
+
+  $ hg debugsetparents 11
+  $ hg verify -q
+  $ hg status --rev 0 --rev 11
+  A d
+  A f0
+  A f1
+  A f2
+  A f3
+  A f4
+  A f5
+  A f6
+  A f7
+  A f8
+  A f9
+
+  $ cd ..
@@ -1,4 +1,5 @@
 import binascii
+import hashlib
 import unittest
 import itertools
 
@@ -464,5 +465,84 @@ class testtreemanifest(unittest.TestCase, basemanifesttests):
     def parsemanifest(self, text):
         return manifestmod.treemanifest('', text)
 
+    def storetree(self, store, m):
+        '''store the directories of m as a dir revlog would, return its node'''
+        for subm in m._dirs.values():
+            self.storetree(store, subm)
+        text = m.dirtext()
+        node = hashlib.sha1(m.dir() + text).digest()
+        store[node] = text
+        m.setnode(node)
+        return node
+
+    def readtree(self, store, node, reads, dir=''):
+        '''read a stored tree, recording the directories read in reads'''
+        m = manifestmod.treemanifest(dir)
+        def gettext():
+            reads.append(dir)
+            return store[node]
+        def readsubtree(subdir, subnode):
+            return self.readtree(store, subnode, reads, subdir)
+        m.read(gettext, readsubtree)
+        m.setnode(node)
+        return m
+
+    def testLazyLookup(self):
+        store = {}
+        node = self.storetree(store, self.parsemanifest(A_DEEPER_MANIFEST))
+        reads = []
+        m = self.readtree(store, node, reads)
+        self.assertEqual(BIN_HASH_2, m['a/c/paris.py'])
+        self.assertEqual(['', 'a/', 'a/c/'], reads)
+        self.assertTrue(m.hasdir('a/b'))
+        self.assertEqual(['', 'a/', 'a/c/'], reads)
+        self.assertEqual(18, len(m))
+
+    def testLazyDiff(self):
+        store = {}
+        m1 = self.parsemanifest(A_DEEPER_MANIFEST)
+        m2 = m1.copy()
+        m2['a/c/paris.py'] = BIN_HASH_1
+        node1 = self.storetree(store, m1)
+        node2 = self.storetree(store, m2)
+        reads = []
+        m1 = self.readtree(store, node1, reads)
+        m2 = self.readtree(store, node2, reads)
+        self.assertEqual({'a/c/paris.py': ((BIN_HASH_2, ''), (BIN_HASH_1, ''))},
+                         m1.diff(m2))
+        self.assertEqual(['', '', 'a/', 'a/', 'a/c/', 'a/c/'], reads)
+        self.assertEqual(set(), m1.filesnotin(m2))
+
+    def testLazyMatches(self):
+        store = {}
+        m1 = self.parsemanifest(A_DEEPER_MANIFEST)
+        m2 = m1.copy()
+        m2['a/c/paris.py'] = BIN_HASH_1
+        m2['a/d/apple.py'] = BIN_HASH_1
+        node1 = self.storetree(store, m1)
+        node2 = self.storetree(store, m2)
+        reads = []
+        m1 = self.readtree(store, node1, reads)
+        m2 = self.readtree(store, node2, reads)
+        match = matchmod.match('/', '', ['path:a/c'])
+        mm1 = m1.matches(match)
+        mm2 = m2.matches(match)
+        self.assertEqual(['', 'a/', 'a/c/', '', 'a/', 'a/c/'], reads)
+        self.assertEqual({'a/c/paris.py': ((BIN_HASH_2, ''), (BIN_HASH_1, ''))},
+                         mm1.diff(mm2))
+        self.assertEqual(['a/c/london.py', 'a/c/paper.txt', 'a/c/paris.py'],
+                         list(m1.walk(match)))
+        self.assertEqual(['', 'a/', 'a/c/', '', 'a/', 'a/c/'], reads)
+
+        # fully matched directories keep their node, diff() skips them
+        match = matchmod.match('/', '', ['path:a/c', 'path:a/b'])
+        mm1 = m1.matches(match)
+        mm2 = m2.matches(match)
+        self.assertEqual(m1._dirs['a/']._dirs['b/'].node(),
+                         mm1._dirs['a/']._dirs['b/'].node())
+        del reads[:]
+        mm1.diff(mm2)
+        self.assertEqual([], reads)
+
 if __name__ == '__main__':
     silenttestrunner.main(__name__)
@@ -0,0 +1,124 @@
+  $ cat >> $HGRCPATH <<EOF
+  > [experimental]
+  > metaindex = true
+  > metaindex.descriptions = true
+  > [extensions]
+  > strip =
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ commit() {
+  >     echo $1 >> f
+  >     hg commit -qAm "$2" -u "$3" -d "$4"
+  > }
+  $ commit 0 'Initial import' 'Alice <alice@example.com>' '2015-01-01 10:00 +0100'
+  $ commit 1 'fix BUG in parser' 'bob' '2015-06-01 10:00 -0200'
+  $ commit 2 'parser: speed up' 'Alice <alice@example.com>' '2016-01-01 10:00 +0000'
+  $ commit 3 'multi
+  > line bug description' 'carol' '2016-02-01 10:00 +0000'
+
+The columns are written when transactions close
+
+  $ ls .hg/cache | grep cm-
+  cm-desc-ascii-v1
+  cm-descend-ascii-v1
+  cm-node-v1
+  cm-time-v1
+  cm-tz-v1
+  cm-user-v1
+  cm-users-v1
+  $ tr '\000' '\n' < .hg/cache/cm-users-v1
+  Alice <alice@example.com>
+  bob
+  carol (no-eol)
+  $ tr '\000' '|' < .hg/cache/cm-desc-ascii-v1; echo
+  initial import|fix bug in parser|parser: speed up|multi
+  line bug description|
+
+Revsets use them
+
+  $ revs() {
+  >     hg log -T '{rev} ' -r "$1"; echo
+  >     hg log -T '{rev} ' -r "$1" --config experimental.metaindex=false; echo
+  > }
+  $ revs 'user(alice)'
+  0 2 
+  0 2 
+  $ revs 'author("re:^[bc]")'
+  1 3 
+  1 3 
+  $ revs 'date(2015)'
+  0 1 
+  0 1 
+  $ revs 'date(">2015-12-31")'
+  2 3 
+  2 3 
+  $ revs 'desc(bug)'
+  1 3 
+  1 3 
+  $ revs 'desc("")'
+  0 1 2 3 
+  0 1 2 3 
+  $ revs 'keyword(PARSER)'
+  1 2 
+  1 2 
+  $ revs 'keyword(carol)'
+  3 
+  3 
+  $ revs 'keyword(f)'
+  0 1 2 3 
+  0 1 2 3 
+
+Descriptions are indexed once enabled
+
+  $ rm .hg/cache/cm-desc*
+  $ hg log -T '{rev} ' -r 'desc(parser)' \
+  >     --config experimental.metaindex.descriptions=false; echo
+  1 2 
+  $ ls .hg/cache | grep -c cm-desc
+  0
+  [1]
+  $ revs 'desc(parser)'
+  1 2 
+  1 2 
+  $ ls .hg/cache | grep -c cm-desc
+  2
+
+Values of stripped revisions are dropped
+
+  $ hg strip -q 2 --config experimental.metaindex=false
+  $ commit 4 'new parser' 'dave' '2017-01-01 10:00 +0000'
+  $ revs 'user(dave) or date(2017) or desc(new)'
+  2 
+  2 
+  $ revs 'desc(bug)'
+  1 
+  1 
+  $ tr '\000' '|' < .hg/cache/cm-desc-ascii-v1; echo
+  initial import|fix bug in parser|new parser|
+
+A damaged index is ignored
+
+  $ echo garbage > .hg/cache/cm-users-v1
+  $ revs 'user(dave)'
+  2 
+  2 
+
+The index is not written while the wlock is held
+
+  $ rm .hg/cache/cm-*
+  $ ln -s otherhost:12345 .hg/wlock
+  $ hg log -r 'user(dave)' --debug -T '{rev}\n' | grep 'metadata index'
+  couldn't read changeset metadata index: * (glob)
+  not writing changeset metadata index: wlock cannot be acquired
+  $ ls .hg/cache | grep cm-
+  [1]
+  $ rm .hg/wlock
+  $ revs 'user(dave)'
+  2 
+  2 
+  $ ls .hg/cache | grep -c cm-
+  7
+
+  $ cd ..
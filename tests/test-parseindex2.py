@@ -5,10 +5,21 @@ It also checks certain aspects of the parsers module as a whole.
 
 from mercurial import parsers
 from mercurial.node import nullid, nullrev
+import imp
+import os
 import struct
 import subprocess
 import sys
 
+try:
+    from mercurial.pure import parsers as pureparsers
+except ImportError:
+    # installations do not ship mercurial.pure, use the source tree
+    pureparsers = imp.load_source('pureparsers',
+                                  os.path.join(os.environ['TESTDIR'], '..',
+                                               'mercurial', 'pure',
+                                               'parsers.py'))
+
 # original python implementation
 def gettype(q):
     return int(q & 0xFFFF)
@@ -187,6 +198,23 @@ def runtest() :
     if py_res_2 != c_res_2:
         print "Parse index result (no inlined data) differs!"
 
+    # Index data may also come from a buffer (e.g. over a mmapped file)
+    if parse_index2(buffer(data_non_inlined), False) != py_res_2:
+        print "Parse index result (buffer, no inlined data) differs!"
+
+    # The pure Python implementation decodes entries lazily
+    for data, inline, py_res in ((data_inlined, True, py_res_1),
+                                 (data_non_inlined, False, py_res_2)):
+        index, cache = pureparsers.parse_index2(data, inline)
+        if (list(index), cache) != py_res:
+            print "Pure parse index result (inline=%s) differs!" % inline
+        index.insert(-1, py_res[0][0])
+        if index[-2] != py_res[0][0] or len(index) != len(py_res[0]) + 1:
+            print "Pure index insertion failed (inline=%s)!" % inline
+        del index[1:-1]
+        if list(index) != [py_res[0][0], py_res[0][-1]]:
+            print "Pure index truncation failed (inline=%s)!" % inline
+
     ix = parsers.parse_index2(data_inlined, True)[0]
     for i, r in enumerate(ix):
         if r[7] == nullid:
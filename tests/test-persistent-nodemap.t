@@ -0,0 +1,160 @@
+Persistent nodemap
+
+  $ cat >> $HGRCPATH << EOF
+  > [experimental]
+  > persistent-nodemap = yes
+  > [extensions]
+  > strip =
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ hg debugnodemap
+  no valid persistent nodemap for 00changelog.i
+  [1]
+
+The nodemap is created and updated when revisions are added
+
+  $ for i in 1 2 3 4 5; do echo $i > a; hg ci -qAm $i; done
+  $ ls .hg/store/00changelog.n* .hg/store/00manifest.n*
+  .hg/store/00changelog.n
+  .hg/store/00changelog.nd
+  .hg/store/00manifest.n
+  .hg/store/00manifest.nd
+  $ hg debugnodemap
+  tip revision: 4
+  tip node: fb2eeb8fc2d2c6c7b6bf8989d0d86387a958da82
+  data length: 320
+  unused data: 256
+  revisions not covered: 0
+  $ hg debugnodemap --check
+  persistent nodemap of 00changelog.i is valid
+  $ hg debugnodemap --check -m
+  persistent nodemap of 00manifest.i is valid
+  $ hg debugnodemap --dump
+  f 4
+  e 0
+  d 1
+  6 3
+  3 2
+
+It is used to look nodes up
+
+  $ hg log -r fb2e -T '{rev}\n'
+  4
+  $ hg log -r fb2eeb8fc2d2c6c7b6bf8989d0d86387a958da82 -T '{rev}\n'
+  4
+  $ hg log -r 'd' -T '{rev}\n'
+  1
+  $ hg log -r 'fb2f' -T '{rev}\n'
+  abort: unknown revision 'fb2f'!
+  [255]
+  $ hg log -r 'ffff' -T '{rev}\n'
+  abort: unknown revision 'ffff'!
+  [255]
+  $ hg log -r 'fb2eeb8fc2d2c6c7b6bf8989d0d86387a958da83' -T '{rev}\n'
+  abort: unknown revision 'fb2eeb8fc2d2c6c7b6bf8989d0d86387a958da83'!
+  [255]
+
+Revisions added without maintaining the nodemap are still found
+
+  $ echo 6 > a
+  $ hg ci -qm 6 --config experimental.persistent-nodemap=no
+  $ hg debugnodemap | grep covered
+  revisions not covered: 1
+  $ hg log -r tip -T '{node}\n'
+  dd1971fdc9a07f824789de490075464f3d778364
+  $ hg log -r dd19 -T '{rev}\n'
+  5
+  $ hg log -r d -T '{rev}\n'
+  abort: 00changelog.i@d: ambiguous identifier!
+  [255]
+
+Rollback and strip restore a consistent nodemap
+
+  $ echo 7 > a
+  $ hg ci -qm 7
+  $ hg debugnodemap | grep tip
+  tip revision: 6
+  tip node: * (glob)
+  $ hg rollback -q
+  $ hg debugnodemap | grep tip
+  tip revision: 4
+  tip node: fb2eeb8fc2d2c6c7b6bf8989d0d86387a958da82
+  $ hg debugnodemap --check
+  persistent nodemap of 00changelog.i is valid
+  $ hg up -qC .
+  $ hg strip -q -r 3
+  $ hg debugnodemap
+  tip revision: 2
+  tip node: * (glob)
+  data length: * (glob)
+  unused data: 0
+  revisions not covered: 0
+  $ hg debugnodemap --check
+  persistent nodemap of 00changelog.i is valid
+  $ hg log -r fb2e
+  abort: unknown revision 'fb2e'!
+  [255]
+
+The nodemap can be rebuilt from scratch
+
+  $ rm .hg/store/00changelog.nd
+  $ hg debugnodemap
+  no valid persistent nodemap for 00changelog.i
+  [1]
+  $ hg debugnodemap --rebuild
+  tip revision: 2
+  tip node: * (glob)
+  data length: * (glob)
+  unused data: 0
+  revisions not covered: 0
+  $ hg debugnodemap --check
+  persistent nodemap of 00changelog.i is valid
+
+  $ cd ..
+
+Once the lookups cost more than indexing all the nodes, the node tree of the
+index answers them instead
+
+  $ hg init large
+  $ cd large
+  $ hg debugbuilddag '+300'
+  $ cat > $TESTTMP/lookups.py << EOF
+  > from mercurial import hg, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.')
+  > cl = repo.changelog
+  > for r in (299, 0, 150, 42):
+  >     node = cl.node(r)
+  >     print r, cl.rev(node), cl._persistentnodemap is not None
+  > print cl.rev(cl.node(299))
+  > EOF
+  $ python $TESTTMP/lookups.py
+  299 299 True
+  0 0 True
+  150 150 True
+  42 42 False
+  299
+  $ cd ..
+
+With the pure python parsers, the nodemap of the revlog still holds every node
+after lookups answered by the persistent nodemap
+
+  $ cd large
+  $ cat > $TESTTMP/purenodemap.py << EOF
+  > import imp
+  > from mercurial import hg, parsers, ui as uimod
+  > pureparsers = imp.load_source('pureparsers',
+  >                               '$TESTDIR/../mercurial/pure/parsers.py')
+  > parsers.parse_index2 = pureparsers.parse_index2
+  > repo = hg.repository(uimod.ui(), '.')
+  > cl = repo.changelog
+  > print cl.rev(cl.node(0)), cl._persistentnodemap is not None
+  > print len(cl.nodemap), cl.node(150) in cl.nodemap
+  > print cl.rev(cl.node(42)), cl._persistentnodemap is not None
+  > EOF
+  $ python $TESTTMP/purenodemap.py
+  0 True
+  301 True
+  42 False
+  $ cd ..
@@ -0,0 +1,129 @@
+A new repository uses zlib storage, which doesn't need a requirement
+
+  $ hg init default
+  $ cd default
+  $ cat .hg/requires
+  dotencode
+  fncache
+  revlogv1
+  store
+
+  $ touch foo
+  $ hg -q commit -A -m 'initial commit with a lot of repeated repeated repeated text to trigger compression'
+  $ hg debugrevlog -c | grep 0x78
+      0x78 (x)  :   1 (100.00%)
+      0x78 (x)  : 110 (100.00%)
+
+  $ cd ..
+
+Unknown compression engine to format.compression aborts
+
+  $ hg --config experimental.format.compression=unknown init unknown
+  abort: compression engine unknown defined by experimental.format.compression not available
+  [255]
+
+A requirement specifying an unknown compression engine results in bail
+
+  $ hg init unknownrequirement
+  $ cd unknownrequirement
+  $ echo exp-compression-unknown >> .hg/requires
+  $ hg log
+  abort: repository requires features unknown to this Mercurial: exp-compression-unknown!
+  (see https://mercurial-scm.org/wiki/MissingRequirement for more information)
+  [255]
+
+  $ cd ..
+
+bz2 storage is selected at creation time and recorded as a requirement
+
+  $ hg --config experimental.format.compression=bz2 init bz2
+  $ cd bz2
+  $ cat .hg/requires
+  dotencode
+  exp-compression-bz2
+  fncache
+  revlogv1
+  store
+
+  $ python -c 'for x in range(500): print "line %d" % x' > a
+  $ hg -q commit -A -m 'initial commit with a lot of repeated repeated repeated text to trigger compression'
+  $ hg debugrevlog -c | grep 0x42
+      0x42 (B)  :   1 (100.00%)
+      0x42 (B)  : 135 (100.00%)
+  $ hg debugrevlog a | grep 0x42
+      0x42 (B)  :   1 (100.00%)
+      0x42 (B)  : 570 (100.00%)
+
+The compression level can be configured
+
+  $ echo b >> a
+  $ hg -q commit -m b --config experimental.format.compression.level=1
+  $ hg verify -q
+  $ cd ..
+
+Chunks hold the header of their compression engine, so a revlog can mix
+engines
+
+  $ cd default
+  $ python -c 'for x in range(500): print "line %d" % x' > a
+  $ hg -q commit -A -m a
+  $ echo exp-compression-bz2 >> .hg/requires
+  $ python -c 'for x in range(500): print "other %d" % x' >> a
+  $ hg -q commit -m 'bz2 commit'
+  $ hg debugrevlog a | egrep '\((x|B)\)'
+      0x42 (B)  :    1 (50.00%)
+      0x78 (x)  :    1 (50.00%)
+      0x42 (B)  :  613 (38.51%)
+      0x78 (x)  :  979 (61.49%)
+  $ hg verify -q
+  $ hg cat a | tail -1
+  other 499
+
+  $ cd ..
+
+Bundles can be compressed with any engine supporting them
+
+  $ hg -R bz2 bundle -q -a -t gzip-v2 bundle.hg
+  $ hg debugbundle bundle.hg | head -2
+  Stream params: {'Compression': 'GZ'}
+  changegroup -- "{'version': '02'}"
+  $ hg -R bz2 bundle -q -a -t unknown-v2 bundle.hg
+  abort: unknown compression is not supported
+  (see "hg help bundle" for supported values for --type)
+  [255]
+
+The perf command compares the engines on the data of a revlog
+
+  $ hg -R bz2 --config extensions.perf=$TESTDIR/../contrib/perf.py \
+  >   --config perf.presleep=0 perfrevlogcompression a -e zlib,bz2 2>&1 \
+  >   | grep -v wall
+  ! compress zlib
+  ! decompress zlib
+  ! zlib: * bytes (*%) (glob)
+  ! compress bz2
+  ! decompress bz2
+  ! bz2: * bytes (*%) (glob)
+
+#if serve
+
+Servers advertise the engines they may compress responses with, and use
+the first one the client supports
+
+  $ hg -R bz2 serve -p $HGPORT -d --pid-file=hg.pid \
+  >   --config server.compressionengines=bz2,zlib
+  $ cat hg.pid >> $DAEMON_PIDS
+  $ hg clone --debug http://localhost:$HGPORT/ clonezlib | grep -i 'compress'
+  response compressed with zlib
+  $ hg clone --debug http://localhost:$HGPORT/ clonebz2 \
+  >   --config experimental.clientcompressionengines=bz2 | grep -i 'compress'
+  response compressed with bzip2
+  $ hg -R clonebz2 verify -q
+
+Unknown engines in the configuration abort
+
+  $ hg clone http://localhost:$HGPORT/ cloneunknown \
+  >   --config experimental.clientcompressionengines=unknown
+  abort: invalid compression engine defined in experimental.clientcompressionengines: unknown
+  [255]
+
+#endif
@@ -0,0 +1,56 @@
+from mercurial import revlog
+
+def printstate(c):
+    print 'segments: %r' % [(o, len(d)) for o, d in c._segments]
+    print 'size: %d' % c.size
+
+def lookup(c, offset, length):
+    seg = c.lookup(offset, length)
+    if seg is None:
+        print 'lookup(%d, %d): miss' % (offset, length)
+    else:
+        print 'lookup(%d, %d): hit segment at %d' % (offset, length, seg[0])
+
+def test_chunkcache():
+    c = revlog.chunkcache(30)
+    c.add(0, 'a' * 10)
+    c.add(100, 'b' * 10)
+    c.add(200, 'c' * 10)
+    printstate(c)
+
+    # ranges must be fully covered by a single segment
+    lookup(c, 0, 10)
+    lookup(c, 105, 5)
+    lookup(c, 105, 6)
+    lookup(c, 50, 1)
+
+    # 100 is now the least recently used segment
+    c.add(300, 'd' * 10)
+    printstate(c)
+
+    # sequential reads extend the most recent segment
+    c.add(310, 'e' * 10)
+    printstate(c)
+    lookup(c, 305, 10)
+
+    # a range is found in an earlier segment overlapping the closest one
+    c.add(305, 'g' * 5)
+    printstate(c)
+    lookup(c, 310, 8)
+    lookup(c, 306, 15)
+
+    # a segment read again at the same offset replaces the previous one
+    c.add(305, 'h' * 10)
+    printstate(c)
+    lookup(c, 306, 8)
+
+    # a segment larger than the budget is kept on its own
+    c.add(1000, 'f' * 50)
+    printstate(c)
+
+    print sorted(c.stats().items())
+    c.clear()
+    printstate(c)
+
+if __name__ == '__main__':
+    test_chunkcache()
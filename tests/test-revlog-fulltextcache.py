@@ -0,0 +1,48 @@
+import os
+from mercurial import hg, ui
+
+u = ui.ui()
+u.setconfig('format', 'fulltextcachesize', '2k')
+
+repo = hg.repository(u, 'test1', create=1)
+os.chdir('test1')
+
+def commit(n):
+    f = open('f', 'w')
+    f.write(''.join('line %d\n' % i for i in xrange(50)))
+    f.write('version %d\n' % n)
+    f.close()
+    if n == 1:
+        repo[None].add(['f'])
+    repo.commit(text='%d lines' % n, date='%d 0' % n)
+
+def printstats(fl):
+    stats = fl._fulltextcache.stats()
+    print 'entries: %d, hits: %d, misses: %d' % (stats['entries'],
+                                                 stats['hits'],
+                                                 stats['misses'])
+
+if __name__ == '__main__':
+    for n in xrange(1, 11):
+        commit(n)
+
+    fl = hg.repository(u, '.').file('f')
+    printstats(fl)
+
+    # reading a revision caches its text
+    text = fl.revision(4)
+    print text.splitlines()[-1]
+    printstats(fl)
+
+    # later revisions start their chain from the cached text
+    for r in (7, 8, 4):
+        fl._cache = None
+        print fl.revision(r).splitlines()[-1]
+        printstats(fl)
+
+    # texts larger than the budget are not cached
+    fl._fulltextcache.maxbytes = 50
+    fl._fulltextcache.clear()
+    fl._cache = None
+    print fl.revision(9).splitlines()[-1]
+    printstats(fl)
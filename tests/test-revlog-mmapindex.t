@@ -0,0 +1,60 @@
+Memory-mapped revlog indexes
+
+  $ hg init repo
+  $ cd repo
+  $ python -c "
+  > import random
+  > r = random.Random(0)
+  > open('big', 'wb').write(''.join(chr(r.randint(0, 255))
+  >                                 for x in xrange(200000)))
+  > "
+  $ echo 0 > small
+  $ hg ci -qAm 0
+  $ python -c "open('big', 'ab').write('more data')"
+  $ echo 1 > small
+  $ hg ci -qm 1
+
+The data of the big file is not inline, only its index can be mapped:
+
+  $ ls .hg/store/data | sort
+  big.d
+  big.i
+  small.i
+
+  $ cat > $TESTTMP/showindex.py << EOF
+  > from mercurial import cmdutil
+  > cmdtable = {}
+  > command = cmdutil.command(cmdtable)
+  > @command('showindex', [], 'FILE')
+  > def showindex(ui, repo, f):
+  >     fl = repo.file(f)
+  >     ui.write('%s: %d revisions, mapped: %s\n'
+  >              % (f, len(fl), fl._readindex(fl.opener(fl.indexfile))
+  >                 .__class__.__name__ == 'buffer'))
+  > EOF
+  $ hg showindex big --config extensions.showindex=$TESTTMP/showindex.py
+  big: 2 revisions, mapped: False
+  $ hg showindex big --config extensions.showindex=$TESTTMP/showindex.py \
+  >   --config experimental.mmapindexthreshold=1
+  big: 2 revisions, mapped: True
+  $ hg showindex big --config extensions.showindex=$TESTTMP/showindex.py \
+  >   --config experimental.mmapindexthreshold=1k
+  big: 2 revisions, mapped: False
+  $ hg showindex small --config extensions.showindex=$TESTTMP/showindex.py \
+  >   --config experimental.mmapindexthreshold=1
+  small: 2 revisions, mapped: False
+
+Reading and writing through a mapped index works:
+
+  $ hg verify -q --config experimental.mmapindexthreshold=1
+  $ python -c "open('big', 'ab').write('even more data')"
+  $ hg ci -qm 2 --config experimental.mmapindexthreshold=1
+  $ hg log -r 'file(big)' -T '{rev}\n' --config experimental.mmapindexthreshold=1
+  0
+  1
+  2
+  $ hg cat -r 1 big --config experimental.mmapindexthreshold=1 | wc -c
+  \s*200009 (re)
+  $ hg strip -q --config extensions.strip= -r 2 \
+  >   --config experimental.mmapindexthreshold=1
+  $ hg verify -q --config experimental.mmapindexthreshold=1
@@ -0,0 +1,84 @@
+import cStringIO
+import os
+from mercurial import hg, ui, merge
+
+u = ui.ui()
+u.setconfig('format', 'generaldelta', 'yes')
+u.setconfig('format', 'maxchainlen', '4')
+
+repo = hg.repository(u, 'test1', create=1)
+os.chdir('test1')
+
+def commit(n):
+    f = open('f', 'w')
+    f.write(''.join('line %d\n' % i for i in xrange(50)))
+    f.write('version %d\n' % n)
+    f.close()
+    if n == 1:
+        repo[None].add(['f'])
+    repo.commit(text='%d lines' % n, date='%d 0' % n)
+
+def check(rl, revs):
+    texts = list(rl.revisions(revs))
+    rl._cache = None
+    rl._chunkclear()
+    expected = [rl.revision(rl.node(r)) for r in revs]
+    rl._cache = None
+    rl._chunkclear()
+    print revs, texts == expected
+
+if __name__ == '__main__':
+    # two branches sharing the beginning of their delta chains
+    for n in xrange(1, 9):
+        commit(n)
+        if n == 4:
+            merge.update(repo, 2, False, True, False)
+
+    fl = hg.repository(u, '.').file('f')
+    print 'delta parents:', [fl.deltaparent(r) for r in fl]
+
+    check(fl, [])
+    check(fl, list(fl))
+    check(fl, [7, 3, 6, 0])
+    check(fl, [5, 5, 7, 5])
+    check(fl, [-1, 4, -1])
+
+    # chunks are read once for all the chains
+    misses = fl._chunkcache.stats()['misses']
+    texts = list(fl.revisions([7, 6, 5]))
+    print 'chunk cache misses:', fl._chunkcache.stats()['misses'] - misses
+    print [t.splitlines()[-1] for t in texts]
+
+    # changegroup generation and verify restore the file texts together,
+    # without reading them one by one
+    from mercurial import changegroup, discovery, revlog, verify
+    reads = []
+    origrevision = revlog.revlog.revision
+    def revision(self, nodeorrev, *args, **kwargs):
+        cache = self._cache
+        if (self.indexfile == 'data/f.i'
+            and not (cache and nodeorrev in cache[:2])):
+            reads.append(nodeorrev)
+        return origrevision(self, nodeorrev, *args, **kwargs)
+    revlog.revlog.revision = revision
+    repo = hg.repository(u, '.')
+    outgoing = discovery.outgoing(repo.changelog, [], repo.heads())
+    for version in ('01', '02'):
+        del reads[:]
+        packer, unpacker = changegroup.packermap[version]
+        data = ''.join(changegroup.getsubsetraw(repo, outgoing, packer(repo),
+                                                'bundle'))
+        print version, 'changegroup single reads:', len(reads)
+        other = hg.repository(u, '../test-%s' % version, create=1)
+        lock = other.lock()
+        try:
+            unpacker(cStringIO.StringIO(data), None).apply(other, 'unbundle',
+                                                      'bundle:')
+        finally:
+            lock.release()
+        otherfl = other.file('f')
+        print 'same texts:', ([otherfl.revision(r) for r in otherfl] ==
+                              [fl.revision(r) for r in fl])
+        del reads[:]
+        verify.verify(other)
+        print 'verify single reads:', len(reads)
@@ -0,0 +1,45 @@
+from mercurial import revlog
+
+class fakerevlog(object):
+    _srdensitythreshold = 0.5
+    _srmingapsize = 10
+
+    def __init__(self, chunks):
+        # list of (start, length) for each revision
+        self._chunks = chunks
+
+    def start(self, rev):
+        return self._chunks[rev][0]
+
+    def length(self, rev):
+        return self._chunks[rev][1]
+
+def slicing(rl, revs):
+    print '%r -> %r' % (revs, list(revlog._slicechunk(rl, revs)))
+
+def test_slicechunk():
+    rl = fakerevlog([(0, 10), (10, 10), (20, 10), (1000, 10), (1010, 10),
+                     (1020, 5), (1025, 100), (5000, 10)])
+
+    # a single revision is never sliced
+    slicing(rl, [0])
+    # dense spans are read at once
+    slicing(rl, [0, 1, 2])
+    slicing(rl, [3, 4, 5, 6])
+    # the largest holes are skipped first
+    slicing(rl, [0, 1, 2, 3, 4, 7])
+    slicing(rl, [0, 3, 6, 7])
+    # only as many holes as needed are skipped
+    slicing(rl, [3, 6, 7])
+
+    # holes smaller than the minimal gap size are never skipped
+    rl._srmingapsize = 4000
+    slicing(rl, [0, 1, 2, 3, 4, 7])
+
+    # no slicing when the density is good enough
+    rl._srmingapsize = 10
+    rl._srdensitythreshold = 0.01
+    slicing(rl, [0, 6, 7])
+
+if __name__ == '__main__':
+    test_slicechunk()
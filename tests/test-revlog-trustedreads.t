@@ -0,0 +1,126 @@
+Trusted reads skip or sample the hash check of the revisions read
+
+  $ hg init repo
+  $ cd repo
+  $ echo 'original content of a' > a
+  $ hg commit -qAm a
+
+Damage the text of the file revision without changing its size
+
+  $ python - <<EOF
+  > path = '.hg/store/data/a.i'
+  > data = open(path, 'rb').read()
+  > data = data.replace('original', 'tampered')
+  > open(path, 'wb').write(data)
+  > EOF
+
+By default, every hash is checked
+
+  $ hg cat a
+  abort: integrity check failed on data/a.i:0!
+  [255]
+
+Without hash checks, the damaged text is read
+
+  $ hg cat a --config experimental.revlog.hashcheck=none
+  tampered content of a
+
+When sampling, the first text read is checked
+
+  $ hg cat a --config experimental.revlog.hashcheck=sample
+  abort: integrity check failed on data/a.i:0!
+  [255]
+
+Verify checks every hash whatever the configuration
+
+  $ hg verify --config experimental.revlog.hashcheck=none
+  checking changesets
+  checking manifests
+  crosschecking files in changesets and manifests
+  checking files
+   a@0: unpacking 419b0c1bf68b: integrity check failed on data/a.i:0
+  1 files, 1 changesets, 1 total revisions
+  1 integrity errors encountered!
+  (first damaged changeset appears to be 0)
+  [1]
+
+Invalid configurations are refused
+
+  $ hg cat a --config experimental.revlog.hashcheck=some
+  abort: unknown revlog hash check mode 'some'!
+  [255]
+  $ hg cat a --config experimental.revlog.hashcheck=sample \
+  >   --config experimental.revlog.hashcheck.samplerate=0
+  abort: revlog hash check sample rate 0 is not greater than 0!
+  [255]
+
+  $ cd ..
+
+Counters of the checked and skipped hashes
+
+  $ hg init counters
+  $ cd counters
+  $ for i in 0 1 2 3 4 5 6 7; do echo $i > a; hg commit -qAm $i; done
+  $ cat > count.py <<EOF
+  > from mercurial import hg, revlog, ui as uimod
+  > for mode in ('all', 'sample', 'none'):
+  >     ui = uimod.ui()
+  >     ui.setconfig('experimental', 'revlog.hashcheck', mode)
+  >     ui.setconfig('experimental', 'revlog.hashcheck.samplerate', '3')
+  >     repo = hg.repository(ui, '.')
+  >     fl = repo.file('a')
+  >     revlog.hashcheckstats.update(checked=0, skipped=0)
+  >     for rev in fl:
+  >         fl.revision(rev)
+  >     print mode, sorted(revlog.hashcheckstats.items())
+  > EOF
+  $ python count.py
+  all [('checked', 8), ('skipped', 0)]
+  sample [('checked', 3), ('skipped', 5)]
+  none [('checked', 0), ('skipped', 8)]
+
+Verifying checks every hash, including the ones of texts cached by reads
+which skipped their check, and leaves the trusted read mode alone, a read can
+skip the check without changing the mode of its revlog
+
+  $ cat > restore.py <<EOF
+  > from mercurial import hg, revlog, ui as uimod, verify
+  > ui = uimod.ui()
+  > ui.setconfig('experimental', 'revlog.hashcheck', 'none')
+  > ui.setconfig('experimental', 'revlog.fulltextcachesize', '1M')
+  > repo = hg.repository(ui, '.')
+  > cl = repo.changelog
+  > for rev in cl:
+  >     cl.revision(rev)
+  > revlog.hashcheckstats.update(checked=0, skipped=0)
+  > verify.verify(repo)
+  > print sorted(revlog.hashcheckstats.items())
+  > print repo.svfs.options['hashcheck'], repo.changelog._hashcheck
+  > fl = repo.file('a')
+  > fl._hashcheck = 'all'
+  > fl.revision(3, _hashcheck='none')
+  > print fl._hashcheck, revlog.hashcheckstats['skipped']
+  > EOF
+  $ python restore.py
+  checking changesets
+  checking manifests
+  crosschecking files in changesets and manifests
+  checking files
+  1 files, 8 changesets, 8 total revisions
+  [('checked', 24), ('skipped', 0)]
+  none none
+  all 1
+
+Serving a changegroup skips the checks, the client checks every hash
+
+  $ cat >> .hg/hgrc <<EOF
+  > [extensions]
+  > blackbox =
+  > EOF
+  $ hg -q clone --pull ssh://user@dummy/counters ../clone \
+  >   -e "python \"$TESTDIR/dummyssh\""
+  $ grep 'revision hash checks' .hg/blackbox.log | sed 's/^.*> //'
+  skipped 24 revision hash checks
+  $ hg -R ../clone verify -q
+
+  $ cd ..
@@ -1005,7 +1005,7 @@ test that `or` operation skips duplicated revisions from right-hand side
   * set:
   <addset
     <baseset- [1, 3, 5]>,
-    <generatorset+>>
+    <lazybitmapset+>>
   5
   3
   1
@@ -1026,7 +1026,7 @@ test that `or` operation skips duplicated revisions from right-hand side
           ('symbol', '5')))))
   * set:
   <addset+
-    <generatorset+>,
+    <lazybitmapset+>,
     <baseset- [1, 3, 5]>>
   0
   1
@@ -2183,3 +2183,191 @@ test error message of bad revset
   [255]
 
   $ cd ..
+
+dense sets of revisions are held in bitmaps
+
+  $ hg init bitmaps
+  $ cd bitmaps
+  $ hg debugbuilddag '+4 *2 +7'
+  $ hg phase -p 5
+  $ hg phase -fs 10:
+  $ try 'public()'
+  invalid branchheads cache (served): tip differs
+  (func
+    ('symbol', 'public')
+    None)
+  * set:
+  <bitmapset+ [0, 1, 2, 4, 5]>
+  0
+  1
+  2
+  4
+  5
+  $ try 'not public()'
+  (not
+    (func
+      ('symbol', 'public')
+      None))
+  * set:
+  <bitmapset+ [3, 6, 7, 8, 9, 10, 11]>
+  3
+  6
+  7
+  8
+  9
+  10
+  11
+  $ try 'reverse(draft()) and 2:8'
+  (and
+    (func
+      ('symbol', 'reverse')
+      (func
+        ('symbol', 'draft')
+        None))
+    (range
+      ('symbol', '2')
+      ('symbol', '8')))
+  * set:
+  <bitmapset+ [3, 6, 7, 8]>
+  3
+  6
+  7
+  8
+  $ try 'draft() - ::8'
+  (minus
+    (func
+      ('symbol', 'draft')
+      None)
+    (dagrangepre
+      ('symbol', '8')))
+  * set:
+  <filteredset
+    <bitmapset+ [3, 6, 7, 8, 9]>>
+  3
+  9
+  $ try 'public() or draft()'
+  (or
+    (func
+      ('symbol', 'public')
+      None)
+    (func
+      ('symbol', 'draft')
+      None))
+  * set:
+  <addset
+    <bitmapset+ [0, 1, 2, 4, 5]>,
+    <bitmapset+ [3, 6, 7, 8, 9]>>
+  0
+  1
+  2
+  4
+  5
+  3
+  6
+  7
+  8
+  9
+  $ try 'draft() or public()'
+  (or
+    (func
+      ('symbol', 'draft')
+      None)
+    (func
+      ('symbol', 'public')
+      None))
+  * set:
+  <addset
+    <bitmapset+ [3, 6, 7, 8, 9]>,
+    <bitmapset+ [0, 1, 2, 4, 5]>>
+  3
+  6
+  7
+  8
+  9
+  0
+  1
+  2
+  4
+  5
+  $ try 'public() or secret()'
+  (or
+    (func
+      ('symbol', 'public')
+      None)
+    (func
+      ('symbol', 'secret')
+      None))
+  * set:
+  <bitmapset+ [0, 1, 2, 4, 5, 10, 11]>
+  0
+  1
+  2
+  4
+  5
+  10
+  11
+  $ try 'last(::9 - public(), 2)'
+  (func
+    ('symbol', 'last')
+    (list
+      (minus
+        (dagrangepre
+          ('symbol', '9'))
+        (func
+          ('symbol', 'public')
+          None))
+      ('symbol', '2')))
+  * set:
+  <baseset [9, 8]>
+  9
+  8
+  $ log '::10 and secret()'
+  10
+  $ log '::11 and not draft()'
+  0
+  1
+  2
+  4
+  5
+  10
+  11
+
+hidden revisions are left out
+
+  $ cat >> $HGRCPATH << EOF
+  > [experimental]
+  > evolution=createmarkers
+  > EOF
+  $ hg debugobsolete `hg log -r 11 -T '{node}'`
+  $ try 'not public()'
+  invalid branchheads cache (visible): tip differs
+  (not
+    (func
+      ('symbol', 'public')
+      None))
+  * set:
+  <bitmapset+ [3, 6, 7, 8, 9, 10]>
+  3
+  6
+  7
+  8
+  9
+  10
+  $ try 'secret()'
+  (func
+    ('symbol', 'secret')
+    None)
+  * set:
+  <bitmapset+ [10]>
+  10
+  $ hg log -T '{rev}\n' -r 'all() - ::3' --hidden
+  4
+  5
+  6
+  7
+  8
+  9
+  10
+  11
+
+  $ cd ..
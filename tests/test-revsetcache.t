@@ -0,0 +1,183 @@
+  $ cat >> $HGRCPATH << EOF
+  > [extensions]
+  > perf = $TESTDIR/../contrib/perf.py
+  > [perf]
+  > presleep = 0
+  > [experimental]
+  > revsetcache = True
+  > evolution = createmarkers
+  > EOF
+
+  $ revs() {
+  >   hg log -T '{rev} ' -r "$@"; echo
+  > }
+  $ misses() {
+  >   hg perfrevset "$@" 2>&1 | grep 'revset cache'
+  > }
+
+  $ hg init repo
+  $ cd repo
+  $ hg debugbuilddag '+5 *2 +3'
+  $ hg phase -p 2
+  $ hg up -q 4
+
+results are cached
+
+  $ revs 'draft() and ::.'
+  3 4 
+  $ ls .hg/cache/revsets-v1
+  .hg/cache/revsets-v1
+  $ misses 'draft() and ::.'
+  revset cache: * hits, 0 misses (glob)
+  $ revs 'head() and branch(default)'
+  8 4 
+  $ revs 'reverse(draft() and ::.)'
+  4 3 
+  $ revs 'draft() and ::.'
+  3 4 
+
+the same expression written differently shares the result
+
+  $ misses '(draft() and (::.))'
+  revset cache: * hits, 0 misses (glob)
+
+until the repository changes
+
+  $ hg phase -p 3
+  $ misses 'draft() and ::.'
+  revset cache: * hits, 1 misses (glob)
+  $ revs 'draft() and ::.'
+  4 
+  $ hg up -q 7
+  $ revs 'draft() and ::.'
+  5 6 7 
+
+results are still there when the repository comes back to the same state
+
+  $ hg up -q 4
+  $ misses 'draft() and ::.'
+  revset cache: * hits, 0 misses (glob)
+
+  $ revs 'bookmark()'
+  
+  $ hg bookmark -r 2 book
+  $ revs 'bookmark()'
+  2 
+  $ hg debugobsolete `hg log -r 8 -T '{node}'`
+  $ revs 'head() and branch(default)'
+  4 7 
+  $ revs 'head() and branch(default)' --hidden
+  8 4 
+  $ echo a > a
+  $ hg ci -qAm a
+  $ revs 'head() and branch(default)'
+  9 7 
+
+revsets depending on something else are not cached
+
+  $ misses 'date("<2000-1-1")'
+  revset cache: 0 hits, 0 misses
+  $ misses 'file("set:clean()")'
+  revset cache: 0 hits, 0 misses
+
+nor are file patterns, relative to the current directory
+
+  $ mkdir dir
+  $ echo b > dir/a
+  $ hg ci -qAm b
+  $ revs 'file(a)'
+  9 
+  $ cd dir
+  $ revs 'file(a)'
+  10 
+  $ cd ..
+  $ misses 'modifies(a)'
+  revset cache: 0 hits, 0 misses
+  $ misses 'follow()'
+  revset cache: * hits, 1 misses (glob)
+
+nor the working directory
+
+  $ revs 'wdir() and file(a)'
+  
+  $ echo b >> a
+  $ revs 'wdir() and file(a)'
+  2147483647 
+  $ hg revert -q --no-backup a
+  $ misses 'wdir()'
+  revset cache: 0 hits, 0 misses
+
+lazy results are only cached once entirely evaluated
+
+  $ hg log -l 1 -T '{rev}\n' -r 'reverse(ancestors(.))'
+  10
+  $ misses 'reverse(ancestors(.))'
+  revset cache: * hits, 1 misses (glob)
+  $ misses 'reverse(ancestors(.))'
+  revset cache: * hits, 0 misses (glob)
+  $ hg id -n -r 'ancestors(.) and draft()'
+  10
+
+only the revsets given by users are cached, not the ones commands
+evaluate internally
+
+  $ cat > $TESTTMP/dumpcache.py << EOF
+  > from mercurial import hg, revsetcache, ui as uimod
+  > repo = hg.repository(uimod.ui(), '.').unfiltered()
+  > for state, expr in revsetcache.revsetcache(repo, 100)._entries:
+  >     print expr
+  > EOF
+  $ rm .hg/cache/revsets-v1
+  $ hg rebase -q --config extensions.rebase= -s 7 -d 10
+  note: rebase of 7:8c4015f48b22 created no changes to commit
+  $ python $TESTTMP/dumpcache.py
+  ('symbol', '10')
+  ('symbol', '7')
+
+least recently used results are evicted
+
+  $ cat >> .hg/hgrc << EOF
+  > [experimental]
+  > revsetcache.size = 2
+  > EOF
+  $ revs '::2'
+  0 1 2 
+  $ revs '::3'
+  0 1 2 3 
+  $ revs '::4'
+  0 1 2 3 4 
+  $ misses '::2'
+  revset cache: * hits, 1 misses (glob)
+  $ misses '::4'
+  revset cache: * hits, 0 misses (glob)
+
+the cache is not written while the wlock is held
+
+  $ ln -s otherhost:12345 .hg/wlock
+  $ hg log -T '{rev}\n' -r '::5' --debug | grep 'revset cache'
+  not writing revset cache: wlock cannot be acquired
+  $ misses '::5'
+  revset cache: * hits, 1 misses (glob)
+  $ rm .hg/wlock
+  $ revs '::5'
+  0 1 2 3 5 
+  $ misses '::5'
+  revset cache: * hits, 0 misses (glob)
+
+looking results up does not write the cache
+
+  $ python $TESTTMP/dumpcache.py
+  ('func', ('symbol', 'ancestors'), ('symbol', '2'))
+  ('func', ('symbol', 'ancestors'), ('symbol', '5'))
+  $ ln -s otherhost:12345 .hg/wlock
+  $ misses '::2'
+  revset cache: * hits, 0 misses (glob)
+  $ hg log -T '{rev}\n' -r '::2' --debug | grep 'revset cache'
+  [1]
+  $ rm .hg/wlock
+
+the cache is ignored when it is disabled
+
+  $ misses 'draft()' --config experimental.revsetcache=False
+  [1]
+  $ cd ..
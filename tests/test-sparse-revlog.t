@@ -0,0 +1,82 @@
+Sparse revlogs store intermediate snapshots: when no delta against the
+parents is acceptable, a delta against one of the snapshots the parents
+are based on is stored instead of a full text. They require generaldelta.
+
+  $ hg init nogd --config experimental.sparse-revlog=yes
+  $ grep sparserevlog nogd/.hg/requires
+  [1]
+
+  $ cat >> $HGRCPATH << EOF
+  > [format]
+  > generaldelta = yes
+  > maxchainlen = 3
+  > EOF
+
+  $ hg init repo --config experimental.sparse-revlog=yes
+  $ cd repo
+  $ cat .hg/requires
+  dotencode
+  fncache
+  generaldelta
+  revlogv1
+  sparserevlog
+  store
+  $ python -c 'for x in range(500): print "line %d" % x' > a
+  $ hg ci -qAm 0
+  $ for r in 1 2 3 4 5 6 7 8 9 10; do
+  >   echo $r >> a
+  >   hg ci -qm $r
+  > done
+
+Revisions 4, 7, 9 and 10 are intermediate snapshots. Revision 10 is not
+stored against revision 7 or 4 as its delta would be larger than them.
+
+  $ hg debugindex a
+     rev    offset  length  delta linkrev nodeid       p1           p2
+       0         0     979     -1       0 aa50f38a0cb1 000000000000 000000000000
+       1       979      14      0       1 bc9c59d52d2c aa50f38a0cb1 000000000000
+       2       993      14      1       2 cb27cfc89235 bc9c59d52d2c 000000000000
+       3      1007      14      2       3 94547b5ef3b6 cb27cfc89235 000000000000
+       4      1021      20      0       4 8bc6908a41aa 94547b5ef3b6 000000000000
+       5      1041      14      4       5 865b17ef86c6 8bc6908a41aa 000000000000
+       6      1055      14      5       6 a58f35ee06d7 865b17ef86c6 000000000000
+       7      1069      18      4       7 bdee58600898 a58f35ee06d7 000000000000
+       8      1087      14      7       8 76f2629af66d bdee58600898 000000000000
+       9      1101      16      7       9 9dce16a1d954 76f2629af66d 000000000000
+      10      1117      33      0      10 8893cc494f9f 9dce16a1d954 000000000000
+  $ hg verify -q
+  $ cd ..
+
+Without the requirement, full texts are stored instead
+
+  $ hg init plain
+  $ cd plain
+  $ cat .hg/requires
+  dotencode
+  fncache
+  generaldelta
+  revlogv1
+  store
+  $ hg pull -q ../repo
+  $ hg debugindex a | grep -c ' -1 '
+  3
+  $ cd ..
+
+Branches started from the same revision share its snapshots, a single
+full text is stored.
+
+  $ hg init branchy --config experimental.sparse-revlog=yes
+  $ cd branchy
+  $ python -c 'for x in range(500): print "line %d" % x' > a
+  $ hg ci -qAm 0
+  $ for b in 1 2 3; do
+  >   hg up -q 0
+  >   for r in 1 2 3 4 5; do
+  >     echo "$b $r" >> a
+  >     hg ci -qm "$b $r"
+  >   done
+  > done
+  $ hg debugindex a | grep -c ' -1 '
+  1
+  $ hg verify -q
+  $ cd ..
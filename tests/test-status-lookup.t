@@ -0,0 +1,58 @@
+Files whose dirstate entries cannot tell if they changed are compared to
+their parent revision, in several processes when there are many of them
+
+  $ cat >> $HGRCPATH <<EOF
+  > [worker]
+  > numcpus = 4
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for d in a b c d; do
+  >     mkdir $d
+  >     for i in `python $TESTDIR/seq.py 1 100`; do echo $d$i > $d/f$i; done
+  > done
+  $ hg commit -qAm 0
+
+Mark every file for lookup, then change some without changing their size
+
+  $ hg debugrebuildstate
+  $ hg debugstate --nodates | grep -c ' -1 '
+  400
+  $ echo A1 > a/f1
+  $ echo C50 > c/f50
+  $ echo D100 > d/f100
+  $ chmod +x b/f20
+  $ find . -name .hg -prune -o -type f -exec touch -t 200001010000 {} \;
+
+  $ hg status
+  M a/f1
+  M b/f20
+  M c/f50
+  M d/f100
+
+The clean files are recorded as such in the dirstate
+
+  $ hg debugstate --nodates | grep -c ' -1 '
+  4
+  $ hg debugstate --nodates | grep ' -1 '
+  n 644         -1 set                 a/f1
+  n 644         -1 set                 b/f20
+  n 644         -1 set                 c/f50
+  n 644         -1 set                 d/f100
+  $ hg status
+  M a/f1
+  M b/f20
+  M c/f50
+  M d/f100
+
+The result is the same when the files are compared in one process
+
+  $ hg debugrebuildstate
+  $ hg status --config worker.numcpus=1
+  M a/f1
+  M b/f20
+  M c/f50
+  M d/f100
+
+  $ cd ..
@@ -0,0 +1,140 @@
+  $ cat >> $HGRCPATH << EOF
+  > [format]
+  > generaldelta = no
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in 1 2 3 4 5 6 7 8 9 10; do
+  >   python -c "for x in range(200): print 'line %d' % (x * $i % 17)" > a
+  >   echo $i > b
+  >   hg -q commit -A -m "commit $i"
+  > done
+  $ hg phase -q --public 5
+  $ cat .hg/requires
+  dotencode
+  fncache
+  revlogv1
+  store
+
+Without --run, only the changes and the current state are reported
+
+  $ hg debugupgraderepo --config format.generaldelta=yes
+  requirements
+     preserved: dotencode, fncache, revlogv1, store
+     added: generaldelta
+  
+  store size: * bytes (glob)
+  read cost: * bytes (glob)
+  longest delta chain: 9
+  
+  (run with --run to upgrade the repository)
+  $ cat .hg/requires
+  dotencode
+  fncache
+  revlogv1
+  store
+
+Upgrading limits the delta chains and adds generaldelta
+
+  $ hg debugupgraderepo --config format.generaldelta=yes \
+  >   --config format.maxchainlen=2 --run
+  requirements
+     preserved: dotencode, fncache, revlogv1, store
+     added: generaldelta
+  
+  upgraded 4 revlogs containing 40 revisions
+  store size: * -> * bytes (glob)
+  read cost: * -> * bytes (glob)
+  longest delta chain: 9 -> 2
+  old store backed up in $TESTTMP/repo/.hg/upgradebackup.*/store (glob)
+  (remove it once the upgraded repository is verified)
+  $ cat .hg/requires
+  dotencode
+  fncache
+  generaldelta
+  revlogv1
+  store
+  $ ls -d .hg/upgrade*
+  .hg/upgradebackup.* (glob)
+  $ ls .hg/upgradebackup.*/store
+  00changelog.i
+  00manifest.i
+  data
+  fncache
+  phaseroots
+  undo
+  undo.backup.phaseroots
+  undo.backupfiles
+  undo.phaseroots
+  $ hg verify -q
+  $ hg log -r 'public()' -T '{rev} '
+  0 1 2 3 4 5  (no-eol)
+  $ hg debugrevlog a | egrep 'flags|max chain length'
+  flags  : inline, generaldelta
+  max chain length  : 2
+
+The transaction used to build the new store cannot be rolled back
+
+  $ hg rollback
+  no rollback information available
+  [1]
+
+Revlogs can be recompressed with another engine
+
+  $ hg debugupgraderepo --config format.generaldelta=yes \
+  >   --config experimental.format.compression=bz2 --run \
+  >   | egrep -v 'store size|read cost|backed up'
+  requirements
+     preserved: dotencode, fncache, generaldelta, revlogv1, store
+     added: exp-compression-bz2
+  
+  upgraded 4 revlogs containing 40 revisions
+  longest delta chain: 2 -> * (glob)
+  (remove it once the upgraded repository is verified)
+  $ hg debugrevlog a | egrep '\((x|B)\)'
+      0x42 (B)  :   10 (100.00%)
+      0x42 (B)  : * (glob)
+  $ hg verify -q
+  $ cd ..
+
+The revlogs of the directories of tree manifests are upgraded too
+
+  $ hg init --config experimental.treemanifest=1 tree
+  $ cd tree
+  $ mkdir -p dir/sub other
+  $ for i in 1 2 3; do
+  >   echo $i > dir/sub/a
+  >   echo $i > other/b
+  >   echo $i > c
+  >   hg -q commit -A -m "commit $i"
+  > done
+  $ hg debugupgraderepo --config format.generaldelta=yes --run \
+  >   | egrep -v 'store size|read cost|backed up'
+  requirements
+     preserved: dotencode, fncache, revlogv1, store, treemanifest
+     added: generaldelta
+  
+  upgraded 8 revlogs containing 24 revisions
+  longest delta chain: 1 -> 1
+  (remove it once the upgraded repository is verified)
+  $ find .hg/store/meta -name '*.i' | sort
+  .hg/store/meta/dir/00manifest.i
+  .hg/store/meta/dir/sub/00manifest.i
+  .hg/store/meta/other/00manifest.i
+  $ hg verify -q
+  $ hg debugrevlog --dir dir/sub | egrep 'flags'
+  flags  : inline, generaldelta
+  $ cd ..
+
+Shared repositories and repositories without a store cannot be upgraded
+
+  $ hg --config extensions.share= share -q repo shared
+  $ hg -R shared debugupgraderepo
+  abort: cannot upgrade a shared repository
+  (upgrade the source repository instead)
+  [255]
+  $ hg init --config format.usestore=no nostore
+  $ hg -R nostore debugupgraderepo
+  abort: cannot upgrade repository without a store
+  [255]